@@ -1 +1 @@
-pdfinfo "$1" | grep "Page size"
+pdf-inventory --format csv "$@"
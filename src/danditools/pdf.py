@@ -1,27 +1,72 @@
 from argparse import ArgumentParser, Namespace
+from collections import Counter
+from concurrent.futures import as_completed, ProcessPoolExecutor
 from copy import copy, deepcopy
+import csv
+import gc
 from dataclasses import dataclass, field
-from enum import auto, StrEnum
-from functools import cache, wraps
+from enum import auto, Enum, StrEnum
+from functools import cache, partial, wraps
+import hashlib
+from io import BytesIO
+from itertools import groupby
+import json
+import mmap
+import os
 from pathlib import Path, PurePath
-from pydoc import Doc
-from typing import Any, Callable, Iterator, NamedTuple, Self
-
-from pypdf import PageObject, PdfReader, PdfWriter
-from pypdf.generic import RectangleObject
-from src.dandiscribe.layout import Page
+import sys
+import time
+from typing import (
+    Any,
+    Callable,
+    cast,
+    Collection,
+    IO,
+    Iterable,
+    Iterator,
+    ClassVar,
+    NamedTuple,
+    Self,
+    Sequence,
+)
+
+import numpy as np
+from pypdf import PageObject, PdfReader, PdfWriter, Transformation
+from pypdf.errors import PdfReadError
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    RectangleObject,
+    StreamObject,
+)
+
+# Number of pages walked between flushes of a reader's parsed object cache in
+# streaming mode
+STREAM_WINDOW = 8
+# Smallest page range worth handing to a worker process with --jobs
+MIN_CHUNK_PAGES = 16
+# Page sizes (in points) closer than this are considered the same size
+DIMS_TOLERANCE = 0.5
+# Page attributes a page inherits from its ancestors in the page tree
+INHERITABLE_ATTRS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+# US letter, landscape, in points
+DEFAULT_SHEET_SIZE = (792.0, 612.0)
 
 
 def copy_cache(to_dec, deep=True) -> Callable:
 
     copy_func = deepcopy if deep else copy
+    cached = cache(to_dec)
 
     @wraps(to_dec)
-    @cache
     def decorated(*args, **kwargs):
-        res = to_dec(*args, **kwargs)
-        return copy_func(res)
+        # copy on the way out, so callers can't mutate the cached value
+        return copy_func(cached(*args, **kwargs))
 
+    decorated.cache_clear = cached.cache_clear  # type: ignore[attr-defined]
     return decorated
 
 
@@ -41,6 +86,19 @@ class Edge(StrEnum):
     HORIZONTAL = auto()
 
 
+class Compression(StrEnum):
+    NONE = auto()
+    FAST = auto()
+    MAX = auto()
+
+    @property
+    def level(self) -> int | None:
+        """
+        zlib level streams are compressed at
+        """
+        return {Compression.FAST: 1, Compression.MAX: 9}.get(self)
+
+
 @copy_cache
 def get_pages(source: Path) -> list[PageObject]:
     reader = PdfReader(source)
@@ -48,6 +106,153 @@ def get_pages(source: Path) -> list[PageObject]:
     return list(reader.pages)
 
 
+def open_source(source: Path) -> PdfReader:
+    """
+    Open `source` backed by a read only memory map, so the OS pages the file in
+    as objects are read instead of it being copied into memory up front
+    """
+    with source.open("rb") as file_handle:
+        mapped = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+    # not an IO, but it has the read, seek and tell that PdfReader uses
+    return PdfReader(cast(IO[bytes], mapped))
+
+
+def _walk_page_tree(
+    reader: PdfReader,
+    node_ref: IndirectObject,
+    start: int,
+    stop: int,
+    offset: int = 0,
+    inherited: dict[str, Any] | None = None,
+) -> Iterator[PageObject]:
+    node = cast(DictionaryObject, node_ref.get_object())
+    inherited = (inherited or {}) | dict(
+        (attr, node.raw_get(attr)) for attr in INHERITABLE_ATTRS if attr in node
+    )
+    if "/Kids" not in node:
+        page = PageObject(reader, node_ref)
+        page.update(node)
+        for attr, value in inherited.items():
+            page.setdefault(NameObject(attr), value)
+        yield page
+        return
+    for kid_ref in cast(ArrayObject, node["/Kids"]):
+        kid = kid_ref.get_object()
+        count = kid["/Count"] if "/Kids" in kid else 1
+        if offset + count > start:
+            yield from _walk_page_tree(
+                reader, kid_ref, start, stop, offset, inherited
+            )
+        offset += count
+        if offset >= stop:
+            return
+
+
+def page_count(reader: PdfReader) -> int:
+    """
+    The number of pages in `reader`, from the /Count of the page tree rather
+    than `len(reader.pages)`, which reads every page to flatten the tree
+    """
+    pages = cast(DictionaryObject, reader.root_object["/Pages"])
+    # a NumberObject, which is an int
+    return cast(int, pages["/Count"])
+
+
+def walk_page_tree(reader: PdfReader, page_nums: range) -> Iterator[PageObject]:
+    """
+    Walk `page_nums` of `reader`, skipping whole subtrees of the page tree by
+    their /Count, so unlike `reader.pages` the rest of the tree is never read
+    """
+    if not page_nums:
+        return
+    yield from _walk_page_tree(
+        reader,
+        reader.root_object.raw_get("/Pages"),
+        page_nums.start,
+        page_nums.stop,
+    )
+
+
+def _page_runs(page_nums: Iterable[int]) -> Iterator[range]:
+    for _, run in groupby(
+        enumerate(page_nums), key=lambda pair: pair[1] - pair[0]
+    ):
+        nums = [page_num for _, page_num in run]
+        yield range(nums[0], nums[-1] + 1)
+
+
+def iter_pages(
+    reader: PdfReader,
+    window: int = STREAM_WINDOW,
+    page_nums: Iterable[int] | None = None,
+) -> Iterator[PageObject]:
+    """
+    Lazily walk the pages of `reader`, or only `page_nums` of them.
+
+    Pages are built from the page tree as they're reached, so the tree is never
+    flattened and edits (rotation, cropping, rewritten content) are dropped
+    along with the page instead of being kept alive by the reader's page list.
+    Every `window` pages the reader's parsed object cache is cleared, so the
+    source pages held are bounded by the window rather than the document.
+    """
+    if page_nums is None:
+        page_nums = range(page_count(reader))
+    pages = (
+        page
+        for run in _page_runs(page_nums)
+        for page in walk_page_tree(reader, run)
+    )
+    for walked, page in enumerate(pages, start=1):
+        yield page
+        if not walked % window:
+            reader.resolved_objects.clear()
+
+
+class PageSelection(NamedTuple):
+    """
+    1-based inclusive page ranges, as given to `--pages`, e.g. "1-50,120-"
+    """
+
+    ranges: tuple[tuple[int, int | None], ...]
+
+    @classmethod
+    def parse(cls, value: str) -> "PageSelection":
+        ranges: list[tuple[int, int | None]] = []
+        for part in value.split(","):
+            start, sep, stop = part.strip().partition("-")
+            first = int(start) if start else 1
+            last = (int(stop) if stop else None) if sep else first
+            if first < 1 or (last is not None and last < first):
+                raise ValueError(f"{part} is not a valid page range")
+            ranges.append((first, last))
+        return cls(tuple(ranges))
+
+    def page_nums(self, num_pages: int) -> tuple[int, ...]:
+        """
+        0-based page numbers selected from a document of `num_pages`
+        """
+        return tuple(
+            page_num
+            for first, last in self.ranges
+            for page_num in range(
+                first - 1, num_pages if last is None else min(last, num_pages)
+            )
+        )
+
+
+def chunk_pages(
+    num_pages: int, jobs: int, min_chunk: int | None = None
+) -> Iterator[range]:
+    """
+    Split `range(num_pages)` into in order chunks, roughly one per job
+    """
+    if min_chunk is None:
+        min_chunk = MIN_CHUNK_PAGES
+    chunk_size = max(min_chunk, -(-num_pages // jobs))
+    for start in range(0, num_pages, chunk_size):
+        yield range(start, min(start + chunk_size, num_pages))
+
+
 class Vector2(NamedTuple):
     x: float
     y: float
@@ -105,9 +310,7 @@ class Dimensions(NamedTuple):
                 return SplitRes(
                     Vector2(self.width / 2.0, 0.0),
                     out_edge,
-                    self._replace(
-                        width=self.width / 2.0, height=self.height / 2.0
-                    ),
+                    self._replace(width=self.width / 2.0, height=self.height),
                 )
             case _:
                 raise ValueError(
@@ -117,33 +320,150 @@ class Dimensions(NamedTuple):
         assert False, "never get here"
 
 
+class PageTransform(NamedTuple):
+    """
+    Where a page's content ends up, as a box in the page's own (user) space and
+    a clockwise rotation. Rotations and crops compose here without touching the
+    page; they're only written out by `apply`.
+    """
+
+    # left, bottom, right, top in user space
+    box: tuple[float, float, float, float]
+    rotation: int = 0
+
+    @classmethod
+    def from_page(cls, page: PageObject) -> "PageTransform":
+        box = page.mediabox
+        return cls(
+            (
+                float(box.left),
+                float(box.bottom),
+                float(box.right),
+                float(box.top),
+            ),
+            page.rotation % 360,
+        )
+
+    def _corners(self, transform: Transformation) -> list[tuple[float, float]]:
+        left, bottom, right, top = self.box
+        return [
+            transform.apply_on((x, y))
+            for x in (left, right)
+            for y in (bottom, top)
+        ]
+
+    def matrix(self) -> Transformation:
+        """
+        Map user space to displayed space, with the bottom left of the
+        displayed box at the origin
+        """
+        # pdf rotation is clockwise, Transformation.rotate is counter clockwise
+        turned = Transformation().rotate(-self.rotation)
+        corners = self._corners(turned)
+        return turned.translate(
+            -min(x for x, _ in corners), -min(y for _, y in corners)
+        )
+
+    def dimensions(self) -> Dimensions:
+        corners = self._corners(self.matrix())
+        return Dimensions(
+            round(max(x for x, _ in corners), 6),
+            round(max(y for _, y in corners), 6),
+        )
+
+    def rotate(self, angle: int) -> "PageTransform":
+        return self._replace(rotation=(self.rotation + angle) % 360)
+
+    def crop(self, offset: Vector2, dims: Dimensions) -> "PageTransform":
+        """
+        Crop to `dims` at `offset`, both in displayed space
+        """
+        a, b, c, d, e, f = self.matrix().ctm
+        det = a * d - b * c
+        points = [
+            (
+                (d * (x - e) - c * (y - f)) / det,
+                (a * (y - f) - b * (x - e)) / det,
+            )
+            for x in (offset.x, offset.x + dims.width)
+            for y in (offset.y, offset.y + dims.height)
+        ]
+        return self._replace(
+            box=(
+                round(min(x for x, _ in points), 6),
+                round(min(y for _, y in points), 6),
+                round(max(x for x, _ in points), 6),
+                round(max(y for _, y in points), 6),
+            )
+        )
+
+    def apply(self, page: PageObject) -> PageObject:
+        """
+        Write this transform to `page`. Quarter turns are just a mediabox and
+        /Rotate, only other angles rewrite the page's content.
+        """
+        if self.rotation % 90:
+            page.add_transformation(self.matrix())
+            page.mediabox = RectangleObject((0.0, 0.0, *self.dimensions()))
+            page.rotation = 0
+        else:
+            page.mediabox = RectangleObject(self.box)
+            page.rotation = self.rotation
+        return page
+
+
 class PageDimensions(NamedTuple):
-    # dims in pixels
+    # dims in pixels, as displayed
     width: float
     height: float
     page: PageObject
     ppi: int = 72
     page_num: int | None = None
     original_page_num: int | None = None
+    transform: PageTransform | None = None
 
     @classmethod
     def create_from_page(
         cls, page: PageObject, page_num: int | None = None
     ) -> "PageDimensions":
-        page.transfer_rotation_to_content()
-        box = page.mediabox
-        return cls(box.width, box.height, page=page, page_num=page_num)
+        """
+        Only the page tree is read, the page's content is left untouched.
+        """
+        transform = PageTransform.from_page(page)
+        width, height = transform.dimensions()
+        return cls(
+            width, height, page=page, page_num=page_num, transform=transform
+        )
 
     def get_dimensions(self) -> Dimensions:
         return Dimensions(self.width, self.height)
 
+    def page_transform(self) -> PageTransform:
+        """
+        The transform so far, or the page's own when there isn't one
+        """
+        if self.transform is not None:
+            return self.transform
+        return PageTransform.from_page(self.page)
+
+    def rotate(self, angle: int) -> "PageDimensions":
+        transform = self.page_transform().rotate(angle)
+        width, height = transform.dimensions()
+        return self._replace(width=width, height=height, transform=transform)
+
+    def add_whole(self, writer: "PdfWriter | Volumes") -> PageObject:
+        """
+        Add the page to `writer` unsplit, writing the transform to its copy
+        """
+        return self.page_transform().apply(writer.add_page(self.page))
+
     def in_inches(self, ppi: int | None = None):
         if ppi is None:
             ppi = self.ppi
         return (self.width / ppi, self.height / ppi)
 
     def split_on_edge(
-        self, writer: PdfWriter, edge="long"
+        self, writer: "PdfWriter | Volumes", edge="long"
     ) -> tuple["PageDimensions", "PageDimensions"]:
         split = self.get_dimensions().split_on_edge(edge)
         original_page_num = (
@@ -151,53 +471,42 @@ class PageDimensions(NamedTuple):
             if self.original_page_num is not None
             else self.page_num
         )
-        mb = self.page.mediabox
-
-        left = self.page.mediabox.left
-        bot = self.page.mediabox.bottom
-        width = self.page.mediabox.width
-        height = self.page.mediabox.height
-
-        self.page.mediabox.lower_left = (
-            left + split.offset.x,
-            bot + split.offset.y,
-        )
-        self.page.mediabox.upper_right = (
-            left + split.offset.x + split.dims.width,
-            bot + split.offset.y + split.dims.height,
-        )
-
-        page_a = self.__class__(
-            split.dims.width,
-            split.dims.height,
-            page=writer.add_page(self.page),
-            ppi=self.ppi,
-            page_num=self.page_num,
-            original_page_num=original_page_num,
+        transform = self.page_transform()
+        # the source page is never modified, each half is cropped on its copy
+        # in the writer, sharing the source's content stream
+        halves = (
+            transform.crop(split.offset, split.dims),
+            transform.crop(Vector2(0.0, 0.0), split.dims),
         )
 
-        self.page.mediabox.lower_left = (left, bot)
-        self.page.mediabox.upper_right = (
-            left + split.dims.width,
-            bot + split.dims.height,
-        )
-
-        page_b = self.__class__(
-            split.dims.width,
-            split.dims.height,
-            page=writer.add_page(self.page),
-            ppi=self.ppi,
-            page_num=None if self.page_num is None else self.page_num + 1,
-            original_page_num=original_page_num,
+        page_a, page_b = (
+            self.__class__(
+                split.dims.width,
+                split.dims.height,
+                page=half.apply(writer.add_page(self.page)),
+                ppi=self.ppi,
+                page_num=page_num,
+                original_page_num=original_page_num,
+                transform=half,
+            )
+            for half, page_num in zip(
+                halves,
+                (
+                    self.page_num,
+                    None if self.page_num is None else self.page_num + 1,
+                ),
+            )
         )
 
         return (page_a, page_b)
 
     @classmethod
     def create_from_pages(
-        cls, pages: list[PageObject]
+        cls, pages: Iterable[PageObject], page_nums: Iterable[int] | None = None
     ) -> Iterator["PageDimensions"]:
-        for page_num, page in enumerate(pages):
+        if page_nums is None:
+            page_nums = range(sys.maxsize)
+        for page_num, page in zip(page_nums, pages):
             yield cls.create_from_page(page, page_num=page_num)
 
 
@@ -213,6 +522,112 @@ def crop_page(
     return page
 
 
+def _gap_labels(values: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Label 1d `values`, starting a new label wherever the sorted values jump by
+    more than `tolerance`
+    """
+    order = np.argsort(values, kind="stable")
+    breaks = np.diff(values[order]) > tolerance
+    labels = np.empty(len(values), dtype=np.intp)
+    labels[order] = np.concatenate(([0], np.cumsum(breaks)))
+    return labels
+
+
+class SizeIndex(NamedTuple):
+    """
+    Page sizes of a document clustered with a tolerance, so scanning jitter
+    doesn't turn one page size into hundreds
+    """
+
+    # (pages, 2) array of displayed width, height
+    sizes: np.ndarray
+    # cluster label of each page
+    labels: np.ndarray
+    # (clusters, 2) array of the mean width, height of each cluster
+    centers: np.ndarray
+    counts: np.ndarray
+
+    @classmethod
+    def create(
+        cls,
+        sizes: Iterable[Dimensions] | np.ndarray,
+        tolerance: float = DIMS_TOLERANCE,
+    ) -> "SizeIndex":
+        if not isinstance(sizes, np.ndarray):
+            sizes = list(sizes)
+        size_arr = np.asarray(sizes, dtype=float).reshape(-1, 2)
+        if not len(size_arr):
+            empty = np.empty(0, dtype=np.intp)
+            return cls(size_arr, empty, size_arr.copy(), empty.copy())
+        width_labels = _gap_labels(size_arr[:, 0], tolerance)
+        height_labels = _gap_labels(size_arr[:, 1], tolerance)
+        _, labels, counts = np.unique(
+            width_labels * (height_labels.max() + 1) + height_labels,
+            return_inverse=True,
+            return_counts=True,
+        )
+        centers = np.stack(
+            [
+                np.bincount(labels, weights=size_arr[:, axis]) / counts
+                for axis in (0, 1)
+            ],
+            axis=1,
+        )
+        return cls(size_arr, labels, centers, counts)
+
+    @classmethod
+    def from_pages(
+        cls, pages: Iterable[PageObject], tolerance: float = DIMS_TOLERANCE
+    ) -> "SizeIndex":
+        """
+        Index the displayed sizes of `pages`, reading only the page tree
+        """
+        sizes = np.fromiter(
+            (
+                (
+                    (box.height, box.width)
+                    if page.rotation % 180
+                    else (box.width, box.height)
+                )
+                for page in pages
+                for box in (page.mediabox,)
+            ),
+            dtype=np.dtype((float, 2)),
+        )
+        return cls.create(sizes, tolerance)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def size(self, label: int) -> Dimensions:
+        return Dimensions(*(float(val) for val in self.centers[label]))
+
+    def page_size(self, page_num: int) -> Dimensions:
+        return self.size(self.labels[page_num])
+
+    def dominant_label(self) -> int:
+        return int(np.argmax(self.counts))
+
+    def dominant(self) -> Dimensions:
+        return self.size(self.dominant_label())
+
+    def outliers(self) -> np.ndarray:
+        """
+        Page numbers of the pages not in the dominant size
+        """
+        return np.flatnonzero(self.labels != self.dominant_label())
+
+    def pages_per_cluster(self) -> dict[Dimensions, np.ndarray]:
+        order = np.argsort(self.labels, kind="stable")
+        return dict(
+            (self.size(label), pages)
+            for label, pages in enumerate(
+                np.split(order, np.cumsum(self.counts)[:-1])
+            )
+        )
+
+
 class CantDetermineDimensions(Exception):
     def __init__(self, possible_dimensions: list[Dimensions]):
         self.possible_dimensions = copy(possible_dimensions)
@@ -232,8 +647,18 @@ class DocDimensions(NamedTuple):
     body: dict[Dimensions, list[PageDimensions]]
     last: Dimensions | None
     ordered_body: list[PageDimensions] | None = None
+    # sizes of the pages in `ordered_body`
+    size_index: SizeIndex | None = None
+    # page numbers these dimensions cover, when not the whole document
+    selection: tuple[int, ...] | None = None
 
     def guess_best_dims(self, split_on_edge: Edge = Edge.LONG) -> SplitRes:
+        """
+        The split of the most common body size. Pages of any other size (a
+        foldout, say) are left whole rather than making the split ambiguous.
+        """
+        if self.body and self.size_index is not None:
+            return self.size_index.dominant().split_on_edge(split_on_edge)
         if self.body:
             possible: list[SplitRes] = list(
                 dim.split_on_edge(split_on_edge) for dim in self.body
@@ -258,35 +683,348 @@ class DocDimensions(NamedTuple):
         if dims is None:
             split = self.guess_best_dims()
 
+    def num_pages(self) -> int:
+        return (
+            len(self.ordered_body or [])
+            + (self.first is not None)
+            + (self.last is not None)
+        )
+
+    def page_nums(self) -> Sequence[int]:
+        if self.selection is not None:
+            return self.selection
+        return range(self.num_pages())
+
+    def unsplit_page_nums(self) -> frozenset[int]:
+        """
+        Page numbers of the first and last pages when they're kept whole, and
+        of the body pages that aren't the size it's split at
+        """
+        page_nums = self.page_nums()
+        unsplit = set[int]()
+        if self.first is not None:
+            unsplit.add(page_nums[0])
+        if self.last is not None:
+            unsplit.add(page_nums[-1])
+        if self.size_index is not None and self.ordered_body:
+            # the body starts at the first page unless it's kept whole
+            start = 0 if self.first is None else 1
+            unsplit.update(
+                page_nums[start + idx]
+                for idx in self.size_index.outliers().tolist()
+            )
+        return frozenset(unsplit)
+
     @classmethod
-    def create(cls, source: Path) -> "DocDimensions":
-        pages = list(PageDimensions.create_from_pages(get_pages(source)))
+    def create(
+        cls,
+        source: Path,
+        reader: PdfReader | None = None,
+        tolerance: float = DIMS_TOLERANCE,
+        selection: Sequence[int] | None = None,
+    ) -> "DocDimensions":
+        """
+        When given a `reader` its pages are used rather than a cached copy, and
+        only the pages in `selection` are read.
+
+        Pages are grouped by size within `tolerance`, and the body is keyed by
+        the mean size of each group.
+        """
+        if reader is None:
+            if selection is not None:
+                raise ValueError("A selection needs a reader")
+            pages = list(PageDimensions.create_from_pages(get_pages(source)))
+        else:
+            pages = list(
+                PageDimensions.create_from_pages(
+                    iter_pages(reader, page_nums=selection), selection
+                )
+            )
+        if not pages:
+            raise ValueError(f"No pages selected from {source}")
+        size_index = SizeIndex.create(
+            (page_dim.get_dimensions() for page_dim in pages), tolerance
+        )
+        labels = size_index.labels
         first: PageDimensions | None = pages.pop(0)
         if pages:
             last = pages.pop(-1)
         else:
             last = None
 
+        body_labels = set(labels[1 : len(pages) + 1].tolist())
         body_pages: dict[Dimensions, list[PageDimensions]] = {}
-        for page_dim in pages:
-            body_pages.setdefault(page_dim.get_dimensions(), []).append(
-                page_dim
-            )
-        if first is not None and first.get_dimensions() in body_pages:
-            body_pages[first.get_dimensions()].insert(0, first)
+        for page_dim, label in zip(pages, labels[1:]):
+            body_pages.setdefault(size_index.size(label), []).append(page_dim)
+        if first is not None and labels[0] in body_labels:
+            body_pages[size_index.size(labels[0])].insert(0, first)
             pages.insert(0, first)
             first = None
-        if last is not None and last.get_dimensions() in body_pages:
-            body_pages[last.get_dimensions()].append(last)
+        if last is not None and labels[-1] in body_labels:
+            body_pages[size_index.size(labels[-1])].append(last)
             pages.append(last)
             last = None
 
+        start = 0 if first is None else 1
         return cls(
             first.get_dimensions() if first is not None else None,
             body_pages,
             last.get_dimensions() if last is not None else None,
             ordered_body=pages,
+            size_index=SizeIndex.create(
+                size_index.sizes[start : start + len(pages)], tolerance
+            ),
+            selection=None if selection is None else tuple(selection),
+        )
+
+
+def stream_source(
+    writer: "PdfWriter | Volumes",
+    reader: PdfReader,
+    unsplit_pages: Collection[int],
+    rotation: int | None = None,
+    window: int = STREAM_WINDOW,
+    page_nums: Sequence[int] | None = None,
+    checkpoint: Callable[[], None] | None = None,
+    edge: Edge = Edge.LONG,
+) -> None:
+    """
+    Split the pages of `reader` on `edge` into `writer` one at a time, so only
+    a window of source pages is ever held in memory. `checkpoint` is called
+    after each source page, which is where `Volumes` writes out and drops a
+    full volume.
+    """
+    if page_nums is None:
+        page_nums = range(page_count(reader))
+    for page_num, page in zip(page_nums, iter_pages(reader, window, page_nums)):
+        page_dims = PageDimensions.create_from_page(page, page_num=page_num)
+        if rotation is not None:
+            page_dims = page_dims.rotate(rotation)
+        if page_num in unsplit_pages:
+            page_dims.add_whole(writer)
+        else:
+            page_dims.split_on_edge(writer, edge)
+        if checkpoint is not None:
+            checkpoint()
+
+
+def dedupe_writer(writer: PdfWriter) -> tuple[int, int]:
+    """
+    Collapse objects in `writer` with identical hashes (content streams, fonts,
+    images...) so each is only written once, and drop anything left
+    unreferenced. Returns the number of objects removed and the bytes saved.
+    """
+    before = list(writer._objects)
+    writer.compress_identical_objects(
+        remove_duplicates=True, remove_unreferenced=True
+    )
+    removed = 0
+    saved = 0
+    for obj, after in zip(before, writer._objects):
+        if obj is None or after is not None:
+            continue
+        buffer = BytesIO()
+        obj.write_to_stream(buffer)
+        removed += 1
+        saved += buffer.tell()
+    return removed, saved
+
+
+def _flate_stream(obj: StreamObject, level: int) -> StreamObject:
+    decoded = DecodedStreamObject()
+    decoded.update(
+        (key, value)
+        for key, value in obj.items()
+        if key not in ("/Filter", "/DecodeParms", "/Length")
+    )
+    decoded.set_data(obj.get_data())
+    return decoded.flate_encode(level)
+
+
+def compress_writer(writer: PdfWriter, compression: Compression) -> int:
+    """
+    Flate compress the unfiltered streams in `writer` at the level of
+    `compression`, and with `Compression.MAX` recompress streams that are only
+    flate compressed too. Streams are only replaced when that makes them
+    smaller. Returns the number of streams replaced.
+    """
+    level = compression.level
+    if level is None:
+        return 0
+    compressed = 0
+    for idx, obj in enumerate(writer._objects):
+        if not isinstance(obj, StreamObject):
+            continue
+        filters = obj.get("/Filter")
+        if filters is not None and not (
+            compression is Compression.MAX
+            and filters == "/FlateDecode"
+            and "/DecodeParms" not in obj
+        ):
+            continue
+        replacement = _flate_stream(obj, level)
+        if len(replacement._data) >= len(obj._data):
+            continue
+        replacement.indirect_reference = obj.indirect_reference
+        writer._objects[idx] = replacement
+        compressed += 1
+    return compressed
+
+
+def write_pdf(
+    writer: PdfWriter,
+    dest: Path,
+    dedupe: bool = False,
+    compression: Compression = Compression.NONE,
+    stats: bool = False,
+) -> None:
+    if dedupe:
+        removed, saved = dedupe_writer(writer)
+        if stats:
+            print(f"Deduplicated {removed} objects, saving {saved} bytes")
+
+    start = time.perf_counter()
+    compressed = compress_writer(writer, compression)
+    with dest.open("wb") as file_handle:
+        writer.write(file_handle)
+
+    if stats:
+        print(
+            f"Wrote {dest} ({dest.stat().st_size} bytes, {compressed} streams"
+            f" compressed {compression}) in {time.perf_counter() - start:.2f}s"
+        )
+
+
+@dataclass
+class Volumes:
+    """
+    Output written to `dest`, or with `max_pages` or `max_bytes` rolled over
+    into numbered volumes next to it. Each volume is written and dropped as
+    soon as it's full, and a manifest of the volumes written so far is kept
+    beside them.
+
+    Volumes only roll over at a `checkpoint`, so a split page is never divided
+    between them. The size of a volume is estimated from the stream data added
+    to it, which is what dominates a pdf.
+    """
+
+    dest: Path
+    max_pages: int | None = None
+    max_bytes: int | None = None
+    write: Callable[[PdfWriter, Path], None] = write_pdf
+    writer: PdfWriter = field(default_factory=PdfWriter)
+    volumes: list[dict[str, Any]] = field(default_factory=list)
+    _counted_objects: int = 0
+    _stream_bytes: int = 0
+
+    @property
+    def rolling(self) -> bool:
+        return self.max_pages is not None or self.max_bytes is not None
+
+    @staticmethod
+    def manifest_for(dest: Path) -> Path:
+        """
+        Where the manifest of volumes split to `dest` is kept
+        """
+        return dest.with_name(f"{dest.stem}_volumes.json")
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.manifest_for(self.dest)
+
+    def volume_path(self, volume_num: int) -> Path:
+        return self.dest.with_name(
+            f"{self.dest.stem}_{volume_num:03d}{self.dest.suffix}"
+        )
+
+    def add_page(self, page: PageObject) -> PageObject:
+        return self.writer.add_page(page)
+
+    def append(self, reader: PdfReader) -> None:
+        self.writer.append(reader)
+
+    def estimated_size(self) -> int:
+        for obj in self.writer._objects[self._counted_objects :]:
+            if isinstance(obj, StreamObject):
+                self._stream_bytes += len(obj._data)
+        self._counted_objects = len(self.writer._objects)
+        return self._stream_bytes
+
+    def checkpoint(self) -> None:
+        if not self.rolling:
+            return
+        num_pages = len(self.writer.pages)
+        if (self.max_pages is not None and num_pages >= self.max_pages) or (
+            self.max_bytes is not None
+            and self.estimated_size() >= self.max_bytes
+        ):
+            self._finish_volume()
+
+    def _finish_volume(self) -> None:
+        path = self.volume_path(len(self.volumes) + 1)
+        self.write(self.writer, path)
+        self.volumes.append(
+            {
+                "path": path.name,
+                "first_page": sum(vol["pages"] for vol in self.volumes),
+                "pages": len(self.writer.pages),
+                "size": path.stat().st_size,
+            }
         )
+        self.write_manifest(complete=False)
+        self.writer = PdfWriter()
+        self._counted_objects = 0
+        self._stream_bytes = 0
+        # a writer and its pages refer to each other, so the finished volume
+        # is only freed once the cycle is collected
+        gc.collect()
+
+    def write_manifest(self, complete: bool) -> None:
+        self.manifest_path.write_text(
+            json.dumps(
+                {"complete": complete, "volumes": self.volumes}, indent=2
+            )
+        )
+
+    def close(self) -> PdfWriter:
+        """
+        Write whatever is left, returning the last writer
+        """
+        writer = self.writer
+        if not self.rolling:
+            self.write(writer, self.dest)
+            return writer
+        if len(writer.pages):
+            self._finish_volume()
+        self.write_manifest(complete=True)
+        return writer
+
+
+def split_chunk(
+    source: Path,
+    page_nums: Sequence[int],
+    unsplit_pages: frozenset[int],
+    rotation: int | None = None,
+    window: int = STREAM_WINDOW,
+    edge: Edge = Edge.LONG,
+) -> bytes:
+    """
+    Split `page_nums` of `source` into a standalone pdf, returned as bytes so
+    it can be sent back from a worker process
+    """
+    writer = PdfWriter()
+    stream_source(
+        writer,
+        open_source(source),
+        unsplit_pages,
+        rotation,
+        window,
+        page_nums,
+        edge=edge,
+    )
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
 
 
 def split_and_merge(
@@ -294,44 +1032,602 @@ def split_and_merge(
     dest: Path,
     dims: Dimensions | None = None,
     rotation: int | None = None,
+    stream: bool = False,
+    window: int = STREAM_WINDOW,
+    jobs: int = 1,
+    tolerance: float = DIMS_TOLERANCE,
+    dedupe: bool = False,
+    pages: PageSelection | None = None,
+    compression: Compression = Compression.NONE,
+    stats: bool = False,
+    volume_pages: int | None = None,
+    volume_bytes: int | None = None,
+    edge: Edge = Edge.LONG,
 ) -> PdfWriter:
+    """
+    Each page is split on `edge`, which also picks the split dimensions when
+    `dims` aren't given.
 
-    writer = PdfWriter()
+    With `stream` each source is opened once and walked lazily instead of
+    having all of its pages loaded (and copied) up front. The output is still
+    held until it's written, so memory is only bounded by the window when it's
+    also rolled over into volumes.
 
-    docs = dict((source, DocDimensions.create(source)) for source in sources)
+    With `pages` only those pages of each source are read and split, which
+    implies `stream`.
 
-    while dims is None:
-        sizes: dict[SplitRes, list[DocDimensions]] = {}
+    With more than one job the page ranges of every source are split in a
+    process pool and stitched back together in order.
+
+    With `dedupe` identical objects, within and across sources, are written
+    once.
+
+    `compression` trades write time for size, and `stats` reports both.
+
+    With `volume_pages` or `volume_bytes` the output is rolled over into
+    `Volumes`. In parallel they roll over between chunks rather than pages.
+    """
+
+    writer = Volumes(
+        dest,
+        volume_pages,
+        volume_bytes,
+        partial(write_pdf, dedupe=dedupe, compression=compression, stats=stats),
+    )
+
+    # the eager path loads every page, so selections are always streamed
+    stream = stream or pages is not None
+    readers = (
+        dict((source, open_source(source)) for source in sources)
+        if stream or jobs > 1
+        else {}
+    )
+    docs = dict(
+        (
+            source,
+            DocDimensions.create(
+                source,
+                reader=readers.get(source),
+                tolerance=tolerance,
+                selection=(
+                    None
+                    if pages is None
+                    else pages.page_nums(page_count(readers[source]))
+                ),
+            ),
+        )
+        for source in sources
+    )
+
+    if dims is None:
+        doc_splits: list[SplitRes] = []
 
         for doc in docs.values():
             try:
-                doc_split = doc.guess_best_dims()
-            except CantDetermineDimensions as exc:
-                if len(exc.possible_dimensions) > 1:
-                    # TODO Prompt for this
-                    raise NotImplementedError()
-            else:
-                sizes.setdefault(doc_split, list[DocDimensions]()).append(doc)
-
-        if len(sizes) == 1:
-            doc_split = list(sizes.keys())[0]
-            dims = doc_split.dims
-
-    for source, source_dims in docs.items():
-        pages = get_pages(source)
-        if rotation is not None:
-            for page in pages:
-                page.rotate(rotation)
-        if source_dims.first is not None:
-            writer.add_page(pages.pop(0))
-        if source_dims.ordered_body:
-            for page in source_dims.ordered_body:
-                # split each page by determined dims
-                # TODO add control to edge
-                page.split_on_edge(writer, Edge.LONG)
-
-        if source_dims.last is not None:
-            writer.add_page(pages.pop(-1))
+                doc_splits.append(doc.guess_best_dims(edge))
+            except CantDetermineDimensions:
+                # just a first and last page of different sizes, which are
+                # both kept whole, so there's nothing to split
+                if doc.body:
+                    raise
+
+        # sources agree if their split sizes are within tolerance
+        split_index = SizeIndex.create(
+            (doc_split.dims for doc_split in doc_splits), tolerance
+        )
+        if len(split_index) > 1:
+            raise CantDetermineDimensions(
+                [split_index.size(label) for label in range(len(split_index))]
+            )
+        if len(split_index):
+            dims = split_index.dominant()
+
+    if jobs > 1:
+        # workers open their own readers
+        readers.clear()
+        with ProcessPoolExecutor(jobs) as pool:
+            chunks = [
+                pool.submit(
+                    split_chunk,
+                    source,
+                    source_dims.page_nums()[page_range.start : page_range.stop],
+                    source_dims.unsplit_page_nums(),
+                    rotation,
+                    window,
+                    edge,
+                )
+                for source, source_dims in docs.items()
+                for page_range in chunk_pages(source_dims.num_pages(), jobs)
+            ]
+            for chunk in chunks:
+                writer.append(PdfReader(BytesIO(chunk.result())))
+                writer.checkpoint()
+    else:
+        for source, source_dims in docs.items():
+            if stream:
+                # pop so each reader is released as soon as it's been written
+                stream_source(
+                    writer,
+                    readers.pop(source),
+                    source_dims.unsplit_page_nums(),
+                    rotation,
+                    window,
+                    source_dims.selection,
+                    writer.checkpoint,
+                    edge,
+                )
+                continue
+            source_pages = get_pages(source)
+            page_dims_list = list(source_dims.ordered_body or [])
+            if source_dims.first is not None:
+                page_dims_list.insert(
+                    0, PageDimensions.create_from_page(source_pages[0], 0)
+                )
+            if source_dims.last is not None:
+                page_dims_list.append(
+                    PageDimensions.create_from_page(
+                        source_pages[-1], len(source_pages) - 1
+                    )
+                )
+            unsplit_pages = source_dims.unsplit_page_nums()
+            for page_dims in page_dims_list:
+                if rotation is not None:
+                    page_dims = page_dims.rotate(rotation)
+                if page_dims.page_num in unsplit_pages:
+                    page_dims.add_whole(writer)
+                else:
+                    # split each page by determined dims
+                    page_dims.split_on_edge(writer, edge)
+                writer.checkpoint()
+
+    return writer.close()
+
+
+def split_to_file(source: Path, dest: Path, **kwargs) -> Path:
+    """
+    Split a single source to `dest`, for use in a worker process. Returns the
+    output written, which is the volume manifest when split into volumes.
+    """
+    split_and_merge([source], dest, **kwargs)
+    if kwargs.get("volume_pages") or kwargs.get("volume_bytes"):
+        return Volumes.manifest_for(dest)
+    return dest
+
+
+def hash_file(path: Path) -> str:
+    with path.open("rb") as file_handle:
+        return hashlib.file_digest(file_handle, "sha256").hexdigest()
+
+
+class SourceRecord(NamedTuple):
+    """
+    What a source looked like when it was split, and what it was split into
+    """
+
+    size: int
+    mtime: float
+    sha256: str
+    params: dict[str, Any]
+    output: str
+
+
+@dataclass
+class SplitManifest:
+    """
+    Sources already split into `dest_dir`, so unchanged sources can be skipped
+    and an interrupted run picks up where it stopped. It's saved after every
+    source.
+    """
+
+    dest_dir: Path
+    sources: dict[str, SourceRecord] = field(default_factory=dict)
+
+    NAME: ClassVar[str] = ".pdf-split-manifest.json"
+
+    @property
+    def path(self) -> Path:
+        return self.dest_dir / self.NAME
+
+    @classmethod
+    def load(cls, dest_dir: Path) -> Self:
+        manifest = cls(dest_dir)
+        if manifest.path.exists():
+            manifest.sources = dict(
+                (source, SourceRecord(**record))
+                for source, record in json.loads(
+                    manifest.path.read_text()
+                ).items()
+            )
+        return manifest
+
+    def save(self) -> None:
+        # written aside and swapped in, so an interrupted save can't lose it
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(
+            json.dumps(
+                dict(
+                    (source, record._asdict())
+                    for source, record in self.sources.items()
+                ),
+                indent=2,
+            )
+        )
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, source: Path, params: dict[str, Any]) -> bool:
+        """
+        Whether `source` was already split with `params`. Size and mtime are
+        trusted when they match, otherwise the content is hashed.
+        """
+        key = str(source.resolve())
+        record = self.sources.get(key)
+        if (
+            record is None
+            or record.params != params
+            or not self.dest_dir.joinpath(record.output).exists()
+        ):
+            return False
+        stat = source.stat()
+        if stat.st_size != record.size:
+            return False
+        if stat.st_mtime == record.mtime:
+            return True
+        if hash_file(source) != record.sha256:
+            return False
+        # touched but unchanged
+        self.sources[key] = record._replace(mtime=stat.st_mtime)
+        self.save()
+        return True
+
+    def record(
+        self, source: Path, params: dict[str, Any], output: Path
+    ) -> None:
+        stat = source.stat()
+        self.sources[str(source.resolve())] = SourceRecord(
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            sha256=hash_file(source),
+            params=params,
+            output=str(output.relative_to(self.dest_dir)),
+        )
+        self.save()
+
+
+def format_dims(dims: Dimensions) -> str:
+    """
+    Format `dims` the way `--dims` takes them
+    """
+    return f"{round(dims.width, 2):g},{round(dims.height, 2):g}"
+
+
+class Inventory(NamedTuple):
+    path: Path
+    file_size: int
+    page_count: int = 0
+    # displayed page size to number of pages that size
+    sizes: dict[Dimensions, int] | None = None
+    rotations: dict[int, int] | None = None
+    # pages with a cropbox different to their mediabox
+    cropped_pages: int = 0
+    error: str | None = None
+
+    @classmethod
+    def create(
+        cls, source: Path, tolerance: float = DIMS_TOLERANCE
+    ) -> "Inventory":
+        """
+        Only the xref, trailer and page tree are read, never any content
+        """
+        file_size = source.stat().st_size
+        try:
+            reader = open_source(source)
+            page_dims = list(PageDimensions.create_from_pages(reader.pages))
+        except (PdfReadError, OSError, ValueError) as exc:
+            return cls(source, file_size, error=str(exc))
+
+        size_index = SizeIndex.create(
+            (page_dim.get_dimensions() for page_dim in page_dims), tolerance
+        )
+        return cls(
+            source,
+            file_size,
+            page_count=len(page_dims),
+            sizes=dict(
+                (size_index.size(label), int(count))
+                for label, count in enumerate(size_index.counts)
+            ),
+            rotations=dict(
+                Counter(
+                    page_dim.page_transform().rotation for page_dim in page_dims
+                )
+            ),
+            cropped_pages=sum(
+                tuple(page_dim.page.cropbox) != tuple(page_dim.page.mediabox)
+                for page_dim in page_dims
+            ),
+        )
+
+    def dominant(self) -> Dimensions | None:
+        if not self.sizes:
+            return None
+        return max(self.sizes, key=self.sizes.__getitem__)
+
+    def split_dims(self, edge: Edge = Edge.LONG) -> Dimensions | None:
+        """
+        What `pdf-split` would split the dominant page size into
+        """
+        dominant = self.dominant()
+        if dominant is None or dominant.width == dominant.height:
+            return None
+        return dominant.split_on_edge(edge).dims
+
+    def dump(self) -> dict[str, Any]:
+        res: dict[str, Any] = {
+            "path": str(self.path),
+            "file_size": self.file_size,
+            "page_count": self.page_count,
+            "sizes": dict(
+                (format_dims(dims), count)
+                for dims, count in (self.sizes or {}).items()
+            ),
+            "rotations": dict(
+                (str(rotation), count)
+                for rotation, count in (self.rotations or {}).items()
+            ),
+            "cropped_pages": self.cropped_pages,
+        }
+        if (dominant := self.dominant()) is not None:
+            res["dominant"] = format_dims(dominant)
+        if (split_dims := self.split_dims()) is not None:
+            res["split_dims"] = format_dims(split_dims)
+        if self.error is not None:
+            res["error"] = self.error
+        return res
+
+
+def iter_pdf_paths(sources: Iterable[Path]) -> Iterator[Path]:
+    for source in sources:
+        if source.is_dir():
+            yield from sorted(
+                path
+                for path in source.rglob("*")
+                if path.suffix.lower() == ".pdf" and path.is_file()
+            )
+        else:
+            yield source
+
+
+def take_inventory(
+    sources: Iterable[Path],
+    jobs: int | None = None,
+    tolerance: float = DIMS_TOLERANCE,
+) -> Iterator[Inventory]:
+    """
+    Inventory every pdf in `sources` (files or directories) across a process
+    pool, yielding results in order
+    """
+    with ProcessPoolExecutor(jobs) as pool:
+        yield from pool.map(
+            partial(Inventory.create, tolerance=tolerance),
+            iter_pdf_paths(sources),
+            chunksize=16,
+        )
+
+
+def write_inventory_csv(inventories: Iterable[Inventory], out) -> None:
+    """
+    One row per file and page size
+    """
+    writer = csv.writer(out)
+    writer.writerow(
+        [
+            "path",
+            "file_size",
+            "page_count",
+            "dims",
+            "pages",
+            "split_dims",
+            "error",
+        ]
+    )
+    for inv in inventories:
+        split_dims = inv.split_dims()
+        # a file with no sizes, e.g. one that couldn't be read, gets one row
+        rows: Iterable[tuple[Dimensions | None, int]] = (
+            inv.sizes.items() if inv.sizes else [(None, 0)]
+        )
+        for dims, count in rows:
+            writer.writerow(
+                [
+                    inv.path,
+                    inv.file_size,
+                    inv.page_count,
+                    "" if dims is None else format_dims(dims),
+                    count,
+                    "" if split_dims is None else format_dims(split_dims),
+                    inv.error or "",
+                ]
+            )
+
+
+class LayoutGrid(NamedTuple):
+    # source pages per sheet side
+    val: int
+    rows: int
+    cols: int
+
+
+class ImposeLayout(Enum):
+    """
+    Mirrors `dandiscribe.zine.layout.Layout`, which can't be imported outside
+    of scribus
+    """
+
+    EIGHT_PAGE_MINI = LayoutGrid(8, 2, 4)
+    QUARTER = LayoutGrid(4, 2, 2)
+    HALF = LayoutGrid(2, 1, 2)
+
+
+def booklet_sides(
+    page_count: int, layout: ImposeLayout
+) -> list[list[int | None]]:
+    """
+    Page numbers for each cell (row by row) of each sheet side of a saddle
+    stitched booklet, in the same order as `FinalDoc.print_pages`. Padding
+    pages past `page_count` are None.
+    """
+    grid = layout.value
+    per_sheet = grid.val * 2
+    total = -(-page_count // per_sheet) * per_sheet
+    front_pages = list(range(total // 2))
+    back_pages = list(range(total // 2, total))
+    sides: list[list[int]] = []
+    while front_pages:
+        front_side: list[int] = []
+        back_side: list[int] = []
+        for _ in range(grid.rows * grid.cols // 2):
+            front_side.extend((front_pages.pop(-1), back_pages.pop(0)))
+            back_side.extend((back_pages.pop(0), front_pages.pop(-1)))
+        sides.extend((front_side, back_side))
+    return [
+        [page_num if page_num < page_count else None for page_num in side]
+        for side in sides
+    ]
+
+
+def n_up_sides(page_count: int, layout: ImposeLayout) -> list[list[int | None]]:
+    """
+    Page numbers for each cell (row by row) of each sheet side, in reading order
+    """
+    per_side = layout.value.rows * layout.value.cols
+    return [
+        [
+            page_num if page_num < page_count else None
+            for page_num in range(start, start + per_side)
+        ]
+        for start in range(0, page_count, per_side)
+    ]
+
+
+def page_to_xobject(page: PageObject, writer: PdfWriter) -> IndirectObject:
+    """
+    Wrap `page` as a form xobject in `writer`. A single content stream is
+    reused still encoded, so the page's content is never parsed.
+    """
+    contents = page.get("/Contents")
+    contents = None if contents is None else contents.get_object()
+    if isinstance(contents, StreamObject):
+        xobject = StreamObject()
+        xobject._data = contents._data
+        for key in ("/Filter", "/DecodeParms"):
+            if key in contents:
+                xobject[NameObject(key)] = contents[key]
+    else:
+        xobject = DecodedStreamObject()
+        xobject.set_data(
+            b"\n".join(
+                stream.get_object().get_data() for stream in contents or []
+            )
+        )
+    xobject.update(
+        {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): RectangleObject(page.cropbox),
+            NameObject("/Resources"): page.get(
+                "/Resources", DictionaryObject()
+            ),
+        }
+    )
+    return writer._add_object(xobject.clone(writer))
+
+
+def fit_transform(
+    transform: PageTransform,
+    cell_origin: Vector2,
+    cell: Dimensions,
+    h_align: float = 0.5,
+) -> Transformation:
+    """
+    Extend `transform` so the page is scaled to fit in `cell`, vertically
+    centered. `h_align` is the share of the spare width put to the left of the
+    page, so 0.5 centers it and 1.0 pushes it right.
+    """
+    width, height = transform.dimensions()
+    scale = min(cell.width / width, cell.height / height)
+    return (
+        transform.matrix()
+        .scale(scale, scale)
+        .translate(
+            cell_origin.x + (cell.width - width * scale) * h_align,
+            cell_origin.y + (cell.height - height * scale) / 2,
+        )
+    )
+
+
+def impose_pdf(
+    source: Path,
+    dest: Path,
+    layout: ImposeLayout = ImposeLayout.HALF,
+    booklet: bool = True,
+    sheet_size: Dimensions = Dimensions(*DEFAULT_SHEET_SIZE),
+) -> PdfWriter:
+    """
+    Impose `source` onto sheets of `sheet_size` as a saddle stitched booklet
+    (or plain n-up when not `booklet`). Each source page is placed as a form
+    xobject, so content is only ever copied, never re-rendered.
+    """
+    reader = open_source(source)
+    writer = PdfWriter()
+    page_count = len(reader.pages)
+    sides = (booklet_sides if booklet else n_up_sides)(page_count, layout)
+    grid = layout.value
+    cell = Dimensions(
+        sheet_size.width / grid.cols, sheet_size.height / grid.rows
+    )
+    xobjects: dict[int, IndirectObject] = {}
+
+    for side in sides:
+        sheet = writer.add_blank_page(sheet_size.width, sheet_size.height)
+        placed = DictionaryObject()
+        operations: list[bytes] = []
+        for cell_num, page_num in enumerate(side):
+            if page_num is None:
+                continue
+            page = reader.pages[page_num]
+            if page_num not in xobjects:
+                xobjects[page_num] = page_to_xobject(page, writer)
+            name = NameObject(f"/P{page_num}")
+            placed[name] = xobjects[page_num]
+            row, col = divmod(cell_num, grid.cols)
+            crop = page.cropbox
+            ctm = fit_transform(
+                PageTransform.from_page(page)._replace(
+                    box=(
+                        float(crop.left),
+                        float(crop.bottom),
+                        float(crop.right),
+                        float(crop.top),
+                    )
+                ),
+                # rows count down from the top of the sheet
+                Vector2(
+                    col * cell.width,
+                    sheet_size.height - (row + 1) * cell.height,
+                ),
+                cell,
+                # booklet spreads meet at the fold
+                h_align=(1.0 - col % 2) if booklet else 0.5,
+            ).ctm
+            operations.append(
+                f"q {' '.join(f'{val:.6f}' for val in ctm)} cm {name} Do Q".encode()
+            )
+        content = DecodedStreamObject()
+        content.set_data(b"\n".join(operations))
+        sheet[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/XObject"): placed}
+        )
+        sheet[NameObject("/Contents")] = writer._add_object(content)
 
     with dest.open("wb") as file_handle:
         writer.write(file_handle)
@@ -340,7 +1636,11 @@ def split_and_merge(
 
 
 def dims_type(in_val):
-    return Dimensions(*in_val.split(","))
+    return Dimensions(*(float(val) for val in in_val.split(",")))
+
+
+def pages_type(in_val):
+    return PageSelection.parse(in_val)
 
 
 def _get_parsed() -> tuple[Namespace, ArgumentParser]:
@@ -348,12 +1648,88 @@ def _get_parsed() -> tuple[Namespace, ArgumentParser]:
     parser = ArgumentParser()
     parser.add_argument("--merged", action="store_true")
     parser.add_argument("--dims", type=dims_type)
-    parser.add_argument("sources", nargs="+", type=extant_path_type)
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        type=extant_path_type,
+        help="pdfs, or directories to split every pdf under",
+    )
     parser.add_argument("dest", type=Path)
     parser.add_argument(
-        "--split_side", choices=["long", "short", "vertical", "horizontal"]
+        "--split_side",
+        type=Edge,
+        choices=list(Edge),
+        default=Edge.LONG,
+        help="the edge each page is split on",
+    )
+    parser.add_argument(
+        "--rotation",
+        type=int,
+        help="degrees to turn each page clockwise, any angle",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DIMS_TOLERANCE,
+        help="page sizes within this many points are treated as the same",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "walk each source lazily, reading --stream_window pages at a time;"
+            " the output is still held until it's written, so pair with"
+            " --volume_pages or --volume_mb to bound memory"
+        ),
+    )
+    parser.add_argument("--stream_window", type=int, default=STREAM_WINDOW)
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="collapse identical objects before writing",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="number of processes to split sources and page ranges across",
+    )
+    parser.add_argument(
+        "--pages",
+        type=pages_type,
+        help='1-based page ranges to split, e.g. "1-50,120-"',
+    )
+    parser.add_argument(
+        "--compress",
+        type=Compression,
+        choices=list(Compression),
+        default=Compression.NONE,
+        help="zlib compress streams, fast for previews or max for archival",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="report write time and size, and what --dedupe saved",
+    )
+    parser.add_argument(
+        "--volume_pages",
+        type=int,
+        help="roll output over into a new volume every this many pages",
+    )
+    parser.add_argument(
+        "--volume_mb",
+        type=float,
+        help="roll output over into a new volume at about this many MiB",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "keep a manifest in dest, a directory, and skip sources already"
+            " split with the same parameters"
+        ),
     )
-    parser.add_argument("--rotation", type=int)
 
     parsed = parser.parse_args()
 
@@ -396,22 +1772,165 @@ def split():
 
     parsed, parser = _get_parsed()
 
-    if parsed.merged and len(parsed.sources) < 2:
+    # pdfs under a directory source keep their place under it in `dest`
+    outputs = dict(
+        (
+            path,
+            parsed.dest.joinpath(
+                path.relative_to(source) if source.is_dir() else path.name
+            ),
+        )
+        for source in parsed.sources
+        for path in iter_pdf_paths([source])
+    )
+
+    if parsed.merged and len(outputs) < 2:
         parser.error("`--merged` doesn't make sense with only one source")
+    if parsed.merged and parsed.incremental:
+        parser.error("`--incremental` only works on separate sources")
 
-    if parsed.merged or len(parsed.sources) == 1:
+    volume_bytes = (
+        None if parsed.volume_mb is None else int(parsed.volume_mb * 2**20)
+    )
+    split_kwargs: dict[str, Any] = dict(
+        dims=parsed.dims,
+        rotation=parsed.rotation,
+        stream=parsed.stream,
+        window=parsed.stream_window,
+        tolerance=parsed.tolerance,
+        dedupe=parsed.dedupe,
+        pages=parsed.pages,
+        compression=parsed.compress,
+        stats=parsed.stats,
+        volume_pages=parsed.volume_pages,
+        volume_bytes=volume_bytes,
+        edge=parsed.split_side,
+    )
+
+    single = len(parsed.sources) == 1 and not parsed.sources[0].is_dir()
+    if parsed.merged or (single and not parsed.incremental):
         split_and_merge(
-            parsed.sources, parsed.dest, parsed.dims, rotation=parsed.rotation
+            list(outputs), parsed.dest, jobs=parsed.jobs, **split_kwargs
         )
+        return
+
+    sources = list(outputs)
+    manifest = None
+    params: dict[str, Any] = {}
+    if parsed.incremental:
+        parsed.dest.mkdir(parents=True, exist_ok=True)
+        manifest = SplitManifest.load(parsed.dest)
+        # everything that changes the output, normalised the way it's stored
+        params = json.loads(
+            json.dumps(
+                dict(
+                    (key, split_kwargs[key])
+                    for key in (
+                        "dims",
+                        "rotation",
+                        "tolerance",
+                        "dedupe",
+                        "pages",
+                        "compression",
+                        "volume_pages",
+                        "volume_bytes",
+                        "edge",
+                    )
+                )
+            )
+        )
+        sources = [
+            source
+            for source in sources
+            if not manifest.is_current(source, params)
+        ]
+        print(f"Skipping {len(outputs) - len(sources)} unchanged sources")
+    for source in sources:
+        outputs[source].parent.mkdir(parents=True, exist_ok=True)
+
+    if parsed.jobs > 1:
+        # sources are independent, so each gets its own worker
+        with ProcessPoolExecutor(parsed.jobs) as pool:
+            futures = dict(
+                (
+                    pool.submit(
+                        split_to_file, source, outputs[source], **split_kwargs
+                    ),
+                    source,
+                )
+                for source in sources
+            )
+            for future in as_completed(futures):
+                output = future.result()
+                if manifest is not None:
+                    manifest.record(futures[future], params, output)
     else:
-        for source in parsed.sources:
+        for source in sources:
+            output = split_to_file(source, outputs[source], **split_kwargs)
+            if manifest is not None:
+                manifest.record(source, params, output)
 
-            split_and_merge(
-                [source],
-                parsed.dest.joinpath(source.name),
-                parsed.dims,
-                rotation=parsed.rotation,
-            )
+
+def impose():
+    parser = ArgumentParser()
+    parser.add_argument("source", type=extant_path_type)
+    parser.add_argument("dest", type=Path)
+    parser.add_argument(
+        "--layout",
+        type=str.upper,
+        choices=[layout.name for layout in ImposeLayout],
+        default=ImposeLayout.HALF.name,
+    )
+    parser.add_argument(
+        "--n_up",
+        action="store_true",
+        help="place pages in reading order instead of as a booklet",
+    )
+    parser.add_argument(
+        "--sheet_size",
+        type=dims_type,
+        default=Dimensions(*DEFAULT_SHEET_SIZE),
+        help="width,height of the output sheets in points",
+    )
+
+    parsed = parser.parse_args()
+
+    impose_pdf(
+        parsed.source,
+        parsed.dest,
+        ImposeLayout[parsed.layout],
+        booklet=not parsed.n_up,
+        sheet_size=parsed.sheet_size,
+    )
+
+
+def inventory():
+    parser = ArgumentParser(
+        description="Summarize page sizes of pdfs, reading only the page tree"
+    )
+    parser.add_argument("sources", nargs="+", type=extant_path_type)
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument(
+        "--output", "-o", type=Path, help="write here instead of stdout"
+    )
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count())
+    parser.add_argument("--tolerance", type=float, default=DIMS_TOLERANCE)
+
+    parsed = parser.parse_args()
+
+    inventories = take_inventory(
+        parsed.sources, jobs=parsed.jobs, tolerance=parsed.tolerance
+    )
+    out = sys.stdout if parsed.output is None else parsed.output.open("w")
+    try:
+        if parsed.format == "csv":
+            write_inventory_csv(inventories, out)
+        else:
+            json.dump([inv.dump() for inv in inventories], out, indent=2)
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
 
 
 if __name__ == "__main__":
@@ -1,21 +1,47 @@
 from argparse import ArgumentParser
-from copy import deepcopy
+from bisect import bisect_right
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import asdict, dataclass, field
 from enum import member, Enum
 from json import dumps, loads
 from os import getenv
-from pathlib import PurePath
+from pathlib import Path
 from pprint import pformat
-from time import sleep
-from typing import Optional, ClassVar
+from random import Random
+import sqlite3
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import TYPE_CHECKING, Any, Optional, ClassVar, cast
+from urllib.parse import parse_qs, urlsplit
 
+from platformdirs import user_cache_dir
+from requests import RequestException
 from serpapi import search
 
 from dandy_lib.cli.parser import add_output_force_overwrite_to_parser
 from dandy_lib.cli.enums import CallableChoiceEnum, EnumAction
 
+if TYPE_CHECKING:
+    from _typeshed import SupportsDunderLT
+
 PER_PAGE = 20
 TIMEOUT_RETRIES = 3
+DEFAULT_WORKERS = 4
+# Scholar won't page past its first thousand results, whatever the total says
+MAX_RESULTS = 1000
+DEFAULT_CACHE_DIR = Path(
+    user_cache_dir("danditools", "DandelionGood")
+).joinpath("scholar")
+DEFAULT_CACHE_DAYS = 30.0
+DEFAULT_PARALLEL = 4
+DEFAULT_RATE = 2.0
+DEFAULT_DEPTH = 2
+DEFAULT_FAN_OUT = PER_PAGE
+# the parameters that pick out a page of results, and so key the cache
+CACHE_PARAMS = ("engine", "q", "cites", "hl", "num", "start")
+
+Search = Callable[[dict], dict]
 
 
 @dataclass
@@ -63,7 +89,8 @@ class Result:
 
     @classmethod
     def from_json_obj(cls, json_obj) -> "Result":
-        json_obj = deepcopy(json_obj)
+        # only top level keys are replaced, so a shallow copy will do
+        json_obj = dict(json_obj)
         if "pub_type" not in json_obj:
             try:
                 json_obj["pub_type"] = json_obj.pop("type")
@@ -92,8 +119,379 @@ class Result:
         )
 
 
-def author_key(result: Result) -> list[str]:
-    return [author.name for author in result.publication_info.authors]
+def position_key(result: Result) -> int:
+    return result.position or 0
+
+
+@dataclass
+class Backoff:
+    """
+    Exponential backoff with jitter, shared by every worker of a query so a
+    throttled api slows the whole pool down, and speeds it back up as requests
+    start succeeding again
+    """
+
+    base: float = 1.0
+    cap: float = 60.0
+    factor: float = 2.0
+    sleep: Callable[[float], None] = sleep
+    random: Random = field(default_factory=Random)
+    delay: float = field(init=False, default=0.0)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+
+    def pace(self) -> float:
+        """
+        Wait somewhere between half and all of the current delay
+        """
+        with self.lock:
+            delay = self.delay and self.random.uniform(
+                self.delay / 2, self.delay
+            )
+        if delay:
+            self.sleep(delay)
+        return delay
+
+    def failed(self) -> None:
+        with self.lock:
+            self.delay = min(self.cap, max(self.base, self.delay * self.factor))
+
+    def succeeded(self) -> None:
+        with self.lock:
+            if self.delay > self.base:
+                self.delay /= self.factor
+            else:
+                self.delay = 0.0
+
+
+@dataclass
+class RateLimit:
+    """
+    Lets `rate` calls through a second on average, and up to `burst` at once
+    after being idle, however many threads are calling
+    """
+
+    rate: float
+    burst: float = 1.0
+    tokens: float = field(init=False)
+    updated: float = field(init=False, default_factory=monotonic)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+
+    def __post_init__(self):
+        self.tokens = self.burst
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def acquire(self) -> None:
+        # the lock keeps waiters in order, so none are starved
+        with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+def rate_limited(search: Search, limit: RateLimit) -> Search:
+    def limited_search(params: dict) -> dict:
+        limit.acquire()
+        return search(params)
+
+    return limited_search
+
+
+@dataclass
+class PageEnd:
+    """
+    Where the results of a query run out, as its pages come in. The total a
+    query reports is only an estimate, so the end is the first page that's
+    short, or a fully empty one after a gap past every full page.
+    """
+
+    end: int
+    last_full: int = 0
+    gaps: set[int] = field(default_factory=set)
+    lock: Lock = field(default_factory=Lock, repr=False)
+
+    def reached(self, offset: int) -> bool:
+        with self.lock:
+            return offset >= self.end
+
+    def past(self, offset: int) -> bool:
+        """
+        Note that the page at `offset` came back fully empty, and whether
+        that's the end rather than something to retry
+        """
+        with self.lock:
+            past = offset >= self.end or any(
+                self.last_full < gap < offset for gap in self.gaps
+            )
+            self.gaps.add(offset)
+            if past:
+                self.end = min(self.end, offset)
+            return past
+
+    def arrived(self, offset: int, page: dict, results: list[Result]) -> int:
+        """
+        Note the page at `offset`, which is `{}` if it was skipped after its
+        retries, returning the offset the pages end at
+        """
+        with self.lock:
+            if results:
+                self.last_full = max(self.last_full, offset)
+            # a skipped page is a gap, unless something after it has results
+            if (page and len(results) < PER_PAGE) or (
+                not page and offset > self.last_full
+            ):
+                self.end = min(self.end, offset + PER_PAGE)
+            return self.end
+
+
+def fetch_page(
+    search: Search,
+    params: dict,
+    offset: int,
+    backoff: Backoff,
+    page_end: PageEnd | None = None,
+) -> tuple[dict, list[Result]]:
+    """
+    Fetch the page of results starting at `offset`, backing off and retrying
+    when the request fails or the page comes back fully empty.
+
+    With `page_end` nothing is fetched once the page is known to be past the
+    end, and a fully empty page past it is taken as the end, not retried.
+    """
+    page_params = params | {"start": str(offset)}
+    for retry in range(TIMEOUT_RETRIES + 1):
+        if page_end is not None and page_end.reached(offset):
+            return {}, []
+        if retry:
+            print(f"Retrying: {retry} for page starting at {offset}")
+        backoff.pace()
+        try:
+            response = search(page_params)
+        except RequestException as exc:
+            print(f"page starting at {offset} failed: {exc}")
+            backoff.failed()
+            continue
+        if "organic_results" in response:
+            backoff.succeeded()
+            return response, sorted(
+                Result.iter_from_results(response), key=position_key
+            )
+        state = response.get("search_information", {}).get(
+            "organic_results_state"
+        )
+        if state != "Fully empty" or (
+            page_end is not None and page_end.past(offset)
+        ):
+            backoff.succeeded()
+            return response, []
+        backoff.failed()
+    print(f"skipping page starting {offset}")
+    return {}, []
+
+
+def page_offsets(
+    first_page: dict, start: int = 0, max_res: int | None = None
+) -> range | None:
+    """
+    The offsets of the pages after the first, or None when the first page
+    doesn't say how many results there are
+    """
+    try:
+        total = int(first_page["search_information"]["total_results"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    end = min(total, MAX_RESULTS)
+    if max_res:
+        end = min(end, start + max_res)
+    return range(start + PER_PAGE, end, PER_PAGE)
+
+
+def iter_pages(
+    params: dict,
+    search: Search = search,
+    start: int = 0,
+    max_res: int | None = None,
+    workers: int = DEFAULT_WORKERS,
+    backoff: Backoff | None = None,
+) -> Iterator[tuple[int, list[Result]]]:
+    """
+    Yield the offset and results of each page as it arrives. The first page
+    gives the total, after which the rest are fetched `workers` at a time.
+
+    The total is only an estimate, so the first short or empty page is taken
+    as the end and the pages after it are dropped without being fetched.
+    """
+    backoff = backoff or Backoff()
+    first_page, results = fetch_page(search, params, start, backoff)
+    yield start, results
+    offsets = page_offsets(first_page, start, max_res)
+    if offsets is None:
+        # no total to go on, so follow the pages one after another
+        page, offset = first_page, start
+        while page.get("pagination", {}).get("next") and (
+            not max_res or offset + PER_PAGE < start + max_res
+        ):
+            offset += PER_PAGE
+            page, results = fetch_page(search, params, offset, backoff)
+            yield offset, results
+        return
+    if first_page and len(results) < PER_PAGE:
+        return
+    page_end = PageEnd(offsets.stop, start)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                fetch_page, search, params, offset, backoff, page_end
+            ): offset
+            for offset in offsets
+        }
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            offset = futures[future]
+            page, results = future.result()
+            yield offset, results
+            end = page_end.arrived(offset, page, results)
+            for pending, pending_offset in futures.items():
+                if pending_offset >= end:
+                    pending.cancel()
+
+
+def in_order(
+    pages: Iterable[tuple[int, list[Result]]],
+    start: int = 0,
+    max_res: int | None = None,
+) -> Iterator[list[Result]]:
+    """
+    Yield the results of pages that arrive in any order, each as soon as every
+    page before it is in, stopping after `max_res` results
+    """
+    waiting = {}
+    remaining = max_res or MAX_RESULTS
+    for offset, results in pages:
+        waiting[offset] = results
+        while start in waiting and remaining > 0:
+            results = waiting.pop(start)[:remaining]
+            remaining -= len(results)
+            start += PER_PAGE
+            yield results
+
+
+def fetch_results(params: dict, **kwargs) -> list[Result]:
+    """
+    All the results of a query, in order. Takes the arguments of `iter_pages`.
+    """
+    pages = in_order(
+        iter_pages(params, **kwargs),
+        kwargs.get("start", 0),
+        kwargs.get("max_res"),
+    )
+    return [result for results in pages for result in results]
+
+
+def cache_key(params: dict) -> str:
+    """
+    The parameters of a search that pick out its page of results, normalised
+    so that equivalent searches share a key
+    """
+    key = {name: str(params.get(name, "")).strip() for name in CACHE_PARAMS}
+    key["q"] = " ".join(key["q"].split())
+    key["start"] = str(int(key["start"] or 0))
+    return dumps(key, sort_keys=True)
+
+
+@dataclass
+class ResponseCache:
+    """
+    Search responses kept in SQLite under `cache_dir` by their `cache_key`,
+    along with when they were fetched
+    """
+
+    cache_dir: Path = DEFAULT_CACHE_DIR
+    ttl: float = DEFAULT_CACHE_DAYS * 24 * 60 * 60
+    db: sqlite3.Connection = field(init=False, repr=False)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+
+    def __post_init__(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # searches run in worker threads, so access is serialised by lock
+        self.db = sqlite3.connect(
+            self.cache_dir / "responses.sqlite", check_same_thread=False
+        )
+        with self.db:
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    fetched REAL NOT NULL,
+                    response TEXT NOT NULL
+                )
+                """
+            )
+
+    def get(self, params: dict, stale: bool = False) -> dict | None:
+        """
+        The cached response to `params`, unless it's older than `ttl` and
+        `stale` ones aren't wanted
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT fetched, response FROM responses WHERE key = ?",
+                (cache_key(params),),
+            ).fetchone()
+        if row is None or (not stale and time() - row[0] > self.ttl):
+            return None
+        response: dict = loads(row[1])
+        return response
+
+    def put(self, params: dict, response: dict) -> None:
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (cache_key(params), time(), dumps(response)),
+            )
+
+    def close(self) -> None:
+        self.db.close()
+
+
+@dataclass
+class CachedSearch:
+    """
+    Searches through `cache`, only keeping responses that have results.
+
+    Offline, cached responses are served however old they are and anything
+    else comes back as an empty page, without touching the network.
+    """
+
+    cache: ResponseCache
+    search: Search = search
+    offline: bool = False
+
+    def __call__(self, params: dict) -> dict:
+        response = self.cache.get(params, stale=self.offline)
+        if response is not None:
+            return response
+        if self.offline:
+            print(f"not cached: {params.get('q')} from {params.get('start')}")
+            return {
+                "search_information": {"organic_results_state": "Not cached"}
+            }
+        response = self.search(params)
+        if "organic_results" in response:
+            self.cache.put(params, response)
+        return response
+
+
+def author_key(result: Result) -> tuple[str, ...]:
+    return tuple(author.name for author in result.publication_info.authors)
 
 
 def citations_key(result: Result) -> int:
@@ -108,8 +506,10 @@ class SortMethods(CallableChoiceEnum):
         reverse: bool = False,
         subsorts: Optional[list["SortMethods"]] = None,
     ):
-        # ToDo: SubSorts
-        return sorted(results, reverse=reverse, key=author_key)
+        # the member, which a checker sees as the decorated function
+        return SortOrder.of(
+            cast("SortMethods", SortMethods.author), subsorts, reverse
+        ).sort(results)
 
     @member
     def citations(
@@ -117,75 +517,629 @@ class SortMethods(CallableChoiceEnum):
         reverse: bool = False,
         subsorts: Optional[list["SortMethods"]] = None,
     ):
-        return sorted(results, reverse=not reverse, key=citations_key)
+        return SortOrder.of(
+            cast("SortMethods", SortMethods.citations), subsorts, reverse
+        ).sort(results)
 
     def __call__(self, *args, **kwargs):
         return self.value(*args, **kwargs)
 
+    @property
+    def key(self) -> Callable[[Result], "SupportsDunderLT[Any]"]:
+        return SORT_KEYS[self.name][0]
 
-def handle_write(
-    output: PurePath,
-    results: list,
-    previous: Optional[list] = None,
-    sort: SortMethods | None = None,
-):
-    if previous:
-        new_results = [result for result in results if result not in previous]
-        if new_results != results:
-            pass  # print(f"Duplicate results found: {pformat([res for res in results if res not in new_results])}")
-        if not new_results:
-            return
+    @property
+    def descending(self) -> bool:
+        """
+        Whether this sorts from high to low unless reversed
+        """
+        return SORT_KEYS[self.name][1]
+
+
+# the key of each sort method, and whether it sorts high to low by default
+SORT_KEYS: dict[
+    str, tuple[Callable[[Result], "SupportsDunderLT[Any]"], bool]
+] = {
+    "author": (author_key, False),
+    "citations": (citations_key, True),
+}
+
+
+class Descending[K: SupportsDunderLT[Any]]:
+    """
+    A sort key that sorts the other way round, for the parts of a composite
+    key that aren't numbers and so can't just be negated
+    """
+
+    __slots__ = ("key",)
+
+    def __init__(self, key: K):
+        self.key = key
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Descending) and self.key == other.key
+
+    def __lt__(self, other: "Descending[K]") -> bool:
+        return bool(other.key < self.key)
+
+
+@dataclass
+class SortOrder:
+    """
+    A chain of sort methods, each breaking the ties left by those before it,
+    and whether each is reversed.
 
+    The chain is turned into one composite key for each result, which is
+    computed once and kept by `result_id`, so sorting and bisecting only
+    compare tuples.
+    """
+
+    methods: tuple[tuple[SortMethods, bool], ...]
+    keys: dict[str, tuple] = field(
+        init=False, default_factory=dict, repr=False, compare=False
+    )
+
+    @classmethod
+    def of(
+        cls,
+        method: SortMethods,
+        subsorts: Iterable[SortMethods] | None = None,
+        reverse: bool = False,
+    ) -> "SortOrder":
+        return cls(
+            ((method, reverse), *((sub, False) for sub in subsorts or ()))
+        )
+
+    def key(self, result: Result) -> tuple:
         try:
-            results = previous + [r for r in results if r not in previous]
-        except NameError as exc:
-            import pdb
+            return self.keys[result.result_id]
+        except KeyError:
+            pass
+        parts = []
+        for method, reverse in self.methods:
+            part = method.key(result)
+            if method.descending != reverse:
+                if isinstance(part, int | float):
+                    part = -part
+                else:
+                    part = Descending(part)
+            parts.append(part)
+        key = self.keys[result.result_id] = tuple(parts)
+        return key
 
-            pdb.set_trace()
-            raise exc
-    # import pdb
-    # pdb.set_trace()
-    if sort is not None:
-        results = sort(results)
-    output.write_text(dumps([result.dump() for result in results]))
+    def sort(self, results: Iterable[Result]) -> list[Result]:
+        return sorted(results, key=self.key)
 
 
-def query():
-    parser = ArgumentParser()
-    parser.add_argument("query")
-    add_output_force_overwrite_to_parser(parser)
+@dataclass
+class SortedResults:
+    """
+    Results kept in `order` as they're added, each new one put in place by
+    bisecting on the keys of those already in rather than sorting them again
+    """
+
+    order: SortOrder
+    results: list[Result] = field(init=False, default_factory=list)
+    keys: list[tuple] = field(init=False, default_factory=list, repr=False)
+
+    def add(self, results: list[Result]) -> None:
+        if len(results) > len(self.results):
+            # cheaper to sort the lot once than to shift the list each time
+            self.results = self.order.sort(self.results + results)
+            self.keys = [self.order.key(result) for result in self.results]
+            return
+        for result in results:
+            key = self.order.key(result)
+            index = bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.results.insert(index, result)
+
+
+def read_log(path: Path) -> list[str]:
+    """
+    The lines of the append-only log at `path`, cutting off a last line whose
+    write was cut short so what's appended next starts on a line of its own
+    """
+    if not path.exists():
+        return []
+    with path.open("r+b") as log:
+        text = log.read()
+        complete = text.rfind(b"\n") + 1
+        if complete < len(text):
+            log.truncate(complete)
+    return text[:complete].decode().splitlines()
+
+
+@dataclass
+class ResultStore:
+    """
+    Results kept once each by `result_id`, appended as JSON Lines to `path`.
+
+    An index file next to it holds the id and offset of each record, so
+    reopening the store doesn't parse every result and each one can be read
+    back on its own. Records appended after the index was last written, say
+    by an interrupted run, are indexed again when the store is opened.
+
+    Results added for a query are recorded as hits of that query, appended to
+    a hits file, so the queries that found each result can be exported too.
+
+    Given a `sort` order, the results are also kept sorted in memory as they
+    are added, so exporting them needn't sort or read back the records.
+    """
+
+    path: Path
+    sort: SortOrder | None = None
+    offsets: dict[str, int] = field(init=False, default_factory=dict)
+    hits: dict[str, list[str]] = field(init=False, default_factory=dict)
+    ordered: SortedResults | None = field(init=False, default=None)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+
+    def __post_init__(self):
+        self.path.touch()
+        self._read_index()
+        self._catch_up()
+        for line in read_log(self.hits_path):
+            result_id, query = loads(line)
+            self.hits.setdefault(result_id, []).append(query)
+        if self.sort is not None:
+            self.ordered = SortedResults(self.sort)
+            self.ordered.add(self.results())
+
+    @classmethod
+    def for_output(
+        cls,
+        output: Path,
+        reset: bool = False,
+        sort: SortOrder | None = None,
+    ) -> "ResultStore":
+        """
+        The store kept alongside the export `output`, emptied if `reset`
+        """
+        path = output.with_suffix(".jsonl")
+        if reset:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".idx").unlink(missing_ok=True)
+            path.with_suffix(".hits").unlink(missing_ok=True)
+        return cls(path, sort)
+
+    @property
+    def index_path(self) -> Path:
+        return self.path.with_suffix(".idx")
+
+    @property
+    def hits_path(self) -> Path:
+        return self.path.with_suffix(".hits")
+
+    def _read_index(self) -> None:
+        """
+        Load the offsets in the index up to the first entry that an interrupted
+        write left unreadable, or that doesn't point at the start of a later
+        record, and drop the rest so `_catch_up` indexes those records again
+        """
+        lines = read_log(self.index_path)
+        entries: list[tuple[str, int]] = []
+        size = self.path.stat().st_size
+        for line in lines:
+            result_id, _, offset = line.partition("\t")
+            if not (result_id and offset.isdigit()):
+                break
+            if int(offset) >= size or (
+                entries and int(offset) <= entries[-1][1]
+            ):
+                break
+            entries.append((result_id, int(offset)))
+        with self.path.open("rb") as data:
+            # an entry cut short can still parse, as the wrong offset
+            while entries and entries[-1][1]:
+                data.seek(entries[-1][1] - 1)
+                if data.read(1) == b"\n":
+                    break
+                entries.pop()
+        if len(entries) < len(lines):
+            self.index_path.write_text(
+                "".join(
+                    f"{result_id}\t{offset}\n" for result_id, offset in entries
+                )
+            )
+        self.offsets.update(entries)
+
+    def _catch_up(self) -> None:
+        with self.path.open("r+b") as data, self.index_path.open("a") as index:
+            if self.offsets:
+                data.seek(max(self.offsets.values()))
+                data.readline()
+            while line := data.readline():
+                if not line.endswith(b"\n"):
+                    # the write of the last record was cut short
+                    data.truncate(data.tell() - len(line))
+                    break
+                result_id = loads(line)["result_id"]
+                offset = data.tell() - len(line)
+                self.offsets.setdefault(result_id, offset)
+                index.write(f"{result_id}\t{offset}\n")
+
+    def __contains__(self, result_id: str) -> bool:
+        return result_id in self.offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add(
+        self, results: Iterable[Result], query: str | None = None
+    ) -> list[Result]:
+        """
+        Append the results that aren't stored yet, returning them, and record
+        all of them as hits of `query` if there is one
+        """
+        with self.lock:
+            new_results = []
+            hit_lines = []
+            for result in results:
+                if result.result_id not in self.offsets:
+                    # claimed now so repeats within `results` are skipped
+                    self.offsets[result.result_id] = -1
+                    new_results.append(result)
+                if query is None:
+                    continue
+                queries = self.hits.setdefault(result.result_id, [])
+                if query not in queries:
+                    queries.append(query)
+                    hit_lines.append(f"{dumps([result.result_id, query])}\n")
+            if hit_lines:
+                with self.hits_path.open("a") as hits:
+                    hits.writelines(hit_lines)
+            if not new_results:
+                return new_results
+            with self.path.open("ab") as data:
+                offset = data.tell()
+                index_lines = []
+                for result in new_results:
+                    line = f"{dumps(result.dump())}\n".encode()
+                    data.write(line)
+                    self.offsets[result.result_id] = offset
+                    index_lines.append(f"{result.result_id}\t{offset}\n")
+                    offset += len(line)
+            with self.index_path.open("a") as index:
+                index.writelines(index_lines)
+            if self.ordered is not None:
+                self.ordered.add(new_results)
+        return new_results
+
+    def dump(self, result: Result) -> dict:
+        """
+        `result` as exported, with the queries that hit it if there were any
+        """
+        record = result.dump()
+        if result.result_id in self.hits:
+            record["queries"] = self.hits[result.result_id]
+        return record
+
+    def get(self, result_id: str) -> Result:
+        with self.path.open("rb") as data:
+            data.seek(self.offsets[result_id])
+            return Result.from_json_obj(loads(data.readline()))
+
+    def results(self) -> list[Result]:
+        """
+        Every stored result, in the order they were added
+        """
+        with self.path.open("rb") as data:
+            return [Result.from_json_obj(loads(line)) for line in data]
+
+    def export(self, output: Path) -> None:
+        """
+        Write every result to `output` as one JSON list, in the store's sort
+        order or else the order they were added
+        """
+        if self.ordered is not None:
+            results = self.ordered.results
+        else:
+            results = self.results()
+        output.write_text(dumps([self.dump(result) for result in results]))
+
+
+def run_batch(
+    queries: Iterable[str],
+    store: ResultStore,
+    params: dict,
+    search: Search = search,
+    parallel: int = DEFAULT_PARALLEL,
+    backoff: Backoff | None = None,
+    **kwargs,
+) -> dict[str, int]:
+    """
+    Run `parallel` queries at a time into `store`, sharing one `backoff`, and
+    count the results of each. The rest of the arguments go to `iter_pages`.
+    """
+    backoff = backoff or Backoff()
+
+    def run_query(query: str) -> int:
+        pages = iter_pages(
+            params | {"q": query}, search=search, backoff=backoff, **kwargs
+        )
+        count = 0
+        for results in in_order(
+            pages, kwargs.get("start", 0), kwargs.get("max_res")
+        ):
+            store.add(results, query=query)
+            count += len(results)
+        return count
+
+    counts = {}
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = {pool.submit(run_query, query): query for query in queries}
+        for future in as_completed(futures):
+            counts[futures[future]] = future.result()
+            print(f"{counts[futures[future]]} results for {futures[future]}")
+    return counts
+
+
+def cites_id(result: Result) -> str | None:
+    """
+    The id Scholar lists the papers citing `result` under, if any do
+    """
+    cited_by = (result.inline_links or {}).get("cited_by")
+    if not isinstance(cited_by, dict) or not cited_by.get("total"):
+        return None
+    if "cites_id" in cited_by:
+        return str(cited_by["cites_id"])
+    link = cited_by.get("link")
+    if not isinstance(link, str):
+        return None
+    cites = parse_qs(urlsplit(link).query).get("cites")
+    if cites is None:
+        return None
+    return cites[0]
+
+
+@dataclass
+class CitationGraph:
+    """
+    A breadth first expansion of which results cite which, logged to `path`
+    as it goes so an interrupted expansion can pick up where it stopped.
+
+    Each line of the log is a JSON list: ["node", result_id, depth] when a
+    result is first reached, ["edge", citing_id, cited_id] for each citation
+    found, and ["done", result_id] once all of a result's citations are in.
+    """
+
+    path: Path
+    depths: dict[str, int] = field(init=False, default_factory=dict)
+    edges: set[tuple[str, str]] = field(init=False, default_factory=set)
+    done: set[str] = field(init=False, default_factory=set)
+
+    def __post_init__(self):
+        for line in read_log(self.path):
+            kind, *args = loads(line)
+            match kind:
+                case "node":
+                    self.depths.setdefault(args[0], args[1])
+                case "edge":
+                    self.edges.add(tuple(args))
+                case "done":
+                    self.done.add(args[0])
+
+    @classmethod
+    def for_output(cls, output: Path, reset: bool = False) -> "CitationGraph":
+        path = output.with_suffix(".graph")
+        if reset:
+            path.unlink(missing_ok=True)
+        return cls(path)
+
+    def _log(self, entries: list[list]) -> None:
+        if entries:
+            with self.path.open("a") as log:
+                log.writelines(f"{dumps(entry)}\n" for entry in entries)
+
+    def add_nodes(self, result_ids: Iterable[str], depth: int) -> list[str]:
+        """
+        Add the results that haven't been reached yet at `depth`, returning
+        their ids
+        """
+        new_ids = []
+        for result_id in result_ids:
+            if result_id not in self.depths:
+                self.depths[result_id] = depth
+                new_ids.append(result_id)
+        self._log([["node", result_id, depth] for result_id in new_ids])
+        return new_ids
+
+    def add_citations(self, cited_id: str, citing_ids: Iterable[str]) -> None:
+        """
+        Log the results citing `cited_id`, and that it's been expanded
+        """
+        new_edges = [
+            (citing_id, cited_id)
+            for citing_id in dict.fromkeys(citing_ids)
+            if (citing_id, cited_id) not in self.edges
+        ]
+        self.edges.update(new_edges)
+        self._log(
+            [["edge", *edge] for edge in new_edges] + [["done", cited_id]]
+        )
+        self.done.add(cited_id)
+
+    def frontier(self, max_depth: int) -> list[str]:
+        """
+        The shallowest results left to expand, if any are within `max_depth`
+        """
+        waiting = [
+            (depth, result_id)
+            for result_id, depth in self.depths.items()
+            if result_id not in self.done and depth < max_depth
+        ]
+        if not waiting:
+            return []
+        shallowest = min(waiting)[0]
+        return [
+            result_id for depth, result_id in waiting if depth == shallowest
+        ]
+
+    def export(self, output: Path) -> None:
+        output.write_text(dumps(sorted(self.edges)))
+
+
+def expand_citations(
+    graph: CitationGraph,
+    store: ResultStore,
+    params: dict,
+    search: Search = search,
+    max_depth: int = DEFAULT_DEPTH,
+    fan_out: int = DEFAULT_FAN_OUT,
+    parallel: int = DEFAULT_PARALLEL,
+    backoff: Backoff | None = None,
+    **kwargs,
+) -> None:
+    """
+    Expand `graph` a depth at a time, until each result within `max_depth` of
+    the seeds has had up to `fan_out` of the results citing it fetched into
+    `store`. `parallel` results are expanded at once, sharing one `backoff`,
+    and the rest of the arguments go to `iter_pages`.
+    """
+    backoff = backoff or Backoff()
+    params = {name: value for name, value in params.items() if name != "q"}
+
+    def fetch_citing(result_id: str) -> list[Result]:
+        cites = cites_id(store.get(result_id))
+        if cites is None:
+            return []
+        return fetch_results(
+            params | {"cites": cites},
+            search=search,
+            max_res=fan_out,
+            backoff=backoff,
+            **kwargs,
+        )
+
+    while frontier := graph.frontier(max_depth):
+        depth = graph.depths[frontier[0]]
+        print(f"expanding {len(frontier)} results at depth {depth}")
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            futures = {
+                pool.submit(fetch_citing, result_id): result_id
+                for result_id in frontier
+            }
+            for future in as_completed(futures):
+                citing = future.result()
+                # results go in before the graph refers to them
+                store.add(citing)
+                citing_ids = [result.result_id for result in citing]
+                graph.add_nodes(citing_ids, depth + 1)
+                graph.add_citations(futures[future], citing_ids)
+
+
+def add_search_args(parser: ArgumentParser) -> None:
     parser.add_argument("--api_key", default=getenv("SERPAPI_KEY"))
-    parser.add_argument("--max_res", type=int)
-    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument(
+        "--cache_dir",
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="where search responses are kept for later runs",
+    )
+    parser.add_argument(
+        "--cache_days",
+        type=float,
+        default=DEFAULT_CACHE_DAYS,
+        help="how long a cached response is used before searching again",
+    )
+    parser.add_argument("--no_cache", "--no-cache", action="store_true")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="only use cached responses, however old",
+    )
+
+
+def searcher(
+    parser: ArgumentParser, parsed, rate: float | None = None
+) -> Search:
+    """
+    The search that the arguments from `add_search_args` ask for, making at
+    most `rate` api calls a second if given
+    """
+    api_search: Search = search
+    if rate:
+        api_search = rate_limited(search, RateLimit(rate))
+    if parsed.no_cache:
+        if parsed.offline:
+            parser.error("--offline needs the cache")
+        return api_search
+    cache = ResponseCache(parsed.cache_dir, parsed.cache_days * 24 * 60 * 60)
+    return CachedSearch(cache, api_search, offline=parsed.offline)
+
+
+def add_sort_args(parser: ArgumentParser) -> None:
     parser.add_argument(
         "--sort", choices=SortMethods, type=SortMethods, action=EnumAction
     )
-    parser.add_argument("--aggressive_write", "-W", action="count")
-    parser.add_argument("--append_previous", "--AP", action="store_true")
+    parser.add_argument(
+        "--subsort",
+        type=SortMethods.__getitem__,
+        choices=SortMethods,
+        action="append",
+        metavar="{" + ",".join(SortMethods.__members__) + "}",
+        help="break ties left by --sort, and by earlier subsorts",
+    )
+    parser.add_argument(
+        "--reverse", action="store_true", help="reverse the --sort order"
+    )
 
-    parsed = parser.parse_args()
 
-    params = {
+def sort_order(parser: ArgumentParser, parsed) -> SortOrder | None:
+    """
+    The sort order that the arguments from `add_sort_args` ask for
+    """
+    if parsed.sort is None:
+        if parsed.subsort or parsed.reverse:
+            parser.error("--subsort and --reverse need a --sort")
+        return None
+    return SortOrder.of(parsed.sort, parsed.subsort, parsed.reverse)
+
+
+def search_params(query: str, api_key: str | None) -> dict:
+    return {
         "engine": "google_scholar",
-        "q": parsed.query,
+        "q": query,
         "hl": "en",
         "num": str(PER_PAGE),
-        "api_key": parsed.api_key,
+        "api_key": api_key,
     }
 
-    all_results = []
-    index = parsed.start
-    results = None
 
-    if parsed.append_previous and parsed.output.exists():
-        previous_results = list(
+def query():
+    parser = ArgumentParser()
+    parser.add_argument("query")
+    add_output_force_overwrite_to_parser(parser)
+    add_search_args(parser)
+    parser.add_argument("--max_res", type=int)
+    parser.add_argument("--start", type=int, default=0)
+    add_sort_args(parser)
+    parser.add_argument("--aggressive_write", "-W", action="count")
+    parser.add_argument("--append_previous", "--AP", action="store_true")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="pages to fetch at once once the total is known",
+    )
+
+    parsed = parser.parse_args()
+
+    params = search_params(parsed.query, parsed.api_key)
+
+    store = ResultStore.for_output(
+        parsed.output,
+        reset=not parsed.append_previous,
+        sort=sort_order(parser, parsed),
+    )
+    if parsed.append_previous and not len(store) and parsed.output.exists():
+        store.add(
             Result.iter_from_results(loads(parsed.output.read_text()), raw=True)
         )
-    else:
-        previous_results = []
 
     match parsed.aggressive_write:
-        case 0:
+        case 0 | None:
             print_interval = -1
         case 1:
             print_interval = 5
@@ -196,37 +1150,202 @@ def query():
         case _:
             print_interval = 1
 
-    iterations = 0
-
-    while results is None or results["pagination"]["next"]:
-
-        page_params = params | {"start": str(index)}
-        results = search(page_params)
-        try:
-            all_results.extend(Result.iter_from_results(results))
-        except KeyError:
-            for retry in range(TIMEOUT_RETRIES):
-                print(f"Retrying: {retry} for page starting at {index}")
-                if (
-                    results["search_information"]["organic_results_state"]
-                    == "Fully empty"
-                ):
-                    sleep(5)
-                    results = search(page_params)
-                    if "organic_results" in results:
-                        all_results.extend(Result.iter_from_results(results))
-                        break
-            else:
-                print(f"skipping page starting {index}")
+    pages = iter_pages(
+        params,
+        search=searcher(parser, parsed),
+        start=parsed.start,
+        max_res=parsed.max_res,
+        workers=parsed.workers,
+    )
+    pending = []
+    for iterations, results in enumerate(
+        in_order(pages, parsed.start, parsed.max_res)
+    ):
+        pending.extend(results)
         if parsed.aggressive_write and not iterations % print_interval:
             print("doing aggressive write")
-            handle_write(
-                parsed.output, all_results, previous_results, sort=parsed.sort
-            )
-        index += PER_PAGE
-        if parsed.max_res and len(results) > parsed.max_res:
-            break
+            store.add(pending)
+            pending.clear()
+
+    store.add(pending)
+    store.export(parsed.output)
+
+
+def warm():
+    parser = ArgumentParser(
+        description="Fetch every page of each query into the response cache,"
+        " so later runs needn't search again"
+    )
+    parser.add_argument(
+        "queries", type=Path, help="a file of queries, one to a line"
+    )
+    add_search_args(parser)
+    parser.add_argument("--max_res", type=int)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+
+    parsed = parser.parse_args()
+    if parsed.no_cache:
+        parser.error("there's no cache to warm with --no_cache")
+
+    cached_search = searcher(parser, parsed)
+    for query in parsed.queries.read_text().splitlines():
+        if not query.strip():
+            continue
+        results = fetch_results(
+            search_params(query, parsed.api_key),
+            search=cached_search,
+            max_res=parsed.max_res,
+            workers=parsed.workers,
+        )
+        print(f"{len(results)} results cached for {query}")
+
+
+def batch():
+    parser = ArgumentParser(
+        description="Run every query in a file into one deduplicated set of"
+        " results, noting the queries that found each"
+    )
+    parser.add_argument(
+        "queries", type=Path, help="a file of queries, one to a line"
+    )
+    add_output_force_overwrite_to_parser(parser)
+    add_search_args(parser)
+    parser.add_argument("--max_res", type=int, help="per query")
+    add_sort_args(parser)
+    parser.add_argument("--append_previous", "--AP", action="store_true")
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=DEFAULT_PARALLEL,
+        help="queries to run at once",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="pages of each query to fetch at once",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help="most api calls a second across every query",
+    )
+
+    parsed = parser.parse_args()
+
+    queries = list(
+        dict.fromkeys(
+            query.strip()
+            for query in parsed.queries.read_text().splitlines()
+            if query.strip()
+        )
+    )
+    store = ResultStore.for_output(
+        parsed.output,
+        reset=not parsed.append_previous,
+        sort=sort_order(parser, parsed),
+    )
+    run_batch(
+        queries,
+        store,
+        search_params("", parsed.api_key),
+        search=searcher(parser, parsed, rate=parsed.rate),
+        parallel=parsed.parallel,
+        max_res=parsed.max_res,
+        workers=parsed.workers,
+    )
+    print(f"{len(store)} distinct results from {len(queries)} queries")
+    store.export(parsed.output)
 
-        iterations += 1
 
-    handle_write(parsed.output, all_results, previous_results, sort=parsed.sort)
+def graph():
+    parser = ArgumentParser(
+        description="Expand the citations of a query's results breadth first,"
+        " resuming any earlier expansion into the same output"
+    )
+    parser.add_argument(
+        "query",
+        nargs="?",
+        help="the search whose results seed the graph, unless resuming",
+    )
+    add_output_force_overwrite_to_parser(parser)
+    add_search_args(parser)
+    parser.add_argument(
+        "--seeds",
+        type=int,
+        default=PER_PAGE,
+        help="how many of the query's results to start from",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=DEFAULT_DEPTH,
+        help="how many citations away from the seeds to go",
+    )
+    parser.add_argument(
+        "--fan_out",
+        type=int,
+        default=DEFAULT_FAN_OUT,
+        help="most citing results to fetch for any one result",
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        default=DEFAULT_PARALLEL,
+        help="results to expand at once",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="pages of each result's citations to fetch at once",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help="most api calls a second across everything",
+    )
+    add_sort_args(parser)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="throw away any earlier expansion and start again",
+    )
+
+    parsed = parser.parse_args()
+
+    store = ResultStore.for_output(
+        parsed.output, reset=parsed.restart, sort=sort_order(parser, parsed)
+    )
+    citations = CitationGraph.for_output(parsed.output, reset=parsed.restart)
+    graph_search = searcher(parser, parsed, rate=parsed.rate)
+    params = search_params(parsed.query or "", parsed.api_key)
+    if not citations.depths:
+        if not parsed.query:
+            parser.error("a query is needed to start a new graph")
+        seeds = fetch_results(
+            params,
+            search=graph_search,
+            max_res=parsed.seeds,
+            workers=parsed.workers,
+        )
+        store.add(seeds)
+        citations.add_nodes((seed.result_id for seed in seeds), 0)
+    expand_citations(
+        citations,
+        store,
+        params,
+        search=graph_search,
+        max_depth=parsed.depth,
+        fan_out=parsed.fan_out,
+        parallel=parsed.parallel,
+        workers=parsed.workers,
+    )
+    print(
+        f"{len(citations.depths)} results and {len(citations.edges)}"
+        " citations"
+    )
+    store.export(parsed.output)
+    citations.export(parsed.output.with_suffix(".edges.json"))
@@ -1,14 +1,52 @@
 import argparse
+import asyncio
+import bisect
+import codecs
+from collections import Counter, defaultdict, deque
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from functools import partial
+import hashlib
+from html.parser import HTMLParser
+import itertools
+import json
 import os
 from pathlib import Path
 import re
+import signal
+import sqlite3
+import tempfile
+import sys
+import threading
 import time
-from typing import Collection, Iterator, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+)
+from urllib.parse import (
+    parse_qsl,
+    urlencode,
+    urljoin,
+    urlsplit,
+    urlunsplit,
+)
+from xml.etree import ElementTree
+import zlib
 
 import gdown
 import requests
-from requests.exceptions import HTTPError
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from platformdirs import user_cache_dir
 
 # Target web page URL (modify as needed)
 DRIVE_URL_RE = re.compile("^(?:https?://)?drive.google.com")
@@ -16,6 +54,34 @@ DRIVE_URL_SUB_RE = re.compile(
     r"https?://drive\.google\.com/file/d/([0-9a-zA-Z_\-]+)/view(?:\?.*)"
 )
 
+DEFAULT_CONCURRENCY = 16
+DEFAULT_PER_HOST = 4
+# requests per second per host, and how many may be made at once after idling
+DEFAULT_RATE = 4.0
+DEFAULT_BURST = 4
+CHUNK_SIZE = 64 * 1024
+TIMEOUT = 10
+DEFAULT_CACHE_DIR = Path(
+    user_cache_dir("danditools", "DandelionGood")
+).joinpath("scraper")
+DEFAULT_CACHE_MB = 256
+# a full page cache is evicted down to this fraction of its limit, so one scan
+# of it pays for many puts
+CACHE_EVICT_TO = 0.9
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# links followed as pages to crawl
+PAGE_SUFFIXES = (".htm", ".html", ".php", "/")
+SITEMAP_SUFFIXES = (".xml", ".xml.gz")
+DEFAULT_RETRIES = 3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# where a request's time goes, see `CrawlMetrics`
+PHASES = ("wait", "connect", "ttfb", "transfer")
+HISTOGRAM_BOUNDS_MS: tuple[int, ...] = tuple(1 << power for power in range(17))
+PROGRESS_INTERVAL = 1.0
+GZIP_MAGIC = b"\x1f\x8b"
+# files smaller than this aren't worth splitting into parallel segments
+DEFAULT_SEGMENT_MB = 8
+
 
 def dir_path_type(value: str) -> Path:
     path = Path(value)
@@ -40,116 +106,1573 @@ def xform_google_drive(url: str) -> str:
     return f"https://drive.google.com/uc?export=download&id={get_drive_id(url)}"
 
 
-def main():
+@dataclass
+class TokenBucket:
     """
-    CLI main entry point
+    Allows `rate` acquisitions a second on average, and up to `capacity` at
+    once after being idle
     """
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "--target_regex", "--TR", action="append", type=re.compile
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    updated: float = field(init=False, default_factory=time.monotonic)
+    lock: asyncio.Lock = field(init=False, default_factory=asyncio.Lock)
+
+    def __post_init__(self):
+        self.tokens = self.capacity
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    async def acquire(self) -> None:
+        # the lock keeps waiters in order, so none are starved
+        async with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class LinkExtractor(HTMLParser):
+    """
+    Pulls the text and href of each <a href> out of html as it's fed in,
+    without building a tree of the page
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links: list[tuple[str, str]] = []
+        self._href: str | None = None
+        self._text: list[str] = []
+
+    def _finish_link(self) -> None:
+        if self._href is not None:
+            self.links.append(("".join(self._text), self._href))
+            self._href = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        # anchors can't nest, so a new one ends any that's open
+        self._finish_link()
+        attrs = dict(attrs)
+        if "href" in attrs:
+            self._href = attrs["href"] or ""
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag == "a":
+            self._finish_link()
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._finish_link()
+
+    def pop_links(self) -> list[tuple[str, str]]:
+        links, self.links = self.links, []
+        return links
+
+
+def iter_links(
+    chunks: Iterable[bytes], encoding: str | None = None
+) -> Iterator[tuple[str, str]]:
+    """
+    Yield (text, href) for each link in the html arriving as `chunks`, as soon
+    as the chunk that ends it has arrived
+    """
+    decoder = codecs.getincrementaldecoder(encoding or "utf-8")(
+        errors="replace"
     )
-    parser.add_argument(
-        "--target_ext", "-T", action="append", dest="target_exts"
+    parser = LinkExtractor()
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+        yield from parser.pop_links()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield from parser.pop_links()
+
+
+def page_encoding(response: requests.Response) -> str:
+    """
+    The charset the response declares, or utf-8 rather than requests'
+    ISO-8859-1 default for text without one
+    """
+    if "charset" in response.headers.get("Content-Type", ""):
+        return response.encoding or "utf-8"
+    return "utf-8"
+
+
+class CachedPage(NamedTuple):
+    url: str
+    etag: str | None
+    last_modified: str | None
+    encoding: str | None
+    body: bytes
+
+    def validators(self) -> dict[str, str]:
+        """
+        Headers asking the server to only send the page if it's changed
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def text(self) -> str:
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+
+@dataclass
+class PageCache:
+    """
+    Fetched pages with their validators, kept in `cache_dir` and evicted least
+    recently used first once they take up more than `max_bytes`, down to
+    `CACHE_EVICT_TO` of it.
+
+    Each page is a body file and a json metadata file named by the hash of its
+    url. A body's mtime is bumped whenever it's used, which is the LRU order.
+    """
+
+    cache_dir: Path = DEFAULT_CACHE_DIR
+    max_bytes: int = DEFAULT_CACHE_MB * 2**20
+    size: int = field(init=False, default=0)
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = sum(path.stat().st_size for path in self._bodies())
+
+    def _bodies(self) -> Iterator[Path]:
+        return self.cache_dir.glob("*.body")
+
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return (
+            self.cache_dir.joinpath(f"{name}.json"),
+            self.cache_dir.joinpath(f"{name}.body"),
+        )
+
+    def get(self, url: str) -> CachedPage | None:
+        meta_path, body_path = self._paths(url)
+        # under the lock, so the page can't be evicted before it's bumped
+        with self.lock:
+            try:
+                meta = json.loads(meta_path.read_text())
+                body = body_path.read_bytes()
+                os.utime(body_path)
+            except (FileNotFoundError, ValueError):
+                return None
+        return CachedPage(url, body=body, **meta)
+
+    def put(
+        self,
+        url: str,
+        response: requests.Response,
+        body: bytes | None = None,
+        encoding: str | None = None,
+    ) -> None:
+        """
+        Keep the page `response` is for, with its `body` and `encoding` when
+        the response was streamed
+        """
+        if body is None:
+            body = response.content
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            # nothing to revalidate it with
+            return
+        meta_path, body_path = self._paths(url)
+        with self.lock:
+            if body_path.exists():
+                self.size -= body_path.stat().st_size
+            # written aside and swapped in, so readers never see half a page
+            for path, data in (
+                (body_path, body),
+                (
+                    meta_path,
+                    json.dumps(
+                        {
+                            "etag": etag,
+                            "last_modified": last_modified,
+                            "encoding": encoding or response.encoding,
+                        }
+                    ).encode(),
+                ),
+            ):
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+            self.size += len(body)
+            if self.size > self.max_bytes:
+                self._evict(int(self.max_bytes * CACHE_EVICT_TO))
+
+    def _evict(self, target: int) -> None:
+        bodies = sorted(
+            (stat.st_mtime, stat.st_size, path)
+            for path in self._bodies()
+            for stat in (path.stat(),)
+        )
+        for _, size, body_path in bodies:
+            if self.size <= target:
+                return
+            self.size -= size
+            body_path.unlink()
+            body_path.with_suffix(".json").unlink(missing_ok=True)
+
+
+# the connection setup time and responses of the request in this thread
+_request_local = threading.local()
+
+
+class _TimedConnection:
+    def connect(self) -> None:
+        start = time.perf_counter()
+        try:
+            super().connect()  # type: ignore[misc]
+        finally:
+            _request_local.connect = getattr(_request_local, "connect", 0.0) + (
+                time.perf_counter() - start
+            )
+
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    """
+    Times how long new connections take to set up (DNS, TCP and TLS), which
+    `requests` doesn't report on its own
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+@dataclass
+class Histogram:
+    """
+    Counts of seconds in power of two millisecond buckets
+    """
+
+    counts: list[int] = field(
+        default_factory=lambda: [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
     )
-    parser.add_argument("--follow", action="store_true")
-    parser.add_argument("--out_dir", type=dir_path_type, default="scrape_out")
-    parser.add_argument("start", nargs="+")
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
 
-    parsed = parser.parse_args()
-    print(parsed)
-    for link_title, link in get_download_links(
-        parsed.start,
-        parsed.target_exts,
-        parsed.target_regex,
-        follow=parsed.follow,
-    ):
-        download_file(link, parsed.out_dir, link_title)
+    def add(self, seconds: float) -> None:
+        self.counts[
+            bisect.bisect_left(HISTOGRAM_BOUNDS_MS, seconds * 1000)
+        ] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction: float) -> float:
+        """
+        The upper bound in seconds of the bucket holding `fraction` of counts
+        """
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return bound / 1000
+        return self.max
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets_ms": dict(
+                (str(bound), count)
+                for bound, count in zip(
+                    [*HISTOGRAM_BOUNDS_MS, "inf"], self.counts
+                )
+                if count
+            ),
+        }
 
 
-def get_download_links(
+@dataclass
+class HostMetrics:
+    requests: int = 0
+    bytes: int = 0
+    errors: int = 0
+    retries: int = 0
+    statuses: Counter[int] = field(default_factory=Counter)
+    latency: dict[str, Histogram] = field(
+        default_factory=lambda: dict((phase, Histogram()) for phase in PHASES)
+    )
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": dict(
+                (str(status), count) for status, count in self.statuses.items()
+            ),
+            "latency": dict(
+                (phase, histogram.summary())
+                for phase, histogram in self.latency.items()
+            ),
+        }
+
+
+@dataclass
+class CrawlMetrics:
+    """
+    What every request spent its time on, per host: waiting on our own limits,
+    setting up a connection, waiting for the first byte and transferring the
+    rest. Plus how much was downloaded, for progress.
+    """
+
+    hosts: defaultdict[str, HostMetrics] = field(
+        default_factory=lambda: defaultdict(HostMetrics)
+    )
+    started: float = field(default_factory=time.monotonic)
+    files: int = 0
+    file_bytes: int = 0
+    queue_depth: Callable[[], int] | None = None
+
+    def observe(
+        self,
+        host: str,
+        wait: float,
+        elapsed: float,
+        connect: float,
+        responses: list[requests.Response],
+        error: BaseException | None = None,
+    ) -> None:
+        host_metrics = self.hosts[host]
+        host_metrics.requests += 1
+        host_metrics.errors += error is not None
+        latency = host_metrics.latency
+        latency["wait"].add(wait)
+        latency["connect"].add(connect)
+        ttfb = 0.0
+        for response in responses:
+            host_metrics.statuses[response.status_code] += 1
+            retries = getattr(response.raw, "retries", None)
+            if retries is not None:
+                host_metrics.retries += len(retries.history)
+            if hasattr(response.raw, "tell"):
+                host_metrics.bytes += response.raw.tell()
+            ttfb += response.elapsed.total_seconds()
+        latency["ttfb"].add(max(0.0, ttfb - connect))
+        latency["transfer"].add(max(0.0, elapsed - ttfb))
+
+    def record_file(self, size: int) -> None:
+        self.files += 1
+        self.file_bytes += size
+
+    def summary(self) -> dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        latency = dict((phase, Histogram()) for phase in PHASES)
+        for host_metrics in self.hosts.values():
+            for phase, histogram in host_metrics.latency.items():
+                latency[phase].merge(histogram)
+        return {
+            "elapsed": elapsed,
+            "files": self.files,
+            "file_bytes": self.file_bytes,
+            "requests": sum(host.requests for host in self.hosts.values()),
+            "bytes": sum(host.bytes for host in self.hosts.values()),
+            "latency": dict(
+                (phase, histogram.summary())
+                for phase, histogram in latency.items()
+            ),
+            "hosts": dict(
+                (host, host_metrics.summary())
+                for host, host_metrics in self.hosts.items()
+            ),
+        }
+
+    def progress_line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        line = (
+            f"{self.files} files, {self.files / elapsed:.2f} files/s,"
+            f" {self.file_bytes / elapsed / 2**20:.2f} MB/s"
+        )
+        if self.queue_depth is not None:
+            line += f", {self.queue_depth()} queued"
+        return line
+
+
+def _timed_call[T](
+    func: Callable[[], T],
+) -> tuple[T | None, BaseException | None, float, float, list]:
+    _request_local.connect = 0.0
+    _request_local.responses = []
+    start = time.perf_counter()
+    result, error = None, None
+    try:
+        result = func()
+    except Exception as e:
+        error = e
+    return (
+        result,
+        error,
+        time.perf_counter() - start,
+        _request_local.connect,
+        _request_local.responses,
+    )
+
+
+def _collect_response(response: requests.Response, *args, **kwargs) -> None:
+    responses = getattr(_request_local, "responses", None)
+    if responses is not None:
+        responses.append(response)
+
+
+@dataclass
+class Fetcher:
+    """
+    Makes requests over a pool of keep-alive connections, at most
+    `concurrency` at a time and `per_host` at a time to any one host, with
+    each host rate limited by its own `TokenBucket`. Pages are revalidated
+    against the `cache` when there is one. Failed requests are retried with
+    backoff, and every request is recorded in `metrics`.
+
+    `requests` is blocking, so each request runs in a worker thread.
+    """
+
+    concurrency: int = DEFAULT_CONCURRENCY
+    per_host: int = DEFAULT_PER_HOST
+    rate: float = DEFAULT_RATE
+    burst: int = DEFAULT_BURST
+    cache: PageCache | None = None
+    metrics: CrawlMetrics = field(default_factory=CrawlMetrics)
+    session: requests.Session = field(default_factory=requests.Session)
+    total_limit: asyncio.Semaphore = field(init=False)
+    host_limits: defaultdict[str, asyncio.Semaphore] = field(init=False)
+    buckets: defaultdict[str, TokenBucket] = field(init=False)
+
+    def __post_init__(self):
+        adapter = TimedAdapter(
+            pool_connections=self.concurrency,
+            pool_maxsize=self.per_host,
+            max_retries=Retry(
+                total=DEFAULT_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=RETRY_STATUSES,
+                raise_on_status=False,
+            ),
+        )
+        self.session.hooks["response"].append(_collect_response)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.total_limit = asyncio.Semaphore(self.concurrency)
+        self.host_limits = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self.buckets = defaultdict(lambda: TokenBucket(self.rate, self.burst))
+
+    async def run[T](self, url: str, func: Callable[[], T]) -> T:
+        """
+        Run `func`, which makes a request to `url`, within the limits
+        """
+        host = urlsplit(url).netloc
+        queued = time.perf_counter()
+        async with self.total_limit, self.host_limits[host]:
+            await self.buckets[host].acquire()
+            wait = time.perf_counter() - queued
+            result, error, elapsed, connect, responses = (
+                await asyncio.to_thread(_timed_call, func)
+            )
+        self.metrics.observe(host, wait, elapsed, connect, responses, error)
+        if error is not None:
+            raise error
+        return result  # type: ignore[return-value]
+
+    async def stream[T](
+        self, url: str, func: Callable[[], Iterable[T]]
+    ) -> AsyncGenerator[T]:
+        """
+        Like `run`, but yield what `func` yields as it's produced, rather than
+        once the whole response has been read.
+
+        The thread never waits on the reader, which may itself be waiting on
+        requests that need the limits it holds, so a slow reader leaves what
+        it hasn't got to yet queued, as much as a list of it would be.
+        """
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue[tuple[T] | None] = asyncio.Queue()
+        stopped = threading.Event()
+
+        def produce() -> None:
+            try:
+                for item in func():
+                    if stopped.is_set():
+                        return
+                    loop.call_soon_threadsafe(items.put_nowait, (item,))
+            finally:
+                loop.call_soon_threadsafe(items.put_nowait, None)
+
+        fetch = asyncio.create_task(self.run(url, produce))
+        try:
+            while (item := await items.get()) is not None:
+                yield item[0]
+        finally:
+            stopped.set()
+            # the thread stops at its next item, and any error is raised here
+            await fetch
+
+    def _get_page(self, url: str) -> str:
+        cached = None if self.cache is None else self.cache.get(url)
+        response = self.session.get(
+            url,
+            headers={} if cached is None else cached.validators(),
+            timeout=TIMEOUT,
+        )
+        if cached is not None and response.status_code == 304:
+            return cached.text()
+        response.raise_for_status()
+        if self.cache is not None:
+            self.cache.put(url, response)
+        return response.text
+
+    def _get_links(self, url: str) -> Iterator[tuple[str, str]]:
+        cached = None if self.cache is None else self.cache.get(url)
+        with self.session.get(
+            url,
+            headers={} if cached is None else cached.validators(),
+            stream=True,
+            timeout=TIMEOUT,
+        ) as response:
+            if cached is not None and response.status_code == 304:
+                yield from iter_links([cached.body], cached.encoding)
+                return
+            response.raise_for_status()
+            encoding = page_encoding(response)
+            # only kept when there's a cache to keep it in
+            body: list[bytes] | None = None if self.cache is None else []
+
+            def chunks() -> Iterator[bytes]:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if body is not None:
+                        body.append(chunk)
+                    yield chunk
+
+            yield from iter_links(chunks(), encoding)
+        # only reached once the whole page has been read
+        if self.cache is not None and body is not None:
+            self.cache.put(url, response, b"".join(body), encoding)
+
+    def get_links(self, url: str) -> AsyncGenerator[tuple[str, str]]:
+        """
+        The (text, href) of each link on the page at `url`, yielded as the
+        page streams in, or from the cache if it hasn't changed
+        """
+        return self.stream(url, lambda: self._get_links(url))
+
+    async def get_page(self, url: str) -> str:
+        """
+        The text of the page at `url`, from the cache if it hasn't changed
+        """
+        return await self.run(url, lambda: self._get_page(url))
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def canonicalize_url(href: str, base: str | None = None) -> str | None:
+    """
+    The absolute form of `href` on the page at `base`, so each page has one
+    spelling: lower case scheme and host, no default port, fragment or empty
+    path, and sorted query parameters. None for anything that isn't http(s),
+    or that is too malformed to parse (a bad port or IPv6 host).
+    """
+    try:
+        url = urlsplit(urljoin(base, href.strip()) if base else href.strip())
+        port = url.port
+    except ValueError:
+        return None
+    scheme = url.scheme.lower()
+    if scheme not in ("http", "https") or not url.hostname:
+        return None
+    netloc = url.hostname.lower()
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    if url.username is not None:
+        netloc = f"{url.username}@{netloc}"
+    query = urlencode(sorted(parse_qsl(url.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, url.path or "/", query, ""))
+
+
+def is_target(
+    url: str,
+    target_exts: tuple[str, ...],
+    target_res: Collection[re.Pattern],
+) -> bool:
+    return (
+        url.endswith(target_exts)
+        or urlsplit(url).path.endswith(target_exts)
+        or any(tre.match(url) for tre in target_res)
+    )
+
+
+def is_page(url: str) -> bool:
+    return urlsplit(url).path.endswith(PAGE_SUFFIXES)
+
+
+@dataclass
+class Frontier:
+    """
+    The breadth first queue of pages to crawl, which is also the set of every
+    page and download link seen, kept in SQLite at `path` (or a temporary
+    file) so huge crawls don't have to fit in memory.
+
+    Pages are queued in the order they were found, and popped in that order
+    by rowid, so each is only ever queued once.
+    """
+
+    path: Path | None = None
+    db: sqlite3.Connection = field(init=False)
+    last_popped: int = field(init=False, default=0)
+    _temporary: bool = field(init=False, default=False)
+
+    def __post_init__(self):
+        if self.path is None:
+            fd, name = tempfile.mkstemp(suffix=".sqlite")
+            os.close(fd)
+            self.path = Path(name)
+            self._temporary = True
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.executescript(
+            """
+            PRAGMA synchronous = OFF;
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, depth INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS links (url TEXT PRIMARY KEY);
+            """
+        )
+
+    def push(self, url: str, depth: int) -> bool:
+        """
+        Queue `url` unless it's been seen before, returning whether it was
+        """
+        return (
+            self.db.execute(
+                "INSERT OR IGNORE INTO pages VALUES (?, ?)", (url, depth)
+            ).rowcount
+            == 1
+        )
+
+    def pop(self) -> tuple[str, int] | None:
+        row = self.db.execute(
+            "SELECT rowid, url, depth FROM pages WHERE rowid > ?"
+            " ORDER BY rowid LIMIT 1",
+            (self.last_popped,),
+        ).fetchone()
+        if row is None:
+            return None
+        self.last_popped, url, depth = row
+        return url, depth
+
+    def add_link(self, url: str) -> bool:
+        """
+        Record a download link, returning whether it's new
+        """
+        return (
+            self.db.execute(
+                "INSERT OR IGNORE INTO links VALUES (?)", (url,)
+            ).rowcount
+            == 1
+        )
+
+    def close(self) -> None:
+        self.db.close()
+        # a temporary frontier always has the path it was given in post init
+        if self._temporary and self.path is not None:
+            self.path.unlink()
+
+
+async def get_download_links(
+    fetcher: Fetcher,
     start_pages: list[str],
     target_exts: Collection[str] | None = None,
     target_res: Collection[re.Pattern] | None = None,
-    checked: set[str] | None = None,
     follow: bool | int = False,
-) -> Iterator[str]:
+    hosts: Collection[str] | None = None,
+    frontier: Frontier | None = None,
+) -> AsyncIterator[tuple[str, str]]:
+    """
+    Crawl breadth first from `start_pages`, yielding the text and url of each
+    download link once.
+
+    `follow` is how many links deep to follow pages, or True for no limit.
+    Only pages on `hosts` are followed, the hosts of `start_pages` unless
+    given, or any host when it's empty.
+    """
 
     if not any([target_exts, target_res]):
         raise TypeError(
             "Either `target_exts` or `target_res` must be provided."
         )
 
-    if target_exts is None:
-        target_exts = ()
+    target_exts = () if target_exts is None else tuple(target_exts)
+    target_res = target_res or ()
+    max_depth = None if follow is True else int(follow)
+    own_frontier = frontier is None
+    if frontier is None:
+        frontier = Frontier()
+    start_urls = [
+        url
+        for url in (canonicalize_url(page) for page in start_pages)
+        if url is not None
+    ]
+    if hosts is None:
+        hosts = {urlsplit(url).netloc for url in start_urls}
+    for url in start_urls:
+        frontier.push(url, 0)
+
+    # bounded, so a slow reader holds the crawl back rather than the links
+    # piling up
+    found: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue(
+        maxsize=fetcher.concurrency * 4
+    )
+
+    async def crawl_page(page_url: str, depth: int) -> None:
+        # links are queued as the page streams in
+        page_links = fetcher.get_links(page_url)
+        try:
+            async with aclosing(page_links):
+                async for text, href in page_links:
+                    url = canonicalize_url(href, page_url)
+                    if url is None:
+                        continue
+                    if (
+                        (max_depth is None or depth < max_depth)
+                        and is_page(url)
+                        and (not hosts or urlsplit(url).netloc in hosts)
+                    ):
+                        frontier.push(url, depth + 1)
+                    if (
+                        is_target(href, target_exts, target_res)
+                        or is_target(url, target_exts, target_res)
+                    ) and frontier.add_link(url):
+                        await found.put((text, url))
+        except requests.RequestException as e:
+            print(f"Error crawling {page_url}: {e}")
+
+    async def crawl() -> None:
+        # iterative, keeping as many pages in flight as the fetcher allows
+        in_flight: set[asyncio.Task] = set()
+        try:
+            while True:
+                while len(in_flight) < fetcher.concurrency and (
+                    (item := frontier.pop()) is not None
+                ):
+                    in_flight.add(asyncio.create_task(crawl_page(*item)))
+                if not in_flight:
+                    return
+                done, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+        finally:
+            for task in in_flight:
+                task.cancel()
+            # once cancelled the reader has gone, and with found full the end
+            # would never be taken
+            if not crawler.cancelling():
+                await found.put(None)
+
+    crawler = asyncio.create_task(crawl())
+    try:
+        while (link := await found.get()) is not None:
+            yield link
+        await crawler
+    finally:
+        crawler.cancel()
+        if own_frontier:
+            frontier.close()
+
+
+def _gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    yield decompressor.flush()
+
+
+def parse_sitemap(chunks: Iterable[bytes]) -> Iterator[tuple[str, str]]:
+    """
+    Incrementally parse a sitemap or sitemap index, gzipped or not, yielding
+    ("sitemap", loc) for each sitemap it lists and ("url", loc) for each page.
+    Elements are dropped as they're parsed, so memory doesn't grow with it.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, b"")
+    if first.startswith(GZIP_MAGIC):
+        chunks = _gunzip(itertools.chain([first], chunks))
     else:
-        target_exts = tuple(target_exts)
-    if checked is None:
-        checked = set().union(start_pages)
+        chunks = itertools.chain([first], chunks)
+    parser: ElementTree.XMLPullParser[ElementTree.Element] = (
+        ElementTree.XMLPullParser(events=("end",))
+    )
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event in parser.read_events():
+            elem = event[-1]
+            if not isinstance(elem, ElementTree.Element):
+                continue
+            kind = elem.tag.rpartition("}")[2]
+            if kind not in ("sitemap", "url"):
+                continue
+            for child in elem:
+                if child.tag.rpartition("}")[2] == "loc" and child.text:
+                    yield kind, child.text.strip()
+            elem.clear()
+    parser.close()
+
+
+def read_sitemap(
+    session: requests.Session, url: str
+) -> Iterator[tuple[str, str]]:
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        yield from parse_sitemap(response.iter_content(CHUNK_SIZE))
+
+
+async def find_sitemaps(fetcher: Fetcher, start_page: str) -> list[str]:
+    """
+    The sitemaps for the site of `start_page`: itself if it's a sitemap, or
+    those listed in robots.txt, or sitemap.xml if that exists
+    """
+    url = urlsplit(start_page)
+    if url.path.endswith(SITEMAP_SUFFIXES):
+        return [start_page]
+    root = f"{url.scheme}://{url.netloc}"
+    try:
+        robots = await fetcher.get_page(f"{root}/robots.txt")
+    except requests.RequestException:
+        robots = ""
+    sitemaps = [
+        line.partition(":")[2].strip()
+        for line in robots.splitlines()
+        if line.lower().startswith("sitemap:")
+    ]
+    if sitemaps:
+        return sitemaps
+    try:
+        await fetcher.run(
+            root,
+            partial(RemoteFile.probe, fetcher.session, f"{root}/sitemap.xml"),
+        )
+    except requests.RequestException:
+        return []
+    return [f"{root}/sitemap.xml"]
 
-    for start_page in start_pages:
-        response = requests.get(start_page)
-        if response.status_code != 200:
-            response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, "html.parser")
+async def get_sitemap_links(
+    fetcher: Fetcher,
+    start_pages: list[str],
+    target_exts: Collection[str] | None = None,
+    target_res: Collection[re.Pattern] | None = None,
+    follow: bool | int = False,
+    hosts: Collection[str] | None = None,
+) -> AsyncIterator[tuple[str, str]]:
+    """
+    Yield the download links listed in the sitemaps of `start_pages`, without
+    fetching anything but the sitemaps.
+
+    Sites without a sitemap are crawled from their start page instead, as are
+    the pages their sitemaps list when following links.
+    """
+
+    if not any([target_exts, target_res]):
+        raise TypeError(
+            "Either `target_exts` or `target_res` must be provided."
+        )
 
-        for tag in soup.find_all("a", href=True):
-            href = tag["href"]
-            if follow and href.endswith((".htm", ".html", ".php", "/")):
-                if follow is not True:
-                    follow -= 1
+    target_exts = () if target_exts is None else tuple(target_exts)
+    target_res = target_res or ()
+    frontier = Frontier()
+    to_crawl: list[str] = []
+    try:
+        for start_page in start_pages:
+            sitemaps = deque(await find_sitemaps(fetcher, start_page))
+            if not sitemaps:
+                print(f"No sitemap for {start_page}, crawling it")
+                to_crawl.append(start_page)
+                continue
+            seen = set(sitemaps)
+            while sitemaps:
+                sitemap = sitemaps.popleft()
+                # entries are handled as the sitemap streams in
+                entries = fetcher.stream(
+                    sitemap, partial(read_sitemap, fetcher.session, sitemap)
+                )
                 try:
-                    yield from get_download_links(
-                        href, checked=checked, follow=follow
-                    )
-                except HTTPError:
-                    continue
-            if not href.startswith("http"):
-                import pdb
-
-                pdb.set_trace()
-            if href.endswith(target_exts) or any(
-                tre.match(href) for tre in (target_res or [])
+                    async with aclosing(entries):
+                        async for kind, loc in entries:
+                            url = canonicalize_url(loc)
+                            if url is None:
+                                continue
+                            if kind == "sitemap":
+                                if url not in seen:
+                                    seen.add(url)
+                                    sitemaps.append(url)
+                            elif is_target(url, target_exts, target_res):
+                                if frontier.add_link(url):
+                                    yield "", url
+                            elif follow:
+                                to_crawl.append(url)
+                except (requests.RequestException, ElementTree.ParseError) as e:
+                    print(f"Error reading sitemap {sitemap}: {e}")
+        if to_crawl:
+            async for link in get_download_links(
+                fetcher,
+                to_crawl,
+                target_exts,
+                target_res,
+                follow=follow,
+                hosts=hosts,
+                frontier=frontier,
             ):
+                yield link
+    finally:
+        frontier.close()
 
-                # TODO not example dot com eh?
-                full_url = (
-                    href
-                    if href.startswith("http")
-                    else "https://example.com" + href
-                )
-                yield tag.text, full_url
-
-
-def download_file(url, download_dir: Path, base_filename: str | None = None):
-    """Save the file from the link (append a number if the filename already exists)"""
-    if base_filename is None:
-        base_filename: str = url.split("/")[-1].rsplit("?", 1)[0]
-    base_path: Path = Path(base_filename)  # type: ignore[arg-type]
-    filepath: Path = download_dir.joinpath(base_path)
-    counter = 1
-
-    while filepath.exists():
-        filepath = filepath.with_name(f"{base_filename}_{counter}").with_suffix(
-            base_path.suffix
-        )
-        counter += 1
-    if is_google_drive(url):
-        url = xform_google_drive(url)
-        print(f"Downloading: {url}")
-        gdown.download(url, str(filepath))
+
+@dataclass
+class DownloadStore:
+    """
+    Downloads kept once each under `root`/.store by the sha256 of their
+    content, with the friendly names in `root` linked to them.
+
+    A SQLite index maps each url to its hash and friendly name, so known urls
+    are skipped without a request and identical files are only stored once.
+    Friendly names that are taken get a counter, which the index keeps per
+    name so collisions don't need a search.
+    """
+
+    root: Path
+    db: sqlite3.Connection = field(init=False)
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        # downloads finish in worker threads, so access is serialised by lock
+        self.db = sqlite3.connect(
+            self.store_dir / "index.sqlite", check_same_thread=False
+        )
+        with self.db:
+            self.db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY, hash TEXT NOT NULL, name TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS names (
+                    name TEXT PRIMARY KEY, hash TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS name_counts (
+                    base TEXT PRIMARY KEY, count INTEGER NOT NULL
+                );
+                """
+            )
+
+    @property
+    def store_dir(self) -> Path:
+        return self.root / ".store"
+
+    def blob_path(self, digest: str) -> Path:
+        return self.store_dir.joinpath(digest[:2], digest[2:])
+
+    def part_path(self, url: str) -> Path:
+        """
+        Where the download of `url` is kept while it's incomplete, so an
+        interrupted download can be resumed
+        """
+        partial_dir = self.store_dir / "partial"
+        partial_dir.mkdir(exist_ok=True)
+        return partial_dir.joinpath(
+            f"{hashlib.sha256(url.encode()).hexdigest()}.part"
+        )
+
+    def lookup_url(self, url: str) -> Path | None:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT name FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        return None if row is None else self.root / row[0]
+
+    def _claim_name(self, base_name: str, digest: str) -> str:
+        row = self.db.execute(
+            "SELECT hash FROM names WHERE name = ?", (base_name,)
+        ).fetchone()
+        if row is not None and row[0] == digest:
+            return base_name
+        row = self.db.execute(
+            "SELECT count FROM name_counts WHERE base = ?", (base_name,)
+        ).fetchone()
+        count = 0 if row is None else row[0]
+        base_path = Path(base_name)
+        while True:
+            name = (
+                base_name
+                if not count
+                else f"{base_path.stem}_{count}{base_path.suffix}"
+            )
+            count += 1
+            # names from before the index existed are left alone
+            if not self.root.joinpath(name).exists():
+                break
+        self.db.execute(
+            "INSERT OR REPLACE INTO name_counts VALUES (?, ?)",
+            (base_name, count),
+        )
+        self.db.execute("INSERT INTO names VALUES (?, ?)", (name, digest))
+        return name
+
+    def add(
+        self, url: str, part_path: Path, digest: str, base_name: str
+    ) -> Path:
+        """
+        Move the download at `part_path` into the store, unless its content is
+        already there, and link a friendly name for it
+        """
+        blob_path = self.blob_path(digest)
+        if blob_path.exists():
+            part_path.unlink()
+        else:
+            blob_path.parent.mkdir(exist_ok=True)
+            os.replace(part_path, blob_path)
+        with self.lock, self.db:
+            name = self._claim_name(base_name, digest)
+            self.db.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?)",
+                (url, digest, name),
+            )
+        filepath = self.root / name
+        if not filepath.exists():
+            try:
+                os.link(blob_path, filepath)
+            except OSError:
+                # hard links don't cross filesystems
+                filepath.symlink_to(blob_path)
+        return filepath
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def hash_file(path: Path) -> str:
+    with path.open("rb") as file_handle:
+        return hashlib.file_digest(file_handle, "sha256").hexdigest()
+
+
+class ResourceChanged(Exception):
+    """
+    The resource changed between requests for parts of it
+    """
+
+
+class RemoteFile(NamedTuple):
+    length: int | None
+    accepts_ranges: bool
+    validator: str | None
+
+    @classmethod
+    def from_response(cls, response: requests.Response) -> "RemoteFile":
+        length = response.headers.get("Content-Length")
+        return cls(
+            None if length is None else int(length),
+            response.headers.get("Accept-Ranges") == "bytes",
+            response.headers.get("ETag")
+            or response.headers.get("Last-Modified"),
+        )
+
+    @classmethod
+    def probe(cls, session: requests.Session, url: str) -> "RemoteFile":
+        response = session.head(url, allow_redirects=True, timeout=TIMEOUT)
+        response.raise_for_status()
+        return cls.from_response(response)
+
+
+def _validator_path(part_path: Path) -> Path:
+    return part_path.with_suffix(".validator")
+
+
+def _stream_to(session: requests.Session, url: str, part_path: Path) -> str:
+    """
+    Stream `url` to `part_path`, returning the sha256 of the whole file.
+
+    What's already in `part_path` from an interrupted download is kept and
+    only the rest requested, as long as the server still has the same
+    version of it.
+    """
+    digest = hashlib.sha256()
+    validator_path = _validator_path(part_path)
+    have = part_path.stat().st_size if part_path.exists() else 0
+    headers = {}
+    if have and validator_path.exists():
+        headers["Range"] = f"bytes={have}-"
+        headers["If-Range"] = validator_path.read_text()
+    with session.get(
+        url, headers=headers, stream=True, timeout=TIMEOUT
+    ) as response:
+        if response.status_code == 416:
+            # nothing left to send
+            return hash_file(part_path)
+        response.raise_for_status()
+        resumed = response.status_code == 206
+        if not resumed:
+            validator = RemoteFile.from_response(response).validator
+            if validator is None:
+                validator_path.unlink(missing_ok=True)
+            else:
+                validator_path.write_text(validator)
+        with open(part_path, "r+b" if resumed else "wb") as f:
+            if resumed:
+                while chunk := f.read(CHUNK_SIZE):
+                    digest.update(chunk)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+    validator_path.unlink(missing_ok=True)
+    return digest.hexdigest()
+
+
+def _fetch_segment(
+    session: requests.Session,
+    url: str,
+    segment_path: Path,
+    start: int,
+    stop: int,
+    validator: str,
+) -> None:
+    """
+    Download bytes `start` to `stop` of `url` to `segment_path`, resuming
+    from what's already there
+    """
+    have = segment_path.stat().st_size if segment_path.exists() else 0
+    if have >= stop - start:
         return
+    with session.get(
+        url,
+        headers={
+            "Range": f"bytes={start + have}-{stop - 1}",
+            "If-Range": validator,
+        },
+        stream=True,
+        timeout=TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise ResourceChanged(url)
+        with open(segment_path, "ab") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+
+
+def segment_ranges(length: int, segments: int) -> list[tuple[int, int]]:
+    size = -(-length // segments)
+    return [
+        (start, min(start + size, length)) for start in range(0, length, size)
+    ]
+
+
+async def _download_segments(
+    fetcher: Fetcher,
+    url: str,
+    part_path: Path,
+    remote: RemoteFile,
+    segments: int,
+) -> str:
+    """
+    Download `url` as `segments` parallel ranges, then check each came back
+    whole and stitch them into `part_path`
+    """
+    assert remote.length is not None and remote.validator is not None
+    validator_path = _validator_path(part_path)
+    if (
+        validator_path.exists()
+        and validator_path.read_text() != remote.validator
+    ):
+        # segments left over from an older version of the file
+        for segment_path in part_path.parent.glob(f"{part_path.name}.*"):
+            segment_path.unlink()
+    validator_path.write_text(remote.validator)
+
+    ranges = segment_ranges(remote.length, segments)
+    segment_paths = [
+        part_path.with_name(f"{part_path.name}.{num}")
+        for num in range(len(ranges))
+    ]
+    await asyncio.gather(
+        *(
+            fetcher.run(
+                url,
+                partial(
+                    _fetch_segment,
+                    fetcher.session,
+                    url,
+                    segment_path,
+                    start,
+                    stop,
+                    remote.validator,
+                ),
+            )
+            for segment_path, (start, stop) in zip(segment_paths, ranges)
+        )
+    )
+
+    def stitch() -> str:
+        for segment_path, (start, stop) in zip(segment_paths, ranges):
+            if segment_path.stat().st_size != stop - start:
+                raise ResourceChanged(url)
+        digest = hashlib.sha256()
+        with part_path.open("wb") as f:
+            for segment_path in segment_paths:
+                with segment_path.open("rb") as segment:
+                    while chunk := segment.read(CHUNK_SIZE):
+                        digest.update(chunk)
+                        f.write(chunk)
+                segment_path.unlink()
+        validator_path.unlink()
+        return digest.hexdigest()
+
+    return await asyncio.to_thread(stitch)
+
+
+def _drive_download(url: str, filepath: Path) -> str:
+    gdown.download(url, str(filepath), resume=True)
+    return hash_file(filepath)
+
+
+async def download_file(
+    fetcher: Fetcher,
+    store: DownloadStore,
+    url: str,
+    base_filename: str | None = None,
+    segments: int = 1,
+    segment_min_bytes: int = DEFAULT_SEGMENT_MB * 2**20,
+) -> Optional[Path]:
+    """
+    Save the file from the link into `store`, skipping urls it already has.
+
+    Interrupted downloads are resumed. Files of at least `segment_min_bytes`
+    from servers that accept ranges are downloaded as `segments` parallel
+    ranges.
+    """
+    if (known := store.lookup_url(url)) is not None:
+        print(f"Already have: {url}")
+        return known
+    if not base_filename:
+        base_filename = url.split("/")[-1].rsplit("?", 1)[0]
+    base_filename = base_filename.strip().replace(os.sep, "_")
+    part_path = store.part_path(url)
+    fetch_url = url
     print(f"Downloading: {url}")
     try:
-        response = requests.get(url, stream=True, timeout=10)
-        with open(filepath, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"Saved: {filepath}")
-    except requests.RequestException as e:
+        if is_google_drive(url):
+            fetch_url = xform_google_drive(url)
+            digest = await fetcher.run(
+                fetch_url, partial(_drive_download, fetch_url, part_path)
+            )
+        else:
+            remote = None
+            if segments > 1:
+                remote = await fetcher.run(
+                    url, partial(RemoteFile.probe, fetcher.session, url)
+                )
+            if (
+                remote is not None
+                and remote.accepts_ranges
+                and remote.validator is not None
+                and (remote.length or 0) >= segment_min_bytes
+            ):
+                digest = await _download_segments(
+                    fetcher, url, part_path, remote, segments
+                )
+            else:
+                digest = await fetcher.run(
+                    url,
+                    partial(_stream_to, fetcher.session, url, part_path),
+                )
+    except (requests.RequestException, ResourceChanged) as e:
+        # what was downloaded is kept to resume from next time
         print(f"Error downloading {url}: {e}")
+        return None
+    filepath = await asyncio.to_thread(
+        store.add, url, part_path, digest, base_filename
+    )
+    fetcher.metrics.record_file(filepath.stat().st_size)
+    print(f"Saved: {filepath}")
+    return filepath
+
+
+async def scrape(
+    start_pages: list[str],
+    out_dir: Path,
+    target_exts: Collection[str] | None = None,
+    target_res: Collection[re.Pattern] | None = None,
+    follow: bool | int = False,
+    fetcher: Fetcher | None = None,
+    hosts: Collection[str] | None = None,
+    sitemap: bool = False,
+    segments: int = 1,
+    segment_min_bytes: int = DEFAULT_SEGMENT_MB * 2**20,
+    metrics_path: Path | None = None,
+    progress: bool = False,
+) -> list[Path]:
+    """
+    Crawl for links and download them in a pipeline, so downloads start as
+    soon as the first links are found, with as many download workers as the
+    fetcher allows concurrent requests. With `sitemap` links are found from
+    sitemaps rather than crawling.
+
+    The fetcher's metrics are written as json to `metrics_path` at the end,
+    and whenever SIGUSR1 is received along with a progress line. With
+    `progress` that line is kept up to date as it goes.
+    """
+    if fetcher is None:
+        fetcher = Fetcher()
+    store = DownloadStore(out_dir)
+    links: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue(
+        maxsize=fetcher.concurrency * 4
+    )
+    saved: list[Path] = []
+    metrics = fetcher.metrics
+    metrics.queue_depth = links.qsize
+
+    def report() -> None:
+        print(metrics.progress_line(), file=sys.stderr)
+        dump_metrics(metrics, metrics_path)
+
+    async def show_progress() -> None:
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            print(f"\r{metrics.progress_line()}", end="", file=sys.stderr)
+
+    async def crawl() -> None:
+        try:
+            async for link_title, link in (
+                get_sitemap_links if sitemap else get_download_links
+            )(
+                fetcher,
+                start_pages,
+                target_exts,
+                target_res,
+                follow=follow,
+                hosts=hosts,
+            ):
+                await links.put((link_title, link))
+        finally:
+            for _ in range(fetcher.concurrency):
+                await links.put(None)
+
+    async def download() -> None:
+        while (item := await links.get()) is not None:
+            link_title, link = item
+            filepath = await download_file(
+                fetcher, store, link, link_title, segments, segment_min_bytes
+            )
+            if filepath is not None:
+                saved.append(filepath)
+
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, "SIGUSR1"):
+        loop.add_signal_handler(signal.SIGUSR1, report)
+    progress_task = asyncio.create_task(show_progress()) if progress else None
+    try:
+        await asyncio.gather(
+            crawl(), *(download() for _ in range(fetcher.concurrency))
+        )
+    finally:
+        if progress_task is not None:
+            progress_task.cancel()
+            print(file=sys.stderr)
+        if hasattr(signal, "SIGUSR1"):
+            loop.remove_signal_handler(signal.SIGUSR1)
+        fetcher.close()
+        store.close()
+        if metrics_path is not None:
+            dump_metrics(metrics, metrics_path)
+    return saved
+
+
+def dump_metrics(metrics: CrawlMetrics, path: Path | None) -> None:
+    """
+    Write the metrics summary to `path`, or stderr without one
+    """
+    summary = json.dumps(metrics.summary(), indent=2)
+    if path is None:
+        print(summary, file=sys.stderr)
+    else:
+        path.write_text(summary)
+
+
+def main():
+    """
+    CLI main entry point
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--target_regex", "--TR", action="append", type=re.compile
+    )
+    parser.add_argument(
+        "--target_ext", "-T", action="append", dest="target_exts"
+    )
+    parser.add_argument("--follow", action="store_true")
+    parser.add_argument(
+        "--sitemap",
+        action="store_true",
+        help="find links from the sites' sitemaps instead of crawling",
+    )
+    parser.add_argument(
+        "--depth", type=int, help="how many links deep to follow pages"
+    )
+    parser.add_argument(
+        "--host",
+        action="append",
+        dest="hosts",
+        help="follow pages on this host, by default the start pages' hosts",
+    )
+    parser.add_argument(
+        "--any_host",
+        action="store_const",
+        const=[],
+        dest="hosts",
+        help="follow pages on any host",
+    )
+    parser.add_argument("--out_dir", type=dir_path_type, default="scrape_out")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="most requests in flight at once",
+    )
+    parser.add_argument(
+        "--per_host",
+        type=int,
+        default=DEFAULT_PER_HOST,
+        help="most requests in flight to any one host",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help="requests per second to any one host",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=DEFAULT_BURST,
+        help="requests a host may get at once after being idle",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="where fetched pages are kept to revalidate on later runs",
+    )
+    parser.add_argument(
+        "--cache_mb",
+        type=float,
+        default=DEFAULT_CACHE_MB,
+        help="most the page cache may take up before evicting",
+    )
+    parser.add_argument("--no_cache", "--no-cache", action="store_true")
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="parallel ranges to download large files in, where supported",
+    )
+    parser.add_argument(
+        "--segment_mb",
+        type=float,
+        default=DEFAULT_SEGMENT_MB,
+        help="smallest file to download in segments",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        help="write a json summary of request timings and sizes here",
+    )
+    parser.add_argument(
+        "--progress", action="store_true", help="show a live progress line"
+    )
+    parser.add_argument("start", nargs="+")
+
+    parsed = parser.parse_args()
+    print(parsed)
+
+    async def run() -> list[Path]:
+        # the fetcher's semaphores belong to the running loop
+        return await scrape(
+            parsed.start,
+            parsed.out_dir,
+            parsed.target_exts,
+            parsed.target_regex,
+            follow=parsed.follow if parsed.depth is None else parsed.depth,
+            fetcher=Fetcher(
+                parsed.concurrency,
+                parsed.per_host,
+                parsed.rate,
+                parsed.burst,
+                cache=(
+                    None
+                    if parsed.no_cache
+                    else PageCache(
+                        parsed.cache_dir, int(parsed.cache_mb * 2**20)
+                    )
+                ),
+            ),
+            hosts=parsed.hosts,
+            sitemap=parsed.sitemap,
+            segments=parsed.segments,
+            segment_min_bytes=int(parsed.segment_mb * 2**20),
+            metrics_path=parsed.metrics,
+            progress=parsed.progress,
+        )
 
-    time.sleep(
-        1
-    )  # Wait a bit to avoid sending too many requests in a short time
+    asyncio.run(run())
@@ -0,0 +1,51 @@
+"""
+Compare fetching every page of a query one after another with fetching them
+concurrently, against a fake search with a fixed per-call latency:
+
+    python -m tests.danditools.bench_scholar --results 1000 --latency 0.2
+"""
+
+import argparse
+import time
+
+import danditools.scholar
+from tests.danditools.test_scholar import PARAMS, FakeSearch, no_wait_backoff
+
+
+def measure(total: int, latency: float, workers: int) -> float:
+    fake = FakeSearch(total=total, latency=latency)
+    start = time.perf_counter()
+    results = danditools.scholar.fetch_results(
+        PARAMS, search=fake, workers=workers, backoff=no_wait_backoff()
+    )
+    elapsed = time.perf_counter() - start
+    assert [result.result_id for result in results] == [
+        f"id{num}" for num in range(min(total, danditools.scholar.MAX_RESULTS))
+    ]
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parsed = parser.parse_args()
+
+    pages = -(
+        -min(parsed.results, danditools.scholar.MAX_RESULTS)
+        // danditools.scholar.PER_PAGE
+    )
+    print(f"{pages} pages, {parsed.latency}s a call")
+    baseline = None
+    for workers in parsed.workers:
+        seconds = measure(parsed.results, parsed.latency, workers)
+        baseline = baseline or seconds
+        print(
+            f"{workers:>3} workers: {seconds:.2f}s"
+            f" ({baseline / seconds:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
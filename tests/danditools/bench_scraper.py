@@ -0,0 +1,90 @@
+"""
+Compare the streaming link extractor with the BeautifulSoup tree it replaced
+on a large generated index page:
+
+    python -m tests.danditools.bench_scraper --links 10000
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Callable
+
+from bs4 import BeautifulSoup
+
+import danditools.scraper
+
+
+def index_page(num_links: int) -> bytes:
+    rows = "".join(
+        f'<tr><td><img src="/icons/pdf.gif" alt="[PDF]"></td>'
+        f'<td><a href="files/report_{num}.pdf">Report &#8470; {num}</a></td>'
+        f'<td align="right">2024-01-01 12:00</td><td>1.2M</td></tr>\n'
+        for num in range(num_links)
+    )
+    return (
+        "<html><head><title>Index of /files</title></head><body><table>"
+        f"{rows}</table></body></html>"
+    ).encode()
+
+
+def soup_links(page: bytes) -> list[tuple[str, str]]:
+    soup = BeautifulSoup(page.decode(), "html.parser")
+    return [
+        (tag.text, str(tag["href"])) for tag in soup.find_all("a", href=True)
+    ]
+
+
+def streamed_links(page: bytes) -> list[tuple[str, str]]:
+    chunk_size = danditools.scraper.CHUNK_SIZE
+    return list(
+        danditools.scraper.iter_links(
+            page[start : start + chunk_size]
+            for start in range(0, len(page), chunk_size)
+        )
+    )
+
+
+def measure(
+    extract: Callable[[bytes], list[tuple[str, str]]],
+    page: bytes,
+    repeat: int,
+) -> tuple[float, int, list[tuple[str, str]]]:
+    """
+    Best time of `repeat` runs, and the peak memory of one
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        links = extract(page)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    extract(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, links
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--links", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parsed = parser.parse_args()
+
+    page = index_page(parsed.links)
+    print(f"{len(page) / 2**20:.1f} MiB page, {parsed.links} links")
+    results = {}
+    for name, extract in (("soup", soup_links), ("streamed", streamed_links)):
+        results[name] = measure(extract, page, parsed.repeat)
+        seconds, peak, _ = results[name]
+        print(f"{name:>9}: {seconds:.3f}s, peak {peak / 2**20:.1f} MiB")
+    assert results["soup"][2] == results["streamed"][2]
+    print(
+        f"streamed is {results['soup'][0] / results['streamed'][0]:.1f}x"
+        f" faster using {results['soup'][1] / results['streamed'][1]:.1f}x"
+        " less memory"
+    )
+
+
+if __name__ == "__main__":
+    main()
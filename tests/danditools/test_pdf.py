@@ -0,0 +1,555 @@
+import io
+import json
+from math import cos, pi, sin
+import os
+from pathlib import Path
+import re
+import tempfile
+from typing import Any, cast
+import unittest
+import unittest.mock
+
+from pypdf import PageObject, PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+)
+
+import danditools.pdf
+
+
+def make_pdf(
+    path: Path,
+    sizes: list[tuple[float, float]],
+    rotate: int = 0,
+) -> Path:
+    writer = PdfWriter()
+    for page_num, (width, height) in enumerate(sizes):
+        page = writer.add_blank_page(width, height)
+        content = DecodedStreamObject()
+        content.set_data(
+            f"BT /F1 12 Tf 10 10 Td (Page {page_num}) Tj ET "
+            f"0 0 m {width} {height} l S".encode()
+        )
+        page[NameObject("/Contents")] = writer._add_object(content)
+        if rotate:
+            page.rotate(rotate)
+    with path.open("wb") as file_handle:
+        writer.write(file_handle)
+    return path
+
+
+def mediaboxes(path: Path) -> list[tuple[float, ...]]:
+    return [
+        tuple(float(val) for val in page.mediabox)
+        for page in PdfReader(path).pages
+    ]
+
+
+class PdfTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+
+class TestStreaming(PdfTestCase):
+
+    def test_iter_pages_is_lazy(self):
+        source = make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 5)
+        reader = danditools.pdf.open_source(source)
+        pages = danditools.pdf.iter_pages(reader, window=2)
+        first = next(pages)
+        first.rotate(90)
+        self.assertEqual(len(list(pages)), 4)
+        # walking never flattens the page tree into the reader's page list
+        self.assertIsNone(reader.flattened_pages)
+        self.assertEqual(reader.pages[0].rotation, 0)
+
+    def test_stream_matches_eager(self):
+        source = make_pdf(
+            self.tmp_dir / "source.pdf",
+            [(300, 300)] + [(612, 396)] * 6 + [(200, 200)],
+        )
+        eager = self.tmp_dir / "eager.pdf"
+        streamed = self.tmp_dir / "streamed.pdf"
+        danditools.pdf.split_and_merge([source], eager)
+        danditools.pdf.split_and_merge([source], streamed, stream=True)
+        self.assertEqual(mediaboxes(eager), mediaboxes(streamed))
+        self.assertEqual(len(PdfReader(streamed).pages), 14)
+
+    def test_edge(self):
+        source = make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 6)
+        dest = self.tmp_dir / "split.pdf"
+        for kwargs in ({}, {"stream": True}, {"jobs": 2}):
+            with unittest.mock.patch.object(
+                danditools.pdf, "MIN_CHUNK_PAGES", 2
+            ):
+                danditools.pdf.split_and_merge(
+                    [source], dest, edge=danditools.pdf.Edge.SHORT, **kwargs
+                )
+            sizes = set(
+                (right - left, top - bottom)
+                for left, bottom, right, top in mediaboxes(dest)
+            )
+            self.assertEqual(sizes, {(612, 198)}, kwargs)
+
+
+def page_label(page: PageObject) -> str:
+    # the fixtures have no font resource, so read the label from the content
+    contents = page.get_contents()
+    assert contents is not None
+    label = re.search(rb"\((.*?)\)", contents.get_data())
+    assert label is not None
+    return label[1].decode()
+
+
+def page_texts(path: Path) -> list[str]:
+    return [page_label(page) for page in PdfReader(path).pages]
+
+
+class TestParallel(PdfTestCase):
+
+    def test_chunk_pages(self):
+        chunks = list(danditools.pdf.chunk_pages(10, 3, min_chunk=1))
+        self.assertEqual(chunks, [range(0, 4), range(4, 8), range(8, 10)])
+        self.assertEqual(list(danditools.pdf.chunk_pages(10, 3)), [range(10)])
+
+    def test_jobs_match_serial(self):
+        sources = [
+            make_pdf(self.tmp_dir / f"source_{num}.pdf", [(612, 396)] * 9)
+            for num in range(2)
+        ]
+        serial = self.tmp_dir / "serial.pdf"
+        parallel = self.tmp_dir / "parallel.pdf"
+        danditools.pdf.split_and_merge(sources, serial, stream=True)
+        with unittest.mock.patch.object(danditools.pdf, "MIN_CHUNK_PAGES", 2):
+            danditools.pdf.split_and_merge(sources, parallel, jobs=3)
+        self.assertEqual(mediaboxes(serial), mediaboxes(parallel))
+        self.assertEqual(page_texts(serial), page_texts(parallel))
+
+
+def nest_page_tree(path: Path, fanout: int = 2) -> Path:
+    """
+    Rewrite `path` with its pages grouped under intermediate /Pages nodes
+    """
+    writer = PdfWriter(clone_from=path)
+    root = cast(DictionaryObject, writer.root_object["/Pages"].get_object())
+    kids = list(cast(ArrayObject, root["/Kids"]))
+    nodes = []
+    for start in range(0, len(kids), fanout):
+        node = DictionaryObject()
+        node_ref = writer._add_object(node)
+        members = kids[start : start + fanout]
+        node.update(
+            {
+                NameObject("/Type"): NameObject("/Pages"),
+                NameObject("/Kids"): ArrayObject(members),
+                NameObject("/Count"): NumberObject(len(members)),
+                NameObject("/Parent"): writer.root_object.raw_get("/Pages"),
+            }
+        )
+        for kid in members:
+            kid.get_object()[NameObject("/Parent")] = node_ref
+            # leave the size to be inherited
+            node[NameObject("/MediaBox")] = kid.get_object().pop("/MediaBox")
+        nodes.append(node_ref)
+    root[NameObject("/Kids")] = ArrayObject(nodes)
+    with path.open("wb") as file_handle:
+        writer.write(file_handle)
+    return path
+
+
+class TestPageSelection(PdfTestCase):
+
+    def test_parse(self):
+        selection = danditools.pdf.PageSelection.parse("1-3, 5,8-")
+        self.assertEqual(selection.ranges, ((1, 3), (5, 5), (8, None)))
+        self.assertEqual(selection.page_nums(9), (0, 1, 2, 4, 7, 8))
+        self.assertEqual(selection.page_nums(4), (0, 1, 2))
+        for bad in ("0-2", "3-1", "a"):
+            with self.assertRaises(ValueError):
+                danditools.pdf.PageSelection.parse(bad)
+
+    def test_walk_nested_tree(self):
+        source = nest_page_tree(
+            make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 7)
+        )
+        reader = danditools.pdf.open_source(source)
+        pages = list(danditools.pdf.iter_pages(reader, page_nums=[1, 2, 5]))
+        self.assertEqual(
+            [page_label(page) for page in pages],
+            ["Page 1", "Page 2", "Page 5"],
+        )
+        self.assertEqual(
+            [tuple(float(val) for val in page.mediabox) for page in pages],
+            [(0.0, 0.0, 612.0, 396.0)] * 3,
+        )
+        # the page list was never flattened
+        self.assertIsNone(reader.flattened_pages)
+
+    def test_split_selection(self):
+        source = make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 8)
+        dest = self.tmp_dir / "dest.pdf"
+        danditools.pdf.split_and_merge(
+            [source], dest, pages=danditools.pdf.PageSelection.parse("2-3,7-")
+        )
+        self.assertEqual(len(PdfReader(dest).pages), 8)
+        self.assertEqual(
+            page_texts(dest)[::2], ["Page 1", "Page 2", "Page 6", "Page 7"]
+        )
+
+
+class TestSizeIndex(unittest.TestCase):
+
+    def test_jitter_clusters(self):
+        sizes = [
+            danditools.pdf.Dimensions(612 + jitter, 396 - jitter)
+            for jitter in (0.0, 0.01, -0.01, 0.02, -0.02, 0.0)
+        ] + [danditools.pdf.Dimensions(300, 300)]
+        index = danditools.pdf.SizeIndex.create(sizes, tolerance=0.05)
+        self.assertEqual(len(index), 2)
+        dominant = index.dominant()
+        self.assertAlmostEqual(dominant.width, 612)
+        self.assertAlmostEqual(dominant.height, 396)
+        self.assertEqual(index.outliers().tolist(), [6])
+        self.assertEqual(
+            [pages.tolist() for pages in index.pages_per_cluster().values()],
+            [[6], [0, 1, 2, 3, 4, 5]],
+        )
+
+    def test_tolerance_zero_is_exact(self):
+        sizes = [(612, 396), (612.01, 396), (612, 396)]
+        index = danditools.pdf.SizeIndex.create(sizes, tolerance=0)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.labels[0], index.labels[2])
+
+
+class TestDocDimensions(PdfTestCase):
+
+    def test_jittered_source(self):
+        source = make_pdf(
+            self.tmp_dir / "source.pdf",
+            [(612 + (num % 3) * 0.01, 396) for num in range(30)],
+        )
+        doc = danditools.pdf.DocDimensions.create(
+            source, reader=danditools.pdf.open_source(source)
+        )
+        self.assertIsNone(doc.first)
+        self.assertIsNone(doc.last)
+        self.assertEqual(len(doc.body), 1)
+        split = doc.guess_best_dims()
+        self.assertAlmostEqual(split.dims.width, 306, places=1)
+
+    def test_odd_page(self):
+        # a foldout in the middle is kept whole instead of making the split
+        # ambiguous
+        source = make_pdf(
+            self.tmp_dir / "source.pdf",
+            [(612, 396)] * 3 + [(1224, 396)] + [(612, 396)] * 3,
+        )
+        doc = danditools.pdf.DocDimensions.create(
+            source, reader=danditools.pdf.open_source(source)
+        )
+        self.assertEqual(len(doc.body), 2)
+        self.assertEqual(doc.guess_best_dims().dims, (306, 396))
+        self.assertEqual(doc.unsplit_page_nums(), {3})
+        dest = self.tmp_dir / "split.pdf"
+        for kwargs in ({}, {"stream": True}, {"jobs": 2}):
+            with unittest.mock.patch.object(
+                danditools.pdf, "MIN_CHUNK_PAGES", 2
+            ):
+                danditools.pdf.split_and_merge([source], dest, **kwargs)
+            self.assertEqual(
+                [right - left for left, _, right, _ in mediaboxes(dest)],
+                [306] * 6 + [1224] + [306] * 6,
+                kwargs,
+            )
+
+
+class TestImpose(PdfTestCase):
+
+    def test_booklet_sides(self):
+        # same order as dandiscribe's FinalDoc.print_pages
+        self.assertEqual(
+            danditools.pdf.booklet_sides(
+                8, danditools.pdf.ImposeLayout.QUARTER
+            ),
+            [[3, 4, 1, 6], [5, 2, 7, 0]],
+        )
+        self.assertEqual(
+            danditools.pdf.booklet_sides(6, danditools.pdf.ImposeLayout.HALF),
+            [[3, 4], [5, 2], [1, None], [None, 0]],
+        )
+
+    def test_n_up_sides(self):
+        self.assertEqual(
+            danditools.pdf.n_up_sides(5, danditools.pdf.ImposeLayout.QUARTER),
+            [[0, 1, 2, 3], [4, None, None, None]],
+        )
+
+    def test_impose_places_each_page_once(self):
+        source = make_pdf(self.tmp_dir / "zine.pdf", [(396, 612)] * 16)
+        dest = self.tmp_dir / "imposed.pdf"
+        danditools.pdf.impose_pdf(
+            source, dest, danditools.pdf.ImposeLayout.QUARTER
+        )
+        reader = PdfReader(dest)
+        self.assertEqual(len(reader.pages), 4)
+        placed = [
+            name
+            for page in reader.pages
+            for name in page["/Resources"]["/XObject"]
+        ]
+        self.assertEqual(
+            sorted(placed), sorted(f"/P{num}" for num in range(16))
+        )
+        self.assertEqual(
+            tuple(float(val) for val in reader.pages[0].mediabox),
+            (0.0, 0.0, 792.0, 612.0),
+        )
+
+
+class TestDedupe(PdfTestCase):
+
+    def test_identical_sources_collapse(self):
+        sources = [
+            make_pdf(self.tmp_dir / f"source_{num}.pdf", [(612, 396)] * 4)
+            for num in range(2)
+        ]
+        plain = self.tmp_dir / "plain.pdf"
+        deduped = self.tmp_dir / "deduped.pdf"
+        danditools.pdf.split_and_merge(sources, plain, dedupe=False)
+        writer = danditools.pdf.split_and_merge(sources, deduped, dedupe=True)
+        self.assertLess(deduped.stat().st_size, plain.stat().st_size)
+        self.assertEqual(mediaboxes(plain), mediaboxes(deduped))
+        contents = set(
+            page.raw_get("/Contents").idnum for page in PdfReader(deduped).pages
+        )
+        # 16 output pages, but only one content stream per distinct page
+        self.assertEqual(len(contents), 4)
+        self.assertEqual(danditools.pdf.dedupe_writer(writer), (0, 0))
+
+
+class TestCompression(PdfTestCase):
+
+    def test_levels(self):
+        writer = PdfWriter(
+            clone_from=make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 6)
+        )
+        for page in writer.pages:
+            # pad the content so it's worth compressing
+            content = page.get_contents()
+            content.set_data(content.get_data() + b" 0 0 m 10 10 l S" * 200)
+            page.replace_contents(content)
+        source = self.tmp_dir / "padded.pdf"
+        with source.open("wb") as file_handle:
+            writer.write(file_handle)
+        sizes = {}
+        for compression in danditools.pdf.Compression:
+            dest = self.tmp_dir / f"{compression}.pdf"
+            danditools.pdf.split_and_merge(
+                [source], dest, compression=compression, stats=True
+            )
+            sizes[compression] = dest.stat().st_size
+            self.assertEqual(
+                page_texts(dest), page_texts(self.tmp_dir / "none.pdf")
+            )
+        self.assertLess(
+            sizes[danditools.pdf.Compression.FAST],
+            sizes[danditools.pdf.Compression.NONE],
+        )
+        self.assertLessEqual(
+            sizes[danditools.pdf.Compression.MAX],
+            sizes[danditools.pdf.Compression.FAST],
+        )
+
+
+class TestVolumes(PdfTestCase):
+
+    def test_roll_by_pages(self):
+        sources = [
+            make_pdf(self.tmp_dir / f"source_{num}.pdf", [(612, 396)] * 5)
+            for num in range(2)
+        ]
+        merged = self.tmp_dir / "merged.pdf"
+        danditools.pdf.split_and_merge(sources, merged, stream=True)
+        dest = self.tmp_dir / "volumes.pdf"
+        danditools.pdf.split_and_merge(
+            sources, dest, stream=True, volume_pages=6
+        )
+        manifest = json.loads(
+            (self.tmp_dir / "volumes_volumes.json").read_text()
+        )
+        self.assertTrue(manifest["complete"])
+        self.assertEqual(
+            [(vol["first_page"], vol["pages"]) for vol in manifest["volumes"]],
+            [(0, 6), (6, 6), (12, 6), (18, 2)],
+        )
+        self.assertEqual(
+            [
+                text
+                for vol in manifest["volumes"]
+                for text in page_texts(self.tmp_dir / vol["path"])
+            ],
+            page_texts(merged),
+        )
+        self.assertFalse(dest.exists())
+
+    def test_roll_by_size(self):
+        source = make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 6)
+        dest = self.tmp_dir / "volumes.pdf"
+        volumes = danditools.pdf.Volumes(dest, max_bytes=1)
+        danditools.pdf.stream_source(
+            volumes,
+            danditools.pdf.open_source(source),
+            frozenset(),
+            checkpoint=volumes.checkpoint,
+        )
+        volumes.close()
+        self.assertEqual([vol["pages"] for vol in volumes.volumes], [2] * 6)
+
+
+class TestIncremental(PdfTestCase):
+
+    def split(self, *args: str) -> str:
+        argv = ["pdf-split", "--incremental", *args]
+        # sources are rewritten between runs in the same process
+        cast(Any, danditools.pdf.get_pages).cache_clear()
+        with (
+            unittest.mock.patch("sys.argv", argv),
+            unittest.mock.patch("sys.stdout", new=io.StringIO()) as stdout,
+        ):
+            danditools.pdf.split()
+        return stdout.getvalue()
+
+    def test_skips_unchanged(self):
+        sources = [
+            make_pdf(self.tmp_dir / f"source_{num}.pdf", [(612, 396)] * 3)
+            for num in range(3)
+        ]
+        dest = self.tmp_dir / "out"
+        paths = [str(source) for source in sources]
+        self.assertIn("Skipping 0 ", self.split(*paths, str(dest)))
+        self.assertEqual(len(PdfReader(dest / "source_0.pdf").pages), 6)
+
+        # touched but unchanged, rewritten, and split with other parameters
+        os.utime(sources[0])
+        make_pdf(sources[1], [(612, 396)] * 4)
+        self.assertIn("Skipping 2 ", self.split(*paths, str(dest)))
+        self.assertEqual(len(PdfReader(dest / "source_1.pdf").pages), 8)
+        self.assertIn(
+            "Skipping 0 ", self.split(*paths, str(dest), "--compress", "fast")
+        )
+
+    def test_directory(self):
+        scans = self.tmp_dir / "scans"
+        (scans / "sub").mkdir(parents=True)
+        sources = [
+            make_pdf(scans / name, [(612, 396)] * 3)
+            for name in ("a.pdf", "sub/b.pdf")
+        ]
+        dest = self.tmp_dir / "out"
+        self.assertIn("Skipping 0 ", self.split(str(scans), str(dest)))
+        self.assertEqual(len(PdfReader(dest / "sub" / "b.pdf").pages), 6)
+
+        make_pdf(sources[1], [(612, 396)] * 4)
+        self.assertIn("Skipping 1 ", self.split(str(scans), str(dest)))
+        self.assertEqual(len(PdfReader(dest / "sub" / "b.pdf").pages), 8)
+
+    def test_resume(self):
+        source = make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 3)
+        dest = self.tmp_dir / "out"
+        self.split(str(source), str(dest))
+        # an interrupted run leaves no output behind for its source
+        (dest / "source.pdf").unlink()
+        self.assertIn("Skipping 0 ", self.split(str(source), str(dest)))
+        self.assertTrue((dest / "source.pdf").exists())
+
+
+class TestPageTransform(PdfTestCase):
+
+    def test_crop_rotated(self):
+        transform = danditools.pdf.PageTransform((0.0, 0.0, 612.0, 396.0), 90)
+        self.assertEqual(transform.dimensions(), (396.0, 612.0))
+        # top half as displayed is the left half of the unrotated page
+        top = transform.crop(
+            danditools.pdf.Vector2(0.0, 306.0),
+            danditools.pdf.Dimensions(396.0, 306.0),
+        )
+        self.assertEqual(top.box, (0.0, 0.0, 306.0, 396.0))
+        self.assertEqual(top.rotation, 90)
+        self.assertEqual(top.rotate(270).rotation, 0)
+
+    def test_split_leaves_content_untouched(self):
+        source = make_pdf(self.tmp_dir / "source.pdf", [(612, 396)] * 3, 90)
+        dest = self.tmp_dir / "split.pdf"
+        danditools.pdf.split_and_merge([source], dest, rotation=90)
+        source_data = [
+            page.get_contents().get_data() for page in PdfReader(source).pages
+        ]
+        reader = PdfReader(dest)
+        self.assertEqual(
+            [page.get_contents().get_data() for page in reader.pages],
+            [data for data in source_data for _ in range(2)],
+        )
+        self.assertEqual(set(page.rotation for page in reader.pages), {180})
+        self.assertEqual(
+            mediaboxes(dest)[:2],
+            [(0.0, 0.0, 306.0, 396.0), (306.0, 0.0, 612.0, 396.0)],
+        )
+
+    def test_any_angle(self):
+        source = make_pdf(
+            self.tmp_dir / "source.pdf",
+            [(300, 300)] + [(612, 396)] * 4 + [(200, 200)],
+        )
+        dest = self.tmp_dir / "split.pdf"
+        for kwargs in ({}, {"stream": True}, {"jobs": 2}):
+            with unittest.mock.patch.object(
+                danditools.pdf, "MIN_CHUNK_PAGES", 2
+            ):
+                danditools.pdf.split_and_merge(
+                    [source], dest, rotation=30, **kwargs
+                )
+            reader = PdfReader(dest)
+            self.assertEqual(len(reader.pages), 10, kwargs)
+            # turned into the content, as /Rotate only takes quarter turns
+            self.assertEqual(
+                set(page.rotation for page in reader.pages), {0}, kwargs
+            )
+            # the covers are kept whole, bounding their turned corners
+            for page, side in ((reader.pages[0], 300), (reader.pages[-1], 200)):
+                self.assertAlmostEqual(
+                    float(page.mediabox.width),
+                    side * (cos(pi / 6) + sin(pi / 6)),
+                    places=3,
+                )
+
+
+class TestInventory(PdfTestCase):
+
+    def test_inventory_dir(self):
+        make_pdf(
+            self.tmp_dir / "a.pdf", [(612, 396)] * 3 + [(300, 300)], rotate=90
+        )
+        make_pdf(self.tmp_dir / "b.pdf", [(612.01, 396)] * 2)
+        (self.tmp_dir / "broken.pdf").write_bytes(b"not a pdf")
+        inventories = list(danditools.pdf.take_inventory([self.tmp_dir], 2))
+        self.assertEqual(
+            [inv.path.name for inv in inventories],
+            ["a.pdf", "b.pdf", "broken.pdf"],
+        )
+        first, second, broken = (inv.dump() for inv in inventories)
+        self.assertEqual(first["sizes"], {"396,612": 3, "300,300": 1})
+        self.assertEqual(first["rotations"], {"90": 4})
+        self.assertEqual(first["split_dims"], "396,306")
+        self.assertEqual(
+            danditools.pdf.dims_type(second["split_dims"]), (306.0, 396.0)
+        )
+        self.assertIn("error", broken)
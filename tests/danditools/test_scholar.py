@@ -0,0 +1,875 @@
+from dataclasses import dataclass, field
+import io
+import json
+from pathlib import Path
+from random import Random
+import tempfile
+import threading
+import time
+from typing import Any
+import unittest
+import unittest.mock
+
+import requests
+
+import danditools.scholar
+
+
+def raw_result(num: int, offset: int = 0) -> dict:
+    return {
+        "title": f"Paper {num}",
+        "result_id": f"id{num}",
+        "type": "Pdf",
+        "position": num - offset,
+        "link": f"https://example.com/{num}.pdf",
+        "snippet": f"About paper {num}",
+        "publication_info": {
+            "summary": f"A Author{num % 7} - Journal, 20{num % 25:02}",
+            "authors": [{"name": f"Author{num % 7}"}],
+        },
+        "inline_links": {
+            "cited_by": {"total": num % 11, "cites_id": f"c{num}"}
+        },
+    }
+
+
+@dataclass
+class FakeSearch:
+    """
+    Stands in for serpapi.search over `total` generated results.
+
+    Each call takes `latency` seconds, or `slow[offset]` for the page at that
+    offset. The pages in `empty` come back fully empty, and those in `errors`
+    raise, that many times each. Set `report_total` to False to leave the
+    total out, like some responses do. Each query in `shifts` has its results
+    numbered from that instead of 0, so queries can overlap. Only `served` of
+    the results are there, if set, and the pages past them come back fully
+    empty, like Scholar overestimating its total.
+    """
+
+    total: int
+    latency: float = 0.0
+    slow: dict[int, float] = field(default_factory=dict)
+    empty: dict[int, int] = field(default_factory=dict)
+    errors: dict[int, int] = field(default_factory=dict)
+    report_total: bool = True
+    shifts: dict[str, int] = field(default_factory=dict)
+    served: int | None = None
+    calls: list[dict] = field(default_factory=list)
+    in_flight: int = 0
+    max_in_flight: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def offsets(self) -> list[int]:
+        return [int(params["start"]) for params in self.calls]
+
+    def fully_empty(self) -> dict:
+        return {"search_information": {"organic_results_state": "Fully empty"}}
+
+    def __call__(self, params: dict) -> dict:
+        offset = int(params["start"])
+        with self.lock:
+            self.calls.append(params)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.slow.get(offset, self.latency))
+            with self.lock:
+                if self.errors.get(offset):
+                    self.errors[offset] -= 1
+                    raise requests.HTTPError("429 Too Many Requests")
+                if self.empty.get(offset):
+                    self.empty[offset] -= 1
+                    return self.fully_empty()
+            shift = self.shifts.get(params["q"], 0)
+            return self.page(offset, int(params["num"]), shift)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def page(self, offset: int, num: int, shift: int = 0) -> dict:
+        served = self.total if self.served is None else self.served
+        if offset >= served:
+            return self.fully_empty()
+        stop = min(served, offset + num)
+        info: dict[str, str | int] = {
+            "organic_results_state": "Results for exact spelling"
+        }
+        if self.report_total:
+            info["total_results"] = self.total
+        pagination: dict[str, str | int] = {"current": offset // num + 1}
+        if stop < served:
+            pagination["next"] = f"https://example.com/?start={stop}"
+        return {
+            "search_information": info,
+            "organic_results": [
+                raw_result(shift + num, shift + offset)
+                for num in range(offset, stop)
+            ],
+            "pagination": pagination,
+        }
+
+
+@dataclass
+class RecordingBackoff(danditools.scholar.Backoff):
+    """
+    A backoff that records its delays in `waits` instead of sleeping
+    """
+
+    waits: list[float] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.sleep = self.waits.append
+
+
+def no_wait_backoff(**kwargs: Any) -> RecordingBackoff:
+    return RecordingBackoff(random=Random(0), **kwargs)
+
+
+PER_PAGE = danditools.scholar.PER_PAGE
+PARAMS = {
+    "engine": "google_scholar",
+    "q": "dandelions",
+    "hl": "en",
+    "num": "20",
+}
+
+
+class TestBackoff(unittest.TestCase):
+    def test_grows_to_cap(self):
+        backoff = no_wait_backoff(base=1, cap=10)
+        delays = []
+        for _ in range(6):
+            backoff.failed()
+            delays.append(backoff.delay)
+        self.assertEqual(delays, [1, 2, 4, 8, 10, 10])
+
+    def test_recovers(self):
+        backoff = no_wait_backoff(base=1, cap=10)
+        for _ in range(4):
+            backoff.failed()
+        delays = []
+        for _ in range(5):
+            backoff.succeeded()
+            delays.append(backoff.delay)
+        self.assertEqual(delays, [4, 2, 1, 0, 0])
+
+    def test_jitter(self):
+        backoff = no_wait_backoff(base=1, cap=64)
+        self.assertEqual(backoff.pace(), 0)
+        for _ in range(4):
+            backoff.failed()
+        waits = [backoff.pace() for _ in range(20)]
+        self.assertEqual(waits, backoff.waits)
+        self.assertTrue(all(4 <= wait <= 8 for wait in waits))
+        self.assertGreater(len(set(waits)), 1)
+
+
+class TestFetch(unittest.TestCase):
+    def fetch(self, fake: FakeSearch, **kwargs):
+        kwargs.setdefault("backoff", no_wait_backoff())
+        return danditools.scholar.fetch_results(PARAMS, search=fake, **kwargs)
+
+    def result_ids(self, results) -> list[str]:
+        return [result.result_id for result in results]
+
+    def test_in_order(self):
+        # the second page arrives last but still comes second
+        fake = FakeSearch(total=150, latency=0.01, slow={20: 0.1})
+        results = self.fetch(fake, workers=4)
+        self.assertEqual(
+            self.result_ids(results), [f"id{num}" for num in range(150)]
+        )
+        self.assertCountEqual(fake.offsets(), range(0, 150, 20))
+
+    def test_concurrent(self):
+        fake = FakeSearch(total=200, latency=0.05)
+        self.fetch(fake, workers=3)
+        self.assertEqual(fake.max_in_flight, 3)
+        fake = FakeSearch(total=200, latency=0.01)
+        self.fetch(fake, workers=1)
+        self.assertEqual(fake.max_in_flight, 1)
+
+    def test_max_res(self):
+        fake = FakeSearch(total=500)
+        results = self.fetch(fake, max_res=50)
+        self.assertEqual(
+            self.result_ids(results), [f"id{num}" for num in range(50)]
+        )
+        self.assertCountEqual(fake.offsets(), [0, 20, 40])
+
+    def test_start(self):
+        fake = FakeSearch(total=100)
+        results = self.fetch(fake, start=40)
+        self.assertEqual(
+            self.result_ids(results), [f"id{num}" for num in range(40, 100)]
+        )
+
+    def test_scholar_limit(self):
+        fake = FakeSearch(total=5000)
+        results = self.fetch(fake, workers=8)
+        self.assertEqual(len(results), danditools.scholar.MAX_RESULTS)
+
+    def test_retries_empty_pages(self):
+        fake = FakeSearch(total=100, empty={40: 2})
+        backoff = no_wait_backoff()
+        # one worker, so no other page succeeds and resets the backoff before
+        # the retries wait on it
+        results = self.fetch(fake, backoff=backoff, workers=1)
+        self.assertEqual(len(results), 100)
+        self.assertEqual(fake.offsets().count(40), 3)
+        self.assertTrue(backoff.waits)
+
+    def test_retries_errors(self):
+        fake = FakeSearch(total=100, errors={0: 1, 60: 2})
+        results = self.fetch(fake)
+        self.assertEqual(len(results), 100)
+        self.assertEqual(fake.offsets().count(0), 2)
+        self.assertEqual(fake.offsets().count(60), 3)
+
+    def test_skips_page(self):
+        retries = danditools.scholar.TIMEOUT_RETRIES
+        fake = FakeSearch(total=100, empty={40: retries + 1})
+        results = self.fetch(fake)
+        self.assertEqual(
+            self.result_ids(results),
+            [f"id{num}" for num in range(100) if not 40 <= num < 60],
+        )
+        self.assertEqual(fake.offsets().count(40), retries + 1)
+
+    def test_stops_at_real_end(self):
+        # the total says a thousand, but only a short page then nothing, or
+        # nothing after a full page, is there
+        retries = danditools.scholar.TIMEOUT_RETRIES
+        workers = 4
+        for served in (90, 100):
+            fake = FakeSearch(total=5000, served=served, latency=0.01)
+            results = self.fetch(fake, workers=workers)
+            self.assertEqual(
+                self.result_ids(results), [f"id{num}" for num in range(served)]
+            )
+            # past the end only the first gap is retried, and only the pages
+            # already in flight are fetched
+            self.assertLessEqual(
+                len(fake.offsets()),
+                served // PER_PAGE + retries + 1 + 2 * workers,
+            )
+            self.assertLessEqual(
+                max(fake.offsets()), served + workers * PER_PAGE
+            )
+
+    def test_reorders_pages(self):
+        pages = [(40, make_results([2])), (0, make_results([0]))]
+        pages += [(60, make_results([3])), (20, make_results([1]))]
+        batches = danditools.scholar.in_order(pages)
+        self.assertEqual(next(batches), make_results([0]))
+        self.assertEqual(list(batches), [make_results([n]) for n in (1, 2, 3)])
+
+    def test_follows_pagination_without_total(self):
+        fake = FakeSearch(total=70, report_total=False)
+        results = self.fetch(fake)
+        self.assertEqual(
+            self.result_ids(results), [f"id{num}" for num in range(70)]
+        )
+        self.assertEqual(fake.offsets(), [0, 20, 40, 60])
+
+
+def make_results(nums) -> list[danditools.scholar.Result]:
+    return [
+        danditools.scholar.Result.from_json_obj(raw_result(num)) for num in nums
+    ]
+
+
+class TestResult(unittest.TestCase):
+    def test_leaves_raw_alone(self):
+        raw = raw_result(3)
+        before = json.dumps(raw)
+        result = danditools.scholar.Result.from_json_obj(raw)
+        self.assertEqual(json.dumps(raw), before)
+        self.assertEqual(result.pub_type, "Pdf")
+        self.assertEqual(result.publication_info.authors[0].name, "Author3")
+
+    def test_round_trip(self):
+        (result,) = make_results([5])
+        self.assertEqual(
+            danditools.scholar.Result.from_json_obj(result.dump()), result
+        )
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = Path(self.tmp.name) / "results.json"
+
+    def store(self, **kwargs) -> danditools.scholar.ResultStore:
+        return danditools.scholar.ResultStore.for_output(self.output, **kwargs)
+
+    def stored_ids(self, store) -> list[str]:
+        return [result.result_id for result in store.results()]
+
+    def test_dedupes(self):
+        store = self.store()
+        new = store.add(make_results([0, 1, 2, 1]))
+        self.assertEqual([r.result_id for r in new], ["id0", "id1", "id2"])
+        new = store.add(make_results([2, 3]))
+        self.assertEqual([r.result_id for r in new], ["id3"])
+        self.assertEqual(store.add(make_results([0, 3])), [])
+        self.assertEqual(len(store), 4)
+        self.assertIn("id3", store)
+        self.assertEqual(self.stored_ids(store), ["id0", "id1", "id2", "id3"])
+
+    def test_only_appends(self):
+        store = self.store()
+        store.add(make_results(range(10)))
+        before = store.path.read_bytes()
+        store.add(make_results(range(5, 15)))
+        after = store.path.read_bytes()
+        self.assertTrue(after.startswith(before))
+        self.assertEqual(len(after.splitlines()), 15)
+        self.assertEqual(len(store.index_path.read_text().splitlines()), 15)
+
+    def test_reopen(self):
+        self.store().add(make_results(range(10)))
+        store = self.store()
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.get("id7"), make_results([7])[0])
+        self.assertEqual(store.add(make_results([9, 10])), make_results([10]))
+        self.assertEqual(len(self.store(reset=True)), 0)
+
+    def test_catches_up(self):
+        store = self.store()
+        store.add(make_results(range(6)))
+        # as if killed after writing records but before indexing them, and
+        # partway through writing one more
+        index_lines = store.index_path.read_text().splitlines(True)
+        store.index_path.write_text("".join(index_lines[:3]))
+        with store.path.open("a") as data:
+            data.write(json.dumps(make_results([6])[0].dump())[:20])
+        store = self.store()
+        self.assertEqual(len(store), 6)
+        self.assertEqual(store.get("id5").title, "Paper 5")
+        self.assertEqual(len(store.path.read_bytes().splitlines()), 6)
+        store.add(make_results([6]))
+        self.assertEqual(
+            self.stored_ids(self.store()), [f"id{num}" for num in range(7)]
+        )
+
+    def test_truncated_index(self):
+        store = self.store()
+        store.add(make_results(range(10)))
+        index_lines = store.index_path.read_text().splitlines(True)
+        result_id, offset = index_lines[-1].split()
+        # as if killed partway through writing the index, leaving a last entry
+        # without its newline, one that still parses to the wrong offset, or
+        # one cut off before its offset
+        for tail in (
+            f"{result_id}\t{offset[:-1]}",
+            f"{result_id}\t{offset[:-1]}\n",
+            f"{result_id}\n",
+        ):
+            store.index_path.write_text("".join(index_lines[:-1]) + tail)
+            store = self.store()
+            self.assertEqual(len(store), 10, tail)
+            self.assertEqual(store.get(result_id), make_results([9])[0], tail)
+            self.assertEqual(
+                store.index_path.read_text().splitlines(True), index_lines
+            )
+        store.add(make_results([10]))
+        self.assertEqual(
+            self.stored_ids(self.store()), [f"id{num}" for num in range(11)]
+        )
+
+    def test_export(self):
+        store = self.store()
+        store.add(make_results([4, 5]))
+        store.add(make_results([3, 2, 1]))
+        store.export(self.output)
+        exported = json.loads(self.output.read_text())
+        self.assertEqual(
+            [res["result_id"] for res in exported],
+            ["id4", "id5", "id3", "id2", "id1"],
+        )
+        self.assertEqual(exported[0], make_results([4])[0].dump())
+
+    def test_export_sorted(self):
+        citations = danditools.scholar.SortOrder.of(
+            danditools.scholar.SortMethods.citations
+        )
+        store = self.store(sort=citations)
+        store.add(make_results([4, 5]))
+        store.add(make_results([3, 2, 1]))
+        store.export(self.output)
+        exported = json.loads(self.output.read_text())
+        self.assertEqual(
+            [res["inline_links"]["cited_by"]["total"] for res in exported],
+            [5, 4, 3, 2, 1],
+        )
+        store = self.store(sort=citations)
+        store.add(make_results([9, 7]))
+        self.assertEqual(
+            [result.result_id for result in store.ordered.results],
+            ["id9", "id7", "id5", "id4", "id3", "id2", "id1"],
+        )
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache_dir = Path(self.tmp.name)
+
+    def cache(self, **kwargs) -> danditools.scholar.ResponseCache:
+        cache = danditools.scholar.ResponseCache(self.cache_dir, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def fetch(self, search, **kwargs) -> list[str]:
+        results = danditools.scholar.fetch_results(
+            PARAMS | {"api_key": "secret"},
+            search=search,
+            backoff=no_wait_backoff(),
+            **kwargs,
+        )
+        return [result.result_id for result in results]
+
+    def test_key(self):
+        key = danditools.scholar.cache_key
+        self.assertEqual(
+            key(PARAMS | {"start": "0", "api_key": "one"}),
+            key(
+                {
+                    "q": " dandelions ",
+                    "num": 20,
+                    "hl": "en",
+                    "engine": "google_scholar",
+                    "api_key": "two",
+                }
+            ),
+        )
+        self.assertEqual(
+            key(PARAMS | {"q": "dandelion  seeds"}),
+            key(PARAMS | {"q": "dandelion seeds"}),
+        )
+        self.assertNotEqual(
+            key(PARAMS | {"start": "20"}), key(PARAMS | {"start": "40"})
+        )
+
+    def test_reuses_responses(self):
+        fake = FakeSearch(total=100)
+        search = danditools.scholar.CachedSearch(self.cache(), fake)
+        first = self.fetch(search, workers=3)
+        self.assertEqual(len(fake.calls), 5)
+        fake = FakeSearch(total=100)
+        search = danditools.scholar.CachedSearch(self.cache(), fake)
+        self.assertEqual(self.fetch(search), first)
+        self.assertEqual(fake.calls, [])
+
+    def test_expires(self):
+        self.fetch(
+            danditools.scholar.CachedSearch(self.cache(), FakeSearch(40))
+        )
+        fake = FakeSearch(total=40)
+        search = danditools.scholar.CachedSearch(self.cache(ttl=-1), fake)
+        self.assertEqual(len(self.fetch(search)), 40)
+        self.assertEqual(fake.offsets(), [0, 20])
+
+    def test_skips_empty_pages(self):
+        retries = danditools.scholar.TIMEOUT_RETRIES
+        fake = FakeSearch(total=60, empty={20: retries + 1})
+        with unittest.mock.patch("sys.stdout", new=io.StringIO()):
+            self.fetch(danditools.scholar.CachedSearch(self.cache(), fake))
+        fake = FakeSearch(total=60)
+        self.fetch(danditools.scholar.CachedSearch(self.cache(), fake))
+        self.assertEqual(fake.offsets(), [20])
+
+    def test_offline(self):
+        self.fetch(
+            danditools.scholar.CachedSearch(self.cache(), FakeSearch(40)),
+            max_res=20,
+        )
+        fake = FakeSearch(total=40)
+        search = danditools.scholar.CachedSearch(
+            self.cache(ttl=-1), fake, offline=True
+        )
+        with unittest.mock.patch("sys.stdout", new=io.StringIO()):
+            self.assertEqual(
+                self.fetch(search), [f"id{num}" for num in range(20)]
+            )
+        self.assertEqual(fake.calls, [])
+
+    def test_warm(self):
+        queries = self.cache_dir / "queries.txt"
+        queries.write_text("dandelions\n\ndandelion  seeds\n")
+        argv = [
+            "scholar-warm",
+            str(queries),
+            "--cache_dir",
+            str(self.cache_dir),
+        ]
+        fake = FakeSearch(total=50)
+        with (
+            unittest.mock.patch("sys.argv", argv),
+            unittest.mock.patch("sys.stdout", new=io.StringIO()) as stdout,
+            unittest.mock.patch.object(danditools.scholar, "search", fake),
+        ):
+            danditools.scholar.warm()
+        self.assertIn(
+            "50 results cached for dandelion  seeds", stdout.getvalue()
+        )
+        self.assertEqual(len(fake.calls), 6)
+        fake = FakeSearch(total=50)
+        search = danditools.scholar.CachedSearch(self.cache(), fake)
+        self.assertEqual(len(self.fetch(search)), 50)
+        self.assertEqual(fake.calls, [])
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_rate(self):
+        limit = danditools.scholar.RateLimit(rate=50)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limit.acquire) for _ in range(11)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_burst(self):
+        limit = danditools.scholar.RateLimit(rate=1, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            limit.acquire()
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_wraps_search(self):
+        fake = FakeSearch(total=100)
+        search = danditools.scholar.rate_limited(
+            fake, danditools.scholar.RateLimit(rate=100)
+        )
+        start = time.monotonic()
+        results = danditools.scholar.fetch_results(
+            PARAMS, search=search, workers=5, backoff=no_wait_backoff()
+        )
+        self.assertEqual(len(results), 100)
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = Path(self.tmp.name) / "batch.json"
+
+    def run_batch(self, fake: FakeSearch, queries, **kwargs):
+        store = danditools.scholar.ResultStore.for_output(self.output)
+        with unittest.mock.patch("sys.stdout", new=io.StringIO()):
+            counts = danditools.scholar.run_batch(
+                queries,
+                store,
+                PARAMS,
+                search=fake,
+                backoff=no_wait_backoff(),
+                **kwargs,
+            )
+        return store, counts
+
+    def test_shared_store(self):
+        fake = FakeSearch(
+            total=60, shifts={"seeds": 40, "roots": 100}, latency=0.01
+        )
+        store, counts = self.run_batch(
+            fake, ["dandelions", "seeds", "roots"], parallel=3, workers=2
+        )
+        self.assertEqual(counts, {"dandelions": 60, "seeds": 60, "roots": 60})
+        self.assertEqual(len(store), 160)
+        self.assertGreater(fake.max_in_flight, 3)
+        self.assertLessEqual(fake.max_in_flight, 6)
+        self.assertCountEqual(store.hits["id50"], ["dandelions", "seeds"])
+        self.assertEqual(store.hits["id10"], ["dandelions"])
+        self.assertEqual(store.hits["id120"], ["roots"])
+
+        store.export(self.output)
+        exported = {
+            res["result_id"]: res for res in json.loads(self.output.read_text())
+        }
+        self.assertEqual(len(exported), 160)
+        self.assertCountEqual(
+            exported["id45"]["queries"], ["dandelions", "seeds"]
+        )
+
+    def test_hits_kept(self):
+        fake = FakeSearch(total=40, shifts={"seeds": 20})
+        self.run_batch(fake, ["dandelions"])
+        store, _ = self.run_batch(fake, ["dandelions", "seeds"])
+        self.assertEqual(len(store), 60)
+        self.assertEqual(store.hits["id5"], ["dandelions"])
+        self.assertEqual(store.hits["id25"], ["dandelions", "seeds"])
+        self.assertEqual(store.hits["id45"], ["seeds"])
+        # hits already recorded aren't written again
+        self.assertEqual(len(store.hits_path.read_text().splitlines()), 40 + 40)
+        with store.hits_path.open("a") as hits:
+            hits.write('["id5", "see')
+        reopened = danditools.scholar.ResultStore.for_output(self.output)
+        self.assertEqual(reopened.hits, store.hits)
+        reopened.add(make_results([5]), query="seeds")
+        reopened = danditools.scholar.ResultStore.for_output(self.output)
+        self.assertEqual(reopened.hits["id5"], ["dandelions", "seeds"])
+
+
+def citers(num: int) -> list[int]:
+    """
+    The papers citing paper `num` in a made up citation network with cycles
+    and shared citers, where multiples of 10 are never cited
+    """
+    if not num % 10:
+        return []
+    return sorted({(2 * num + 1) % 97, (3 * num + 2) % 97, (5 * num) % 97})
+
+
+@dataclass
+class FakeCitations:
+    """
+    Searches the `citers` network. A search for a query finds the first
+    `seeds` papers, and one for `cites` finds that paper's citers, or `wide`
+    made up ones numbered from 1000 if it's in `wide`.
+    """
+
+    seeds: int = 5
+    wide: dict[int, int] = field(default_factory=dict)
+    calls: list[dict] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def cited(self) -> list[int]:
+        return [int(params["cites"][1:]) for params in self.calls]
+
+    def found(self, params: dict) -> list[int]:
+        if "cites" not in params:
+            return list(range(self.seeds))
+        num = int(params["cites"][1:])
+        if num in self.wide:
+            return list(range(1000, 1000 + self.wide[num]))
+        return citers(num)
+
+    def __call__(self, params: dict) -> dict:
+        with self.lock:
+            if "cites" in params:
+                self.calls.append(params)
+        found = self.found(params)
+        offset = int(params["start"])
+        results = []
+        for position, num in enumerate(found[offset : offset + PER_PAGE]):
+            result = raw_result(num, num - position)
+            total = self.wide.get(num, len(citers(num)))
+            result["inline_links"]["cited_by"]["total"] = total
+            results.append(result)
+        return {
+            "search_information": {"total_results": len(found)},
+            "organic_results": results,
+        }
+
+
+def bfs(
+    seeds: list[int], max_depth: int
+) -> tuple[set[str], set[tuple[str, str]]]:
+    depths = {seed: 0 for seed in seeds}
+    edges: set[tuple[str, str]] = set()
+    level = seeds
+    for depth in range(max_depth):
+        next_level = []
+        for num in level:
+            for citer in citers(num):
+                edges.add((f"id{citer}", f"id{num}"))
+                if citer not in depths:
+                    depths[citer] = depth + 1
+                    next_level.append(citer)
+        level = next_level
+    return {f"id{num}" for num in depths}, edges
+
+
+class TestCitationGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = Path(self.tmp.name) / "graph.json"
+
+    def expand(self, fake: FakeCitations, max_depth: int, **kwargs):
+        store = danditools.scholar.ResultStore.for_output(self.output)
+        graph = danditools.scholar.CitationGraph.for_output(self.output)
+        if not graph.depths:
+            seeds = danditools.scholar.fetch_results(
+                PARAMS, search=fake, max_res=fake.seeds
+            )
+            store.add(seeds)
+            graph.add_nodes((seed.result_id for seed in seeds), 0)
+        with unittest.mock.patch("sys.stdout", new=io.StringIO()):
+            danditools.scholar.expand_citations(
+                graph,
+                store,
+                PARAMS,
+                search=fake,
+                max_depth=max_depth,
+                backoff=no_wait_backoff(),
+                **kwargs,
+            )
+        return store, graph
+
+    def test_cites_id(self):
+        (result,) = make_results([3])
+        self.assertEqual(danditools.scholar.cites_id(result), "c3")
+        del result.inline_links["cited_by"]["cites_id"]
+        result.inline_links["cited_by"][
+            "link"
+        ] = "https://scholar.google.com/scholar?cites=123&as_sdt=5&hl=en"
+        self.assertEqual(danditools.scholar.cites_id(result), "123")
+        result.inline_links["cited_by"]["total"] = 0
+        self.assertIsNone(danditools.scholar.cites_id(result))
+
+    def test_expands_breadth_first(self):
+        fake = FakeCitations()
+        store, graph = self.expand(fake, max_depth=3, parallel=4)
+        nodes, edges = bfs(list(range(5)), 3)
+        self.assertEqual(set(graph.depths), nodes)
+        self.assertEqual(graph.edges, edges)
+        self.assertEqual(len(store), len(nodes))
+        # each result is expanded once, and only those with citations
+        self.assertEqual(len(fake.cited()), len(set(fake.cited())))
+        self.assertFalse(any(num % 10 == 0 for num in fake.cited()))
+        self.assertEqual(
+            {graph.depths[f"id{num}"] for num in fake.cited()}, {0, 1, 2}
+        )
+
+    def test_fan_out(self):
+        fake = FakeCitations(seeds=2, wide={1: 45})
+        store, graph = self.expand(fake, max_depth=1, fan_out=25)
+        self.assertEqual(sum(1 for edge in graph.edges if edge[1] == "id1"), 25)
+        self.assertEqual(
+            [int(params["start"]) for params in fake.calls], [0, 20]
+        )
+
+    def test_resumes(self):
+        fake = FakeCitations()
+        self.expand(fake, max_depth=1)
+        first = fake.cited()
+        fake.calls.clear()
+        store, graph = self.expand(fake, max_depth=2)
+        self.assertFalse(set(first) & set(fake.cited()))
+        self.assertEqual((set(graph.depths), graph.edges), bfs(range(5), 2))
+
+        # as if stopped before the last result with citations was finished
+        lines = graph.path.read_text().splitlines(True)
+        last_done = max(
+            num
+            for num, line in enumerate(lines)
+            if json.loads(line)[0] == "done"
+            and citers(int(json.loads(line)[1][2:]))
+        )
+        graph.path.write_text("".join(lines[:last_done]) + '["edge", "id')
+        fake.calls.clear()
+        store, graph = self.expand(fake, max_depth=2)
+        self.assertEqual(len(fake.cited()), 1)
+        self.assertEqual((set(graph.depths), graph.edges), bfs(range(5), 2))
+        reopened = danditools.scholar.CitationGraph.for_output(self.output)
+        self.assertEqual(reopened.edges, graph.edges)
+        self.assertEqual(reopened.done, graph.done)
+
+    def test_export(self):
+        store, graph = self.expand(FakeCitations(seeds=2), max_depth=1)
+        edges_path = self.output.with_suffix(".edges.json")
+        graph.export(edges_path)
+        self.assertEqual(
+            json.loads(edges_path.read_text()),
+            sorted([list(edge) for edge in bfs([0, 1], 1)[1]]),
+        )
+
+
+class TestSort(unittest.TestCase):
+    methods = danditools.scholar.SortMethods
+
+    def summary(self, results) -> list[tuple[str, int]]:
+        return [
+            (
+                result.publication_info.authors[0].name,
+                danditools.scholar.citations_key(result),
+            )
+            for result in results
+        ]
+
+    def test_single(self):
+        results = make_results(range(30))
+        self.assertEqual(
+            self.methods.citations(results),
+            sorted(results, key=danditools.scholar.citations_key, reverse=True),
+        )
+        self.assertEqual(
+            self.methods.author(results, reverse=True),
+            sorted(results, key=danditools.scholar.author_key, reverse=True),
+        )
+
+    def test_subsorts(self):
+        results = make_results(range(60))
+        summary = self.summary(
+            self.methods.author(results, subsorts=[self.methods.citations])
+        )
+        self.assertEqual(
+            summary, sorted(summary, key=lambda item: (item[0], -item[1]))
+        )
+        summary = self.summary(
+            self.methods.citations(
+                results, reverse=True, subsorts=[self.methods.author]
+            )
+        )
+        self.assertEqual(summary, sorted(summary, key=lambda item: item[::-1]))
+
+    def test_descending_text(self):
+        order = danditools.scholar.SortOrder(
+            ((self.methods.citations, False), (self.methods.author, True))
+        )
+        summary = self.summary(order.sort(make_results(range(80))))
+        self.assertEqual(
+            summary,
+            sorted(
+                sorted(summary, key=lambda item: item[0], reverse=True),
+                key=lambda item: -item[1],
+            ),
+        )
+
+    def test_keys_computed_once(self):
+        calls = []
+
+        def counting_key(result):
+            calls.append(result.result_id)
+            return danditools.scholar.author_key(result)
+
+        results = make_results(range(25))
+        with unittest.mock.patch.dict(
+            danditools.scholar.SORT_KEYS, {"author": (counting_key, False)}
+        ):
+            order = danditools.scholar.SortOrder.of(self.methods.author)
+            order.sort(results)
+            order.sort(results[::-1])
+            ordered = danditools.scholar.SortedResults(order)
+            ordered.add(results[:5])
+            ordered.add(results[5:])
+        self.assertCountEqual(calls, [result.result_id for result in results])
+
+    def test_incremental(self):
+        order = danditools.scholar.SortOrder.of(
+            self.methods.citations, [self.methods.author]
+        )
+        ordered = danditools.scholar.SortedResults(order)
+        added = []
+        nums = list(range(200))
+        Random(4).shuffle(nums)
+        for start in range(0, 200, 15):
+            batch = make_results(nums[start : start + 15])
+            ordered.add(batch)
+            added.extend(batch)
+            self.assertEqual(ordered.results, order.sort(added))
+            self.assertEqual(
+                ordered.keys, [order.key(r) for r in ordered.results]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
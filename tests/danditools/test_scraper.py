@@ -0,0 +1,614 @@
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+from typing import Any, ClassVar
+import unittest
+import unittest.mock
+
+from bs4 import BeautifulSoup
+import requests
+
+import danditools.scraper
+
+
+class SiteServer(ThreadingHTTPServer):
+    """
+    The site's pages, and what was asked of them
+    """
+
+    pages: dict[str, bytes]
+    requests: list[str]
+    statuses: list[int]
+    ranges: list[str]
+    cut_off: dict[str, int]
+    fail_once: dict[str, int]
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """
+    Serves `server.pages`, a dict of path to bytes, with ETags and byte ranges.
+
+    The paths requested are recorded in `server.requests`, the Range headers
+    in `server.ranges` and each response status in `server.statuses`. A path
+    in `server.cut_off` has its body cut off after that many bytes, and one in
+    `server.fail_once` gets that status instead, once.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server: SiteServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def send_response(self, code: int, message: str | None = None) -> None:
+        self.server.statuses.append(code)
+        super().send_response(code, message)
+
+    def send_empty(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self) -> None:
+        self.do_GET(head=True)
+
+    def do_GET(self, head: bool = False) -> None:
+        self.server.requests.append(self.path)
+        body = self.server.pages.get(self.path)
+        if body is None:
+            self.send_empty(404)
+            return
+        if (status := self.server.fail_once.pop(self.path, None)) is not None:
+            self.send_empty(status)
+            return
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_empty(304)
+            return
+        status = 200
+        start, stop = 0, len(body)
+        if (ranges := self.headers.get("Range")) is not None and (
+            self.headers.get("If-Range") in (None, etag)
+        ):
+            self.server.ranges.append(ranges)
+            first, _, last = ranges.removeprefix("bytes=").partition("-")
+            start = int(first)
+            stop = int(last) + 1 if last else len(body)
+            if start >= len(body):
+                self.send_empty(416)
+                return
+            status = 206
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(stop - start))
+        if status == 206:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{stop - 1}/{len(body)}"
+            )
+        self.end_headers()
+        if head:
+            return
+        if (cut_off := self.server.cut_off.pop(self.path, None)) is not None:
+            self.wfile.write(body[start : start + cut_off])
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:stop])
+
+
+class SiteTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs a local site to scrape
+    """
+
+    pages: ClassVar[dict[str, bytes]] = {}
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp.name)
+        self.server = SiteServer(("127.0.0.1", 0), SiteHandler)
+        self.server.pages = dict(self.pages)
+        self.server.requests = []
+        self.server.statuses = []
+        self.server.ranges = []
+        self.server.cut_off = {}
+        self.server.fail_once = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self._tmp.cleanup()
+
+
+def index_page(*links: tuple[str, str]) -> bytes:
+    return "".join(
+        f'<p><a href="{href}">{text}</a></p>' for text, href in links
+    ).encode()
+
+
+class TestLinkExtractor(unittest.TestCase):
+
+    def test_matches_soup(self):
+        html = (
+            '<html><body><a href="a.pdf">A <b>bold</b> &amp; caf\u00e9</a>'
+            "<a name=nohref>skipped</a><p><a href='/b/'>B</a>"
+            '<a href="c.pdf"/></body>'
+        ).encode()
+        soup = BeautifulSoup(html, "html.parser")
+        expected = [
+            (tag.text, tag["href"]) for tag in soup.find_all("a", href=True)
+        ]
+        # fed a byte at a time, splitting tags and the multibyte character
+        self.assertEqual(
+            list(
+                danditools.scraper.iter_links(
+                    html[pos : pos + 1] for pos in range(len(html))
+                )
+            ),
+            expected,
+        )
+
+    def test_yields_as_it_goes(self):
+        links = danditools.scraper.iter_links(
+            iter([b'<a href="one">1</a><a hr', b'ef="two">2</a>'])
+        )
+        self.assertEqual(next(links), ("1", "one"))
+        self.assertEqual(list(links), [("2", "two")])
+
+    def test_unclosed(self):
+        # like a browser, and unlike BeautifulSoup, anchors don't nest
+        self.assertEqual(
+            list(
+                danditools.scraper.iter_links(
+                    [b'<a href="d.pdf">D<a href="e.pdf">E</body>']
+                )
+            ),
+            [("D", "d.pdf"), ("E", "e.pdf")],
+        )
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+
+    async def test_rate(self):
+        bucket = danditools.scraper.TokenBucket(rate=50, capacity=5)
+        start = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        # the first five are the burst, the rest wait their turn
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+
+class TestScrape(SiteTestCase):
+
+    pages = {
+        "/": index_page(
+            ("one", "files/one.pdf"),
+            ("sub", "sub/index.html"),
+            ("skip", "notes.txt"),
+        ),
+        "/sub/index.html": index_page(("two", "two.pdf")),
+        "/files/one.pdf": b"%PDF one",
+        "/sub/two.pdf": b"%PDF two",
+    }
+
+    async def test_scrape(self):
+        saved = await danditools.scraper.scrape(
+            [self.base_url + "/"],
+            self.tmp_dir,
+            target_exts=[".pdf"],
+            follow=True,
+            fetcher=danditools.scraper.Fetcher(concurrency=4, rate=100),
+        )
+        self.assertEqual(sorted(path.name for path in saved), ["one", "two"])
+        self.assertEqual((self.tmp_dir / "two").read_bytes(), b"%PDF two")
+        self.assertNotIn("/notes.txt", self.server.requests)
+
+
+def cacheable(etag: str, content: bytes = b"12345") -> requests.Response:
+    response = requests.Response()
+    response._content = content
+    response.headers["ETag"] = f'"{etag}"'
+    return response
+
+
+class TestPageCache(SiteTestCase):
+
+    pages = {
+        "/": index_page(("one", "one.pdf")),
+        "/one.pdf": b"%PDF one",
+    }
+
+    async def scrape(self, cache) -> list[Path]:
+        out_dir = self.tmp_dir / "out"
+        out_dir.mkdir(exist_ok=True)
+        return await danditools.scraper.scrape(
+            [self.base_url + "/"],
+            out_dir,
+            target_exts=[".pdf"],
+            fetcher=danditools.scraper.Fetcher(rate=100, cache=cache),
+        )
+
+    async def test_revalidates(self):
+        cache_dir = self.tmp_dir / "cache"
+        await self.scrape(danditools.scraper.PageCache(cache_dir))
+        self.server.statuses.clear()
+        saved = await self.scrape(danditools.scraper.PageCache(cache_dir))
+        self.assertEqual(len(saved), 1)
+        # the index wasn't sent again, and the download is already stored
+        self.assertEqual(self.server.statuses, [304])
+
+    def test_evicts_least_recent(self):
+        # evicted down to 10 bytes
+        cache = danditools.scraper.PageCache(
+            self.tmp_dir / "cache", max_bytes=12
+        )
+        for num, url in enumerate(("a", "b", "c")):
+            cache.put(url, cacheable(url))
+            if num == 1:
+                # b becomes the least recently used
+                os.utime(cache._paths("b")[1], (0, 0))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a").etag, '"a"')
+        self.assertEqual(cache.size, 10)
+
+    def test_evicts_in_batches(self):
+        cache = danditools.scraper.PageCache(
+            self.tmp_dir / "cache", max_bytes=100
+        )
+        with unittest.mock.patch.object(
+            cache, "_bodies", wraps=cache._bodies
+        ) as bodies:
+            for num in range(40):
+                cache.put(str(num), cacheable(str(num)))
+        # the first overflow, at 105 bytes, evicts down to 90, so the cache is
+        # only scanned again every third put
+        self.assertEqual(bodies.call_count, 7)
+        self.assertEqual(cache.size, sum(1 for _ in cache._bodies()) * 5)
+        self.assertLessEqual(cache.size, 100)
+
+
+class TestDownloadStore(SiteTestCase):
+
+    pages = {
+        "/": index_page(
+            ("report.pdf", "a/report.pdf"),
+            ("report.pdf", "b/report.pdf"),
+            ("report.pdf", "c/report.pdf"),
+        ),
+        "/a/report.pdf": b"%PDF same",
+        "/b/report.pdf": b"%PDF same",
+        "/c/report.pdf": b"%PDF different",
+    }
+
+    async def scrape(self) -> list[Path]:
+        return await danditools.scraper.scrape(
+            [self.base_url + "/"],
+            self.tmp_dir,
+            target_exts=[".pdf"],
+            fetcher=danditools.scraper.Fetcher(concurrency=1, rate=100),
+        )
+
+    async def test_dedupes(self):
+        saved = await self.scrape()
+        self.assertEqual(
+            [path.name for path in saved],
+            ["report.pdf", "report.pdf", "report_1.pdf"],
+        )
+        self.assertEqual(
+            (self.tmp_dir / "report_1.pdf").read_bytes(), b"%PDF different"
+        )
+        blobs = [
+            path
+            for path in (self.tmp_dir / ".store").glob("*/*")
+            if path.is_file()
+        ]
+        self.assertEqual(len(blobs), 2)
+
+        # known urls aren't requested again
+        self.server.requests.clear()
+        self.assertEqual(await self.scrape(), saved)
+        self.assertEqual(self.server.requests, ["/"])
+
+
+class TestResume(SiteTestCase):
+
+    big = bytes(range(256)) * 1200
+    # whole chunks make it to disk before the connection is cut off
+    chunk = danditools.scraper.CHUNK_SIZE
+    pages = {
+        "/": index_page(("big.bin", "big.bin")),
+        "/big.bin": big,
+    }
+
+    async def scrape(self, **kwargs) -> list[Path]:
+        return await danditools.scraper.scrape(
+            [self.base_url + "/"],
+            self.tmp_dir,
+            target_exts=[".bin"],
+            fetcher=danditools.scraper.Fetcher(rate=100),
+            **kwargs,
+        )
+
+    async def test_resume(self):
+        self.server.cut_off["/big.bin"] = self.chunk + 100
+        self.assertEqual(await self.scrape(), [])
+        self.assertEqual(await self.scrape(), [self.tmp_dir / "big.bin"])
+        self.assertEqual(self.server.ranges, [f"bytes={self.chunk}-"])
+        self.assertEqual((self.tmp_dir / "big.bin").read_bytes(), self.big)
+
+    async def test_segments(self):
+        saved = await self.scrape(segments=4, segment_min_bytes=1024)
+        # segments run in parallel, so arrive in any order
+        self.assertCountEqual(
+            self.server.ranges,
+            [
+                "bytes=0-76799",
+                "bytes=76800-153599",
+                "bytes=153600-230399",
+                "bytes=230400-307199",
+            ],
+        )
+        self.assertEqual(saved[0].read_bytes(), self.big)
+
+    async def test_resume_segments(self):
+        self.server.cut_off["/big.bin"] = self.chunk + 100
+        self.assertEqual(
+            await self.scrape(segments=2, segment_min_bytes=1024), []
+        )
+        saved = await self.scrape(segments=2, segment_min_bytes=1024)
+        self.assertEqual(saved[0].read_bytes(), self.big)
+        # whichever segment was cut off picks up where it stopped
+        self.assertTrue(
+            {
+                f"bytes={self.chunk}-153599",
+                f"bytes={153600 + self.chunk}-307199",
+            }
+            & set(self.server.ranges)
+        )
+        self.assertFalse(list((self.tmp_dir / ".store" / "partial").iterdir()))
+
+
+class TestFrontier(SiteTestCase):
+
+    pages = {
+        "/": index_page(
+            ("a", "a/"),
+            ("b", "/b/index.html#top"),
+            ("away", "http://elsewhere.invalid/index.html"),
+            ("mail", "mailto:someone@example.com"),
+        ),
+        "/a/": index_page(
+            ("back", "../"),
+            ("b", "../b/index.html"),
+            ("deep", "deep.html"),
+            ("bad port", "http://host:99999/three.pdf"),
+            ("one", "one.pdf?b=2&a=1"),
+            ("bad host", "http://[::1/four.pdf"),
+        ),
+        "/b/index.html": index_page(
+            ("home", "/"), ("one", "/a/one.pdf?a=1&b=2")
+        ),
+        "/a/deep.html": index_page(("two", "two.pdf")),
+        "/a/one.pdf": b"%PDF one",
+        "/a/two.pdf": b"%PDF two",
+    }
+
+    def test_canonicalize(self):
+        canonicalize_url = danditools.scraper.canonicalize_url
+        self.assertEqual(
+            canonicalize_url("HTTP://Example.COM:80?b=1&a=2#frag"),
+            "http://example.com/?a=2&b=1",
+        )
+        self.assertEqual(
+            canonicalize_url("../c/./d.pdf", "https://example.com:8443/a/b/"),
+            "https://example.com:8443/a/c/d.pdf",
+        )
+        self.assertIsNone(canonicalize_url("javascript:void(0)"))
+        self.assertIsNone(canonicalize_url("http://host:99999/"))
+        self.assertIsNone(canonicalize_url("/[x", "http://[::1/"))
+
+    def test_frontier(self):
+        frontier = danditools.scraper.Frontier()
+        self.assertTrue(frontier.push("http://a/", 0))
+        self.assertTrue(frontier.push("http://b/", 1))
+        self.assertFalse(frontier.push("http://a/", 2))
+        self.assertEqual(frontier.pop(), ("http://a/", 0))
+        self.assertTrue(frontier.push("http://c/", 1))
+        self.assertEqual(frontier.pop(), ("http://b/", 1))
+        self.assertEqual(frontier.pop(), ("http://c/", 1))
+        self.assertIsNone(frontier.pop())
+        frontier.close()
+        self.assertFalse(frontier.path.exists())
+
+    async def links(self, **kwargs) -> list[tuple[str, str]]:
+        fetcher = danditools.scraper.Fetcher(rate=1000)
+        links = [
+            link
+            async for link in danditools.scraper.get_download_links(
+                fetcher, [self.base_url], target_exts=[".pdf"], **kwargs
+            )
+        ]
+        fetcher.close()
+        return links
+
+    async def test_each_page_once(self):
+        links = await self.links(follow=True)
+        self.assertEqual(
+            sorted(links),
+            [
+                ("one", self.base_url + "/a/one.pdf?a=1&b=2"),
+                ("two", self.base_url + "/a/two.pdf"),
+            ],
+        )
+        self.assertCountEqual(
+            self.server.requests,
+            ["/", "/a/", "/b/index.html", "/a/deep.html"],
+        )
+
+    async def test_depth(self):
+        links = await self.links(follow=1)
+        self.assertEqual([text for text, _ in links], ["one"])
+        self.assertNotIn("/a/deep.html", self.server.requests)
+
+
+def urlset(*locs: str, index: bool = False) -> bytes:
+    kind, outer = ("sitemap", "sitemapindex") if index else ("url", "urlset")
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><{outer}'
+        ' xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        + "".join(f"<{kind}><loc>{loc}</loc></{kind}>" for loc in locs)
+        + f"</{outer}>"
+    ).encode()
+
+
+class TestSitemap(SiteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        base = self.base_url
+        self.server.pages.update(
+            {
+                "/robots.txt": f"Sitemap: {base}/index.xml\n".encode(),
+                "/index.xml": urlset(
+                    f"{base}/one.xml.gz", f"{base}/two.xml", index=True
+                ),
+                "/one.xml.gz": gzip.compress(
+                    urlset(f"{base}/a.pdf", f"{base}/page.html")
+                ),
+                # malformed entries are skipped, not fatal
+                "/two.xml": urlset(
+                    f"{base}/b.pdf",
+                    "http://host:99999/x.pdf",
+                    "http://[::1/y.pdf",
+                    f"{base}/a.pdf",
+                ),
+                "/page.html": index_page(("c", "c.pdf")),
+            }
+        )
+
+    async def links(self, **kwargs) -> list[tuple[str, str]]:
+        fetcher = danditools.scraper.Fetcher(rate=1000)
+        links = [
+            link
+            async for link in danditools.scraper.get_sitemap_links(
+                fetcher, [self.base_url + "/"], target_exts=[".pdf"], **kwargs
+            )
+        ]
+        fetcher.close()
+        return links
+
+    def test_parse_in_pieces(self):
+        data = gzip.compress(urlset("http://a/1.pdf", "http://a/2.pdf"))
+        self.assertEqual(
+            list(
+                danditools.scraper.parse_sitemap(
+                    data[start : start + 7] for start in range(0, len(data), 7)
+                )
+            ),
+            [("url", "http://a/1.pdf"), ("url", "http://a/2.pdf")],
+        )
+
+    async def test_sitemap_links(self):
+        links = await self.links()
+        self.assertEqual(
+            links,
+            [("", self.base_url + "/a.pdf"), ("", self.base_url + "/b.pdf")],
+        )
+        self.assertNotIn("/page.html", self.server.requests)
+
+    async def test_follow_pages(self):
+        links = await self.links(follow=True)
+        self.assertIn(("c", self.base_url + "/c.pdf"), links)
+
+    async def test_stream(self):
+        first_taken = threading.Event()
+
+        def entries():
+            for num in range(3):
+                yield num
+                # the rest only come once the first has been taken
+                first_taken.wait(5)
+
+        fetcher = danditools.scraper.Fetcher(rate=1000)
+        stream = fetcher.stream(self.base_url, entries)
+        self.assertEqual(await anext(stream), 0)
+        first_taken.set()
+        self.assertEqual([num async for num in stream], [1, 2])
+        fetcher.close()
+
+    async def test_stream_stops(self):
+        produced = []
+
+        def entries():
+            for num in itertools.count():
+                produced.append(num)
+                yield num
+                time.sleep(0.01)
+
+        fetcher = danditools.scraper.Fetcher(rate=1000)
+        stream = fetcher.stream(self.base_url, entries)
+        self.assertEqual(await anext(stream), 0)
+        await stream.aclose()
+        stopped_at = len(produced)
+        time.sleep(0.05)
+        fetcher.close()
+        self.assertEqual(len(produced), stopped_at)
+
+    async def test_no_sitemap(self):
+        for path in ("/robots.txt", "/index.xml"):
+            del self.server.pages[path]
+        self.server.pages["/"] = index_page(("d", "d.pdf"))
+        self.assertEqual(await self.links(), [("d", self.base_url + "/d.pdf")])
+
+
+class TestMetrics(SiteTestCase):
+
+    pages = {
+        "/": index_page(("one", "one.pdf")),
+        "/one.pdf": b"%PDF one",
+    }
+
+    def test_histogram(self):
+        histogram = danditools.scraper.Histogram()
+        for ms in (0.5, 3, 3, 100):
+            histogram.add(ms / 1000)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.percentile(0.5), 0.004)
+        self.assertEqual(histogram.percentile(1.0), 0.128)
+        self.assertEqual(
+            histogram.summary()["buckets_ms"], {"1": 1, "4": 2, "128": 1}
+        )
+
+    async def test_summary(self):
+        self.server.fail_once["/one.pdf"] = 503
+        metrics_path = self.tmp_dir / "metrics.json"
+        await danditools.scraper.scrape(
+            [self.base_url + "/"],
+            self.tmp_dir,
+            target_exts=[".pdf"],
+            fetcher=danditools.scraper.Fetcher(rate=100),
+            metrics_path=metrics_path,
+        )
+        summary = json.loads(metrics_path.read_text())
+        self.assertEqual(summary["files"], 1)
+        self.assertEqual(summary["file_bytes"], len(b"%PDF one"))
+        host = summary["hosts"][f"127.0.0.1:{self.server.server_port}"]
+        self.assertEqual(host["requests"], 2)
+        self.assertEqual(host["retries"], 1)
+        self.assertEqual(host["statuses"], {"200": 2})
+        self.assertEqual(
+            host["bytes"], len(self.server.pages["/"]) + len(b"%PDF one")
+        )
+        self.assertEqual(
+            set(summary["latency"]), {"wait", "connect", "ttfb", "transfer"}
+        )
+        self.assertEqual(summary["latency"]["ttfb"]["count"], 2)
@@ -1,11 +1,27 @@
+import numpy as np
 from _typeshed import Incomplete
-from dataclasses import dataclass as dataclass, field as field
-from enum import StrEnum
+from dataclasses import dataclass, field
+from enum import Enum, StrEnum
 from pathlib import Path, PurePath
-from pydoc import Doc as Doc
-from pypdf import PageObject as PageObject, PdfWriter
-from src.dandiscribe.layout import Page as Page
-from typing import Callable, Iterator, NamedTuple
+from pypdf import PageObject, PdfReader, PdfWriter, Transformation
+from pypdf.generic import IndirectObject as IndirectObject
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Collection,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Self,
+    Sequence,
+)
+
+STREAM_WINDOW: int
+MIN_CHUNK_PAGES: int
+DIMS_TOLERANCE: float
+INHERITABLE_ATTRS: Incomplete
+DEFAULT_SHEET_SIZE: Incomplete
 
 def copy_cache(to_dec, deep: bool = True) -> Callable: ...
 def extant_path_type(source: str) -> PurePath: ...
@@ -16,8 +32,33 @@ class Edge(StrEnum):
     VERTICAL = ...
     HORIZONTAL = ...
 
+class Compression(StrEnum):
+    NONE = ...
+    FAST = ...
+    MAX = ...
+    @property
+    def level(self) -> int | None: ...
+
 @copy_cache
 def get_pages(source: Path) -> list[PageObject]: ...
+def open_source(source: Path) -> PdfReader: ...
+def page_count(reader: PdfReader) -> int: ...
+def walk_page_tree(
+    reader: PdfReader, page_nums: range
+) -> Iterator[PageObject]: ...
+def iter_pages(
+    reader: PdfReader, window: int = ..., page_nums: Iterable[int] | None = None
+) -> Iterator[PageObject]: ...
+
+class PageSelection(NamedTuple):
+    ranges: tuple[tuple[int, int | None], ...]
+    @classmethod
+    def parse(cls, value: str) -> PageSelection: ...
+    def page_nums(self, num_pages: int) -> tuple[int, ...]: ...
+
+def chunk_pages(
+    num_pages: int, jobs: int, min_chunk: int | None = None
+) -> Iterator[range]: ...
 
 class Vector2(NamedTuple):
     x: float
@@ -35,6 +76,17 @@ class Dimensions(NamedTuple):
         self, edge: Edge = ..., out_edge: Edge | None = None
     ) -> SplitRes: ...
 
+class PageTransform(NamedTuple):
+    box: tuple[float, float, float, float]
+    rotation: int = ...
+    @classmethod
+    def from_page(cls, page: PageObject) -> PageTransform: ...
+    def matrix(self) -> Transformation: ...
+    def dimensions(self) -> Dimensions: ...
+    def rotate(self, angle: int) -> PageTransform: ...
+    def crop(self, offset: Vector2, dims: Dimensions) -> PageTransform: ...
+    def apply(self, page: PageObject) -> PageObject: ...
+
 class PageDimensions(NamedTuple):
     width: float
     height: float
@@ -42,24 +94,49 @@ class PageDimensions(NamedTuple):
     ppi: int = ...
     page_num: int | None = ...
     original_page_num: int | None = ...
+    transform: PageTransform | None = ...
     @classmethod
     def create_from_page(
         cls, page: PageObject, page_num: int | None = None
     ) -> PageDimensions: ...
     def get_dimensions(self) -> Dimensions: ...
+    def page_transform(self) -> PageTransform: ...
+    def rotate(self, angle: int) -> PageDimensions: ...
+    def add_whole(self, writer: PdfWriter | Volumes) -> PageObject: ...
     def in_inches(self, ppi: int | None = None): ...
     def split_on_edge(
-        self, writer: PdfWriter, edge: str = "long"
+        self, writer: PdfWriter | Volumes, edge: str = "long"
     ) -> tuple["PageDimensions", "PageDimensions"]: ...
     @classmethod
     def create_from_pages(
-        cls, pages: list[PageObject]
+        cls, pages: Iterable[PageObject], page_nums: Iterable[int] | None = None
     ) -> Iterator["PageDimensions"]: ...
 
 def crop_page(
     page: PageObject, dims: PageDimensions, offset: Vector2 = ...
 ): ...
 
+class SizeIndex(NamedTuple):
+    sizes: np.ndarray
+    labels: np.ndarray
+    centers: np.ndarray
+    counts: np.ndarray
+    @classmethod
+    def create(
+        cls, sizes: Iterable[Dimensions] | np.ndarray, tolerance: float = ...
+    ) -> SizeIndex: ...
+    @classmethod
+    def from_pages(
+        cls, pages: Iterable[PageObject], tolerance: float = ...
+    ) -> SizeIndex: ...
+    def __len__(self) -> int: ...
+    def size(self, label: int) -> Dimensions: ...
+    def page_size(self, page_num: int) -> Dimensions: ...
+    def dominant_label(self) -> int: ...
+    def dominant(self) -> Dimensions: ...
+    def outliers(self) -> np.ndarray: ...
+    def pages_per_cluster(self) -> dict[Dimensions, np.ndarray]: ...
+
 class CantDetermineDimensions(Exception):
     possible_dimensions: Incomplete
     def __init__(self, possible_dimensions: list[Dimensions]) -> None: ...
@@ -69,17 +146,168 @@ class DocDimensions(NamedTuple):
     body: dict[Dimensions, list[PageDimensions]]
     last: Dimensions | None
     ordered_body: list[PageDimensions] | None = ...
+    size_index: SizeIndex | None = ...
+    selection: tuple[int, ...] | None = ...
     def guess_best_dims(self, split_on_edge: Edge = ...) -> SplitRes: ...
     def get_needs_split_or_crop(self, dims: Dimensions | None = None): ...
+    def num_pages(self) -> int: ...
+    def page_nums(self) -> Sequence[int]: ...
+    def unsplit_page_nums(self) -> frozenset[int]: ...
     @classmethod
-    def create(cls, source: Path) -> DocDimensions: ...
+    def create(
+        cls,
+        source: Path,
+        reader: PdfReader | None = None,
+        tolerance: float = ...,
+        selection: Sequence[int] | None = None,
+    ) -> DocDimensions: ...
+
+def stream_source(
+    writer: PdfWriter | Volumes,
+    reader: PdfReader,
+    unsplit_pages: Collection[int],
+    rotation: int | None = None,
+    window: int = ...,
+    page_nums: Sequence[int] | None = None,
+    checkpoint: Callable[[], None] | None = None,
+    edge: Edge = ...,
+) -> None: ...
+def dedupe_writer(writer: PdfWriter) -> tuple[int, int]: ...
+def compress_writer(writer: PdfWriter, compression: Compression) -> int: ...
+def write_pdf(
+    writer: PdfWriter,
+    dest: Path,
+    dedupe: bool = False,
+    compression: Compression = ...,
+    stats: bool = False,
+) -> None: ...
+@dataclass
+class Volumes:
+    dest: Path
+    max_pages: int | None = ...
+    max_bytes: int | None = ...
+    write: Callable[[PdfWriter, Path], None] = ...
+    writer: PdfWriter = field(default_factory=PdfWriter)
+    volumes: list[dict[str, Any]] = field(default_factory=list)
+    @property
+    def rolling(self) -> bool: ...
+    @staticmethod
+    def manifest_for(dest: Path) -> Path: ...
+    @property
+    def manifest_path(self) -> Path: ...
+    def volume_path(self, volume_num: int) -> Path: ...
+    def add_page(self, page: PageObject) -> PageObject: ...
+    def append(self, reader: PdfReader) -> None: ...
+    def estimated_size(self) -> int: ...
+    def checkpoint(self) -> None: ...
+    def write_manifest(self, complete: bool) -> None: ...
+    def close(self) -> PdfWriter: ...
 
+def split_chunk(
+    source: Path,
+    page_nums: Sequence[int],
+    unsplit_pages: frozenset[int],
+    rotation: int | None = None,
+    window: int = ...,
+    edge: Edge = ...,
+) -> bytes: ...
 def split_and_merge(
     sources: list[Path],
     dest: Path,
     dims: Dimensions | None = None,
     rotation: int | None = None,
+    stream: bool = False,
+    window: int = ...,
+    jobs: int = 1,
+    tolerance: float = ...,
+    dedupe: bool = False,
+    pages: PageSelection | None = None,
+    compression: Compression = ...,
+    stats: bool = False,
+    volume_pages: int | None = None,
+    volume_bytes: int | None = None,
+    edge: Edge = ...,
+) -> PdfWriter: ...
+def split_to_file(source: Path, dest: Path, **kwargs) -> Path: ...
+def hash_file(path: Path) -> str: ...
+
+class SourceRecord(NamedTuple):
+    size: int
+    mtime: float
+    sha256: str
+    params: dict[str, Any]
+    output: str
+
+@dataclass
+class SplitManifest:
+    dest_dir: Path
+    sources: dict[str, SourceRecord] = field(default_factory=dict)
+    NAME: ClassVar[str] = ...
+    @property
+    def path(self) -> Path: ...
+    @classmethod
+    def load(cls, dest_dir: Path) -> Self: ...
+    def save(self) -> None: ...
+    def is_current(self, source: Path, params: dict[str, Any]) -> bool: ...
+    def record(
+        self, source: Path, params: dict[str, Any], output: Path
+    ) -> None: ...
+
+def format_dims(dims: Dimensions) -> str: ...
+
+class Inventory(NamedTuple):
+    path: Path
+    file_size: int
+    page_count: int = ...
+    sizes: dict[Dimensions, int] | None = ...
+    rotations: dict[int, int] | None = ...
+    cropped_pages: int = ...
+    error: str | None = ...
+    @classmethod
+    def create(cls, source: Path, tolerance: float = ...) -> Inventory: ...
+    def dominant(self) -> Dimensions | None: ...
+    def split_dims(self, edge: Edge = ...) -> Dimensions | None: ...
+    def dump(self) -> dict[str, Any]: ...
+
+def iter_pdf_paths(sources: Iterable[Path]) -> Iterator[Path]: ...
+def take_inventory(
+    sources: Iterable[Path], jobs: int | None = None, tolerance: float = ...
+) -> Iterator[Inventory]: ...
+def write_inventory_csv(inventories: Iterable[Inventory], out) -> None: ...
+
+class LayoutGrid(NamedTuple):
+    val: int
+    rows: int
+    cols: int
+
+class ImposeLayout(Enum):
+    EIGHT_PAGE_MINI = ...
+    QUARTER = ...
+    HALF = ...
+
+def booklet_sides(
+    page_count: int, layout: ImposeLayout
+) -> list[list[int | None]]: ...
+def n_up_sides(
+    page_count: int, layout: ImposeLayout
+) -> list[list[int | None]]: ...
+def page_to_xobject(page: PageObject, writer: PdfWriter) -> IndirectObject: ...
+def fit_transform(
+    transform: PageTransform,
+    cell_origin: Vector2,
+    cell: Dimensions,
+    h_align: float = 0.5,
+) -> Transformation: ...
+def impose_pdf(
+    source: Path,
+    dest: Path,
+    layout: ImposeLayout = ...,
+    booklet: bool = True,
+    sheet_size: Dimensions = ...,
 ) -> PdfWriter: ...
 def dims_type(in_val): ...
+def pages_type(in_val): ...
 def demo() -> None: ...
 def split() -> None: ...
+def impose() -> None: ...
+def inventory() -> None: ...
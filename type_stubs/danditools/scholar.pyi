@@ -1,14 +1,29 @@
-from _typeshed import Incomplete
-from collections.abc import Generator
+import sqlite3
+from _typeshed import Incomplete, SupportsDunderLT
+from argparse import ArgumentParser
+from collections.abc import Callable, Generator, Iterable, Iterator
 from dandy_lib.cli.enums import CallableChoiceEnum
 from dataclasses import dataclass, field
 from enum import Enum as Enum, member
-from pathlib import PurePath
+from pathlib import Path
 from pprint import pformat as pformat
-from typing import ClassVar
+from random import Random
+from threading import Lock
+from time import monotonic
+from typing import Any, ClassVar
 
 PER_PAGE: int
 TIMEOUT_RETRIES: int
+DEFAULT_WORKERS: int
+MAX_RESULTS: int
+DEFAULT_CACHE_DIR: Incomplete
+DEFAULT_CACHE_DAYS: float
+DEFAULT_PARALLEL: int
+DEFAULT_RATE: float
+DEFAULT_DEPTH: int
+DEFAULT_FAN_OUT = PER_PAGE
+CACHE_PARAMS: Incomplete
+Search = Callable[[dict], dict]
 
 @dataclass
 class Author:
@@ -29,15 +44,11 @@ class Result:
         metadata={"danditools": {"scholar": {"source": "type"}}}
     )
     publication_info: PublicationInfo
-    snippet: str = field(repr=False, compare=False, default="")
-    inline_links: dict[str, str | dict[str, str | int]] = field(
-        compare=False, repr=False, default_factory=list
-    )
-    position: int = field(compare=False, repr=False, default=None)
-    link: str = field(compare=False, default=None)
-    resources: list[dict[str, str]] = field(
-        compare=False, default_factory=list, repr=False
-    )
+    snippet: str = ...
+    inline_links: dict[str, str | dict[str, str | int]] = ...
+    position: int = ...
+    link: str = ...
+    resources: list[dict[str, str]] = ...
     EXPORT_KEYS: ClassVar[list[str]] = ...
     @classmethod
     def from_json_obj(cls, json_obj) -> Result: ...
@@ -47,7 +58,87 @@ class Result:
     ) -> Generator[Incomplete]: ...
     def dump(self) -> dict: ...
 
-def author_key(result: Result) -> list[str]: ...
+def position_key(result: Result) -> int: ...
+@dataclass
+class Backoff:
+    base: float = ...
+    cap: float = ...
+    factor: float = ...
+    sleep: Callable[[float], None] = ...
+    random: Random = field(default_factory=Random)
+    delay: float = field(init=False, default=0.0)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+    def pace(self) -> float: ...
+    def failed(self) -> None: ...
+    def succeeded(self) -> None: ...
+
+@dataclass
+class RateLimit:
+    rate: float
+    burst: float = ...
+    tokens: float = field(init=False)
+    updated: float = field(init=False, default_factory=monotonic)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+    def __post_init__(self) -> None: ...
+    def acquire(self) -> None: ...
+
+def rate_limited(search: Search, limit: RateLimit) -> Search: ...
+@dataclass
+class PageEnd:
+    end: int
+    last_full: int = ...
+    gaps: set[int] = ...
+    lock: Lock = ...
+    def reached(self, offset: int) -> bool: ...
+    def past(self, offset: int) -> bool: ...
+    def arrived(
+        self, offset: int, page: dict, results: list[Result]
+    ) -> int: ...
+
+def fetch_page(
+    search: Search,
+    params: dict,
+    offset: int,
+    backoff: Backoff,
+    page_end: PageEnd | None = None,
+) -> tuple[dict, list[Result]]: ...
+def page_offsets(
+    first_page: dict, start: int = 0, max_res: int | None = None
+) -> range | None: ...
+def iter_pages(
+    params: dict,
+    search: Search = ...,
+    start: int = 0,
+    max_res: int | None = None,
+    workers: int = ...,
+    backoff: Backoff | None = None,
+) -> Iterator[tuple[int, list[Result]]]: ...
+def in_order(
+    pages: Iterable[tuple[int, list[Result]]],
+    start: int = 0,
+    max_res: int | None = None,
+) -> Iterator[list[Result]]: ...
+def fetch_results(params: dict, **kwargs) -> list[Result]: ...
+def cache_key(params: dict) -> str: ...
+@dataclass
+class ResponseCache:
+    cache_dir: Path = ...
+    ttl: float = ...
+    db: sqlite3.Connection = field(init=False, repr=False)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+    def __post_init__(self) -> None: ...
+    def get(self, params: dict, stale: bool = False) -> dict | None: ...
+    def put(self, params: dict, response: dict) -> None: ...
+    def close(self) -> None: ...
+
+@dataclass
+class CachedSearch:
+    cache: ResponseCache
+    search: Search = ...
+    offline: bool = ...
+    def __call__(self, params: dict) -> dict: ...
+
+def author_key(result: Result) -> tuple[str, ...]: ...
 def citations_key(result: Result) -> int: ...
 
 class SortMethods(CallableChoiceEnum):
@@ -64,11 +155,115 @@ class SortMethods(CallableChoiceEnum):
         subsorts: list["SortMethods"] | None = None,
     ): ...
     def __call__(self, *args, **kwargs): ...
+    @property
+    def key(self) -> Callable[[Result], SupportsDunderLT[Any]]: ...
+    @property
+    def descending(self) -> bool: ...
+
+SORT_KEYS: dict[str, tuple[Callable[[Result], SupportsDunderLT[Any]], bool]]
+
+class Descending[K: SupportsDunderLT[Any]]:
+    key: Incomplete
+    def __init__(self, key: K) -> None: ...
+    def __eq__(self, other: object) -> bool: ...
+    def __lt__(self, other: Descending[K]) -> bool: ...
+
+@dataclass
+class SortOrder:
+    methods: tuple[tuple[SortMethods, bool], ...]
+    keys: dict[str, tuple] = field(
+        init=False, default_factory=dict, repr=False, compare=False
+    )
+    @classmethod
+    def of(
+        cls,
+        method: SortMethods,
+        subsorts: Iterable[SortMethods] | None = None,
+        reverse: bool = False,
+    ) -> SortOrder: ...
+    def key(self, result: Result) -> tuple: ...
+    def sort(self, results: Iterable[Result]) -> list[Result]: ...
+
+@dataclass
+class SortedResults:
+    order: SortOrder
+    results: list[Result] = field(init=False, default_factory=list)
+    keys: list[tuple] = field(init=False, default_factory=list, repr=False)
+    def add(self, results: list[Result]) -> None: ...
+
+def read_log(path: Path) -> list[str]: ...
+@dataclass
+class ResultStore:
+    path: Path
+    sort: SortOrder | None = ...
+    offsets: dict[str, int] = field(init=False, default_factory=dict)
+    hits: dict[str, list[str]] = field(init=False, default_factory=dict)
+    ordered: SortedResults | None = field(init=False, default=None)
+    lock: Lock = field(init=False, default_factory=Lock, repr=False)
+    def __post_init__(self) -> None: ...
+    @classmethod
+    def for_output(
+        cls, output: Path, reset: bool = False, sort: SortOrder | None = None
+    ) -> ResultStore: ...
+    @property
+    def index_path(self) -> Path: ...
+    @property
+    def hits_path(self) -> Path: ...
+    def __contains__(self, result_id: str) -> bool: ...
+    def __len__(self) -> int: ...
+    def add(
+        self, results: Iterable[Result], query: str | None = None
+    ) -> list[Result]: ...
+    def dump(self, result: Result) -> dict: ...
+    def get(self, result_id: str) -> Result: ...
+    def results(self) -> list[Result]: ...
+    def export(self, output: Path) -> None: ...
+
+def run_batch(
+    queries: Iterable[str],
+    store: ResultStore,
+    params: dict,
+    search: Search = ...,
+    parallel: int = ...,
+    backoff: Backoff | None = None,
+    **kwargs,
+) -> dict[str, int]: ...
+def cites_id(result: Result) -> str | None: ...
+@dataclass
+class CitationGraph:
+    path: Path
+    depths: dict[str, int] = field(init=False, default_factory=dict)
+    edges: set[tuple[str, str]] = field(init=False, default_factory=set)
+    done: set[str] = field(init=False, default_factory=set)
+    def __post_init__(self) -> None: ...
+    @classmethod
+    def for_output(cls, output: Path, reset: bool = False) -> CitationGraph: ...
+    def add_nodes(self, result_ids: Iterable[str], depth: int) -> list[str]: ...
+    def add_citations(
+        self, cited_id: str, citing_ids: Iterable[str]
+    ) -> None: ...
+    def frontier(self, max_depth: int) -> list[str]: ...
+    def export(self, output: Path) -> None: ...
 
-def handle_write(
-    output: PurePath,
-    results: list,
-    previous: list | None = None,
-    sort: SortMethods | None = None,
-): ...
+def expand_citations(
+    graph: CitationGraph,
+    store: ResultStore,
+    params: dict,
+    search: Search = ...,
+    max_depth: int = ...,
+    fan_out: int = ...,
+    parallel: int = ...,
+    backoff: Backoff | None = None,
+    **kwargs,
+) -> None: ...
+def add_search_args(parser: ArgumentParser) -> None: ...
+def searcher(
+    parser: ArgumentParser, parsed, rate: float | None = None
+) -> Search: ...
+def add_sort_args(parser: ArgumentParser) -> None: ...
+def sort_order(parser: ArgumentParser, parsed) -> SortOrder | None: ...
+def search_params(query: str, api_key: str | None) -> dict: ...
 def query() -> None: ...
+def warm() -> None: ...
+def batch() -> None: ...
+def graph() -> None: ...
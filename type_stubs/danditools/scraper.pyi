@@ -1,23 +1,269 @@
+import asyncio
 import re
+import requests
+import sqlite3
+import threading
+import time
 from _typeshed import Incomplete
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import Collection, Iterator
+from requests.adapters import HTTPAdapter
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Iterable,
+    Iterator,
+    NamedTuple,
+)
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 DRIVE_URL_RE: Incomplete
 DRIVE_URL_SUB_RE: Incomplete
+DEFAULT_CONCURRENCY: int
+DEFAULT_PER_HOST: int
+DEFAULT_RATE: float
+DEFAULT_BURST: int
+CHUNK_SIZE: Incomplete
+TIMEOUT: int
+DEFAULT_CACHE_DIR: Incomplete
+DEFAULT_CACHE_MB: int
+CACHE_EVICT_TO: float
+DEFAULT_PORTS: Incomplete
+PAGE_SUFFIXES: Incomplete
+SITEMAP_SUFFIXES: Incomplete
+DEFAULT_RETRIES: int
+RETRY_STATUSES: Incomplete
+PHASES: Incomplete
+HISTOGRAM_BOUNDS_MS: tuple[int, ...]
+PROGRESS_INTERVAL: float
+GZIP_MAGIC: bytes
+DEFAULT_SEGMENT_MB: int
 
 def dir_path_type(value: str) -> Path: ...
 def is_google_drive(url: str) -> bool: ...
 def get_drive_id(url: str) -> str: ...
 def xform_google_drive(url: str) -> str: ...
-def main() -> None: ...
+@dataclass
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    updated: float = field(init=False, default_factory=time.monotonic)
+    lock: asyncio.Lock = field(init=False, default_factory=asyncio.Lock)
+    def __post_init__(self) -> None: ...
+    async def acquire(self) -> None: ...
+
+class LinkExtractor(HTMLParser):
+    links: list[tuple[str, str]]
+    def __init__(self) -> None: ...
+    def handle_starttag(self, tag, attrs) -> None: ...
+    def handle_endtag(self, tag) -> None: ...
+    def handle_data(self, data) -> None: ...
+    def close(self) -> None: ...
+    def pop_links(self) -> list[tuple[str, str]]: ...
+
+def iter_links(
+    chunks: Iterable[bytes], encoding: str | None = None
+) -> Iterator[tuple[str, str]]: ...
+def page_encoding(response: requests.Response) -> str: ...
+
+class CachedPage(NamedTuple):
+    url: str
+    etag: str | None
+    last_modified: str | None
+    encoding: str | None
+    body: bytes
+    def validators(self) -> dict[str, str]: ...
+    def text(self) -> str: ...
+
+@dataclass
+class PageCache:
+    cache_dir: Path = ...
+    max_bytes: int = ...
+    size: int = field(init=False, default=0)
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+    def __post_init__(self) -> None: ...
+    def get(self, url: str) -> CachedPage | None: ...
+    def put(
+        self,
+        url: str,
+        response: requests.Response,
+        body: bytes | None = None,
+        encoding: str | None = None,
+    ) -> None: ...
+
+class _TimedConnection:
+    def connect(self) -> None: ...
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection): ...
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection): ...
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls: Incomplete
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls: Incomplete
+
+class TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs) -> None: ...
+
+@dataclass
+class Histogram:
+    counts: list[int] = field(default_factory=Incomplete)
+    count: int = ...
+    total: float = ...
+    max: float = ...
+    def add(self, seconds: float) -> None: ...
+    def merge(self, other: Histogram) -> None: ...
+    def percentile(self, fraction: float) -> float: ...
+    def summary(self) -> dict[str, Any]: ...
+
+@dataclass
+class HostMetrics:
+    requests: int = ...
+    bytes: int = ...
+    errors: int = ...
+    retries: int = ...
+    statuses: Counter[int] = field(default_factory=Counter)
+    latency: dict[str, Histogram] = field(default_factory=Incomplete)
+    def summary(self) -> dict[str, Any]: ...
+
+@dataclass
+class CrawlMetrics:
+    hosts: defaultdict[str, HostMetrics] = field(default_factory=Incomplete)
+    started: float = field(default_factory=time.monotonic)
+    files: int = ...
+    file_bytes: int = ...
+    queue_depth: Callable[[], int] | None = ...
+    def observe(
+        self,
+        host: str,
+        wait: float,
+        elapsed: float,
+        connect: float,
+        responses: list[requests.Response],
+        error: BaseException | None = None,
+    ) -> None: ...
+    def record_file(self, size: int) -> None: ...
+    def summary(self) -> dict[str, Any]: ...
+    def progress_line(self) -> str: ...
+
+@dataclass
+class Fetcher:
+    concurrency: int = ...
+    per_host: int = ...
+    rate: float = ...
+    burst: int = ...
+    cache: PageCache | None = ...
+    metrics: CrawlMetrics = field(default_factory=CrawlMetrics)
+    session: requests.Session = field(default_factory=requests.Session)
+    total_limit: asyncio.Semaphore = field(init=False)
+    host_limits: defaultdict[str, asyncio.Semaphore] = field(init=False)
+    buckets: defaultdict[str, TokenBucket] = field(init=False)
+    def __post_init__(self): ...
+    async def run[T](self, url: str, func: Callable[[], T]) -> T: ...
+    def stream[T](
+        self, url: str, func: Callable[[], Iterable[T]]
+    ) -> AsyncGenerator[T]: ...
+    def get_links(self, url: str) -> AsyncGenerator[tuple[str, str]]: ...
+    async def get_page(self, url: str) -> str: ...
+    def close(self) -> None: ...
+
+def canonicalize_url(href: str, base: str | None = None) -> str | None: ...
+def is_target(
+    url: str, target_exts: tuple[str, ...], target_res: Collection[re.Pattern]
+) -> bool: ...
+def is_page(url: str) -> bool: ...
+@dataclass
+class Frontier:
+    path: Path | None = ...
+    db: sqlite3.Connection = field(init=False)
+    last_popped: int = field(init=False, default=0)
+    def __post_init__(self) -> None: ...
+    def push(self, url: str, depth: int) -> bool: ...
+    def pop(self) -> tuple[str, int] | None: ...
+    def add_link(self, url: str) -> bool: ...
+    def close(self) -> None: ...
+
 def get_download_links(
+    fetcher: Fetcher,
+    start_pages: list[str],
+    target_exts: Collection[str] | None = None,
+    target_res: Collection[re.Pattern] | None = None,
+    follow: bool | int = False,
+    hosts: Collection[str] | None = None,
+    frontier: Frontier | None = None,
+) -> AsyncIterator[tuple[str, str]]: ...
+def parse_sitemap(chunks: Iterable[bytes]) -> Iterator[tuple[str, str]]: ...
+def read_sitemap(
+    session: requests.Session, url: str
+) -> Iterator[tuple[str, str]]: ...
+async def find_sitemaps(fetcher: Fetcher, start_page: str) -> list[str]: ...
+def get_sitemap_links(
+    fetcher: Fetcher,
+    start_pages: list[str],
+    target_exts: Collection[str] | None = None,
+    target_res: Collection[re.Pattern] | None = None,
+    follow: bool | int = False,
+    hosts: Collection[str] | None = None,
+) -> AsyncIterator[tuple[str, str]]: ...
+@dataclass
+class DownloadStore:
+    root: Path
+    db: sqlite3.Connection = field(init=False)
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+    def __post_init__(self) -> None: ...
+    @property
+    def store_dir(self) -> Path: ...
+    def blob_path(self, digest: str) -> Path: ...
+    def part_path(self, url: str) -> Path: ...
+    def lookup_url(self, url: str) -> Path | None: ...
+    def add(
+        self, url: str, part_path: Path, digest: str, base_name: str
+    ) -> Path: ...
+    def close(self) -> None: ...
+
+def hash_file(path: Path) -> str: ...
+
+class ResourceChanged(Exception): ...
+
+class RemoteFile(NamedTuple):
+    length: int | None
+    accepts_ranges: bool
+    validator: str | None
+    @classmethod
+    def from_response(cls, response: requests.Response) -> RemoteFile: ...
+    @classmethod
+    def probe(cls, session: requests.Session, url: str) -> RemoteFile: ...
+
+def segment_ranges(length: int, segments: int) -> list[tuple[int, int]]: ...
+async def download_file(
+    fetcher: Fetcher,
+    store: DownloadStore,
+    url: str,
+    base_filename: str | None = None,
+    segments: int = 1,
+    segment_min_bytes: int = ...,
+) -> Path | None: ...
+async def scrape(
     start_pages: list[str],
+    out_dir: Path,
     target_exts: Collection[str] | None = None,
     target_res: Collection[re.Pattern] | None = None,
-    checked: set[str] | None = None,
     follow: bool | int = False,
-) -> Iterator[str]: ...
-def download_file(
-    url, download_dir: Path, base_filename: str | None = None
-): ...
+    fetcher: Fetcher | None = None,
+    hosts: Collection[str] | None = None,
+    sitemap: bool = False,
+    segments: int = 1,
+    segment_min_bytes: int = ...,
+    metrics_path: Path | None = None,
+    progress: bool = False,
+) -> list[Path]: ...
+def dump_metrics(metrics: CrawlMetrics, path: Path | None) -> None: ...
+def main(): ...